@@ -13,14 +13,19 @@ from negmas import (
     ResponseType, )
 
 from .helpers.helperfunctions import (
-    set_id_dict, did_negotiation_end, is_edge_agent, get_agreement_at_index
+    set_id_dict, did_negotiation_end, is_edge_agent, get_agreement_at_index, get_init_budget, BATCH_SIZE
 )
+from .helpers.anytime import anytime_argmax
+from .helpers.ufun_cache import cached_ufun
+from .helpers.batch_eval import evaluate_many
+from .helpers.prefix_eval import has_prefix_state, prefix_candidate_utilities
+from .helpers.profiling import ProfiledNegotiator
 
 
 # be careful: When running directly from this file, change the relative import to an absolute import. When submitting, use relative imports.
 # from helpers.helperfunctions import set_id_dict, ...
 
-class DinnersNegotiator(ANL2025Negotiator):
+class DinnersNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     Your agent code. This is the ONLY class you need to implement
     This example agent aims for the absolute best bid available. As a center agent, it adapts its strategy after each negotiation, by aiming for the best bid GIVEN the previous outcomes.
@@ -30,6 +35,9 @@ class DinnersNegotiator(ANL2025Negotiator):
        The most general way to implement an agent is to implement propose and respond.
        """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_analyze_utility_patterns", "_find_best_outcome")
+
     def init(self):
         """Executed when the agent is created. In ANL2025, all agents are initialized before the tournament starts."""
         # print("init")
@@ -64,6 +72,7 @@ class DinnersNegotiator(ANL2025Negotiator):
     def _analyze_utility_patterns(self):
         """
         Analyze utility patterns to find the best agreement pattern.
+        The search stops with the best pattern so far when the init budget runs out (see get_init_budget).
         """
         # Skip for edge agents
         if is_edge_agent(self):
@@ -80,47 +89,23 @@ class DinnersNegotiator(ANL2025Negotiator):
             else:
                 outcome_spaces.append([None])
 
-        # For 3-negotiation scenarios, analyze patterns with different numbers of agreements
-        if self.num_negotiations == 3:
-            # Evaluate combinations grouping by number of agreements
-            patterns_by_count = {0: [], 1: [], 2: [], 3: []}
-
-            for combo in itertools.product(*outcome_spaces):
-                # Count agreements
-                agreement_count = sum(1 for outcome in combo if outcome is not None)
+        # The joint outcomes are scored batch by batch, without building the whole product
+        combos = itertools.product(*outcome_spaces)
+        batches = iter(lambda: list(itertools.islice(combos, BATCH_SIZE)), [])
+        budget = get_init_budget(self)
 
-                # Calculate utility
-                utility = self.ufun(combo)
-
-                # Store by agreement count
-                patterns_by_count[agreement_count].append((combo, utility))
-
-            # Find best pattern for each agreement count
-            best_by_count = {}
-            for count, patterns in patterns_by_count.items():
-                if patterns:
-                    best_pattern = max(patterns, key=lambda x: x[1])
-                    best_by_count[count] = best_pattern
-
-            # Find overall best pattern
-            if best_by_count:
-                best_count, best_pattern = max(best_by_count.items(), key=lambda x: x[1][1])
-                self.best_pattern = best_pattern[0]
-                self.best_utility = best_pattern[1]
+        # For 3-negotiation scenarios, among the patterns with the best utility the one with the fewest agreements
+        # is preferred (the first one of them)
+        if self.num_negotiations == 3:
+            def agreement_count(combo):
+                return sum(1 for outcome in combo if outcome is not None)
         else:
             # For scenarios with different number of negotiations
             # Simply find the best combination
-            best_combo = None
-            best_utility = float('-inf')
+            agreement_count = None
 
-            for combo in itertools.product(*outcome_spaces):
-                utility = self.ufun(combo)
-                if utility > best_utility:
-                    best_utility = utility
-                    best_combo = combo
-
-            self.best_pattern = best_combo
-            self.best_utility = best_utility
+        self.best_pattern, self.best_utility, _ = anytime_argmax(
+            batches, lambda batch: evaluate_many(self.ufun, batch), budget, agreement_count)
 
     def _find_best_outcome(self, negotiator_id):
         """Find the best outcome for the current negotiation."""
@@ -129,8 +114,8 @@ class DinnersNegotiator(ANL2025Negotiator):
             best_outcome = None
             best_utility = float('-inf')
 
-            for outcome in self._get_possible_outcomes(negotiator_id):
-                utility = self.ufun(outcome)
+            outcomes = list(self._get_possible_outcomes(negotiator_id))
+            for outcome, utility in zip(outcomes, evaluate_many(cached_ufun(self), outcomes).tolist()):
                 if utility > best_utility:
                     best_outcome = outcome
                     best_utility = utility
@@ -148,32 +133,45 @@ class DinnersNegotiator(ANL2025Negotiator):
         best_outcome = None
         best_utility = float('-inf')
 
+        # Score the outcomes from the folded context at once when the center evaluator supports it
+        outcomes = list(self._get_possible_outcomes(negotiator_id))
+        utilities = None
+        if has_prefix_state(self.ufun):
+            rest = [None] * max(0, self.num_negotiations - len(context) - 1)
+            utilities = prefix_candidate_utilities(self.ufun, context, outcomes + [None], rest).tolist()
+
         # Try each possible outcome
-        for outcome in self._get_possible_outcomes(negotiator_id):
-            test_context = context.copy()
-            test_context.append(outcome)
+        for k, outcome in enumerate(outcomes):
+            if utilities is not None:
+                utility = utilities[k]
+            else:
+                test_context = context.copy()
+                test_context.append(outcome)
 
-            # Pad with None
-            while len(test_context) < self.num_negotiations:
-                test_context.append(None)
+                # Pad with None
+                while len(test_context) < self.num_negotiations:
+                    test_context.append(None)
 
-            # Calculate utility
-            utility = self.ufun(tuple(test_context))
+                # Calculate utility
+                utility = cached_ufun(self)(tuple(test_context))
 
             if utility > best_utility:
                 best_outcome = outcome
                 best_utility = utility
 
         # Try having no agreement
-        test_context = context.copy()
-        test_context.append(None)
-
-        # Pad with None
-        while len(test_context) < self.num_negotiations:
+        if utilities is not None:
+            none_utility = utilities[-1]
+        else:
+            test_context = context.copy()
             test_context.append(None)
 
-        # Calculate utility
-        none_utility = self.ufun(tuple(test_context))
+            # Pad with None
+            while len(test_context) < self.num_negotiations:
+                test_context.append(None)
+
+            # Calculate utility
+            none_utility = cached_ufun(self)(tuple(test_context))
 
         if none_utility > best_utility:
             return None
@@ -225,9 +223,9 @@ class DinnersNegotiator(ANL2025Negotiator):
         # For edge agents
         if is_edge_agent(self):
             # Calculate utilities
-            offer_utility = self.ufun(state.current_offer)
+            offer_utility = cached_ufun(self)(state.current_offer)
             best_outcome = self._find_best_outcome(negotiator_id)
-            best_utility = self.ufun(best_outcome) if best_outcome else 0
+            best_utility = cached_ufun(self)(best_outcome) if best_outcome else 0
             progress = self._get_progress(negotiator_id)
 
             # Accept if close to best or late in negotiation
@@ -267,7 +265,7 @@ class DinnersNegotiator(ANL2025Negotiator):
                 test_context.append(None)
 
             # Calculate utility of offer
-            offer_utility = self.ufun(tuple(test_context))
+            offer_utility = cached_ufun(self)(tuple(test_context))
 
             # Calculate utility with no agreement
             test_context = context.copy()
@@ -278,7 +276,7 @@ class DinnersNegotiator(ANL2025Negotiator):
                 test_context.append(None)
 
             # Calculate utility
-            none_utility = self.ufun(tuple(test_context))
+            none_utility = cached_ufun(self)(tuple(test_context))
 
             # If no agreement is better, reject
             if none_utility > offer_utility:
@@ -304,7 +302,7 @@ class DinnersNegotiator(ANL2025Negotiator):
                         test_context.append(None)
 
                     # Calculate utility
-                    best_utility = self.ufun(tuple(test_context))
+                    best_utility = cached_ufun(self)(tuple(test_context))
 
                     if offer_utility >= 0.9 * best_utility:
                         return ResponseType.ACCEPT_OFFER
@@ -0,0 +1,44 @@
+"""
+The agreements of the finished subnegotiations of an agent.
+
+The agreement of a subnegotiation never changes once it has finished, so the ledger only grows: it is extended when
+a negotiation ends (see get_agreement_ledger) and keeps the agreements as one immutable tuple that every caller shares.
+Joint outcomes for candidates of the current negotiation (the agreements so far, the candidate, and no agreement in
+the negotiations after it) are built from the prefix and a precomputed None padding, so building one only creates
+the joint outcome itself.
+"""
+
+
+class AgreementLedger:
+    """The agreements of the first len(ledger) of n subnegotiations, in order (None for a failed negotiation)."""
+
+    def __init__(self, n):
+        self.n = n
+        self.prefix = ()
+        self._update()
+
+    def __len__(self):
+        return len(self.prefix)
+
+    def _update(self):
+        current = len(self.prefix)
+        # no agreement in the negotiations after the current one
+        self.tail = (None,) * max(self.n - current - 1, 0)
+        self.n_agreements = sum(a is not None for a in self.prefix)
+
+    def extend(self, agreements):
+        """Records the agreements of the negotiations that finished after the ones recorded so far."""
+        agreements = tuple(agreements)
+        if agreements:
+            self.prefix += agreements
+            self._update()
+        return self
+
+    def context(self, outcome):
+        """The joint outcome of outcome as the agreement of the current negotiation (index len(ledger))."""
+        return (*self.prefix, outcome, *self.tail)
+
+    def contexts(self, outcomes):
+        """The joint outcomes of every outcome, see context."""
+        prefix, tail = self.prefix, self.tail
+        return [(*prefix, outcome, *tail) for outcome in outcomes]
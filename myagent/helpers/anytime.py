@@ -0,0 +1,87 @@
+"""
+Anytime search under a wall-clock budget.
+
+The searches of the agents score candidate bids batch by batch (or leaf by leaf in branch_and_bound.py) and keep the
+best one so far, the incumbent. With a Budget they check the clock after every batch and return the incumbent once
+it has run out, so a call never takes much longer than its budget plus one batch. Without a time limit a Budget
+never runs out and the search is the exhaustive one, with the same result as before.
+
+The budget of one propose or respond call is a share of the time of one negotiation step (two calls, plus the time
+of the opponent and the mechanism), derived from the time limits of the negotiation and its number of steps.
+"""
+import math
+import time
+
+import numpy as np
+
+# Share of the time of one step that a propose or respond call may spend searching.
+CALL_SHARE = 0.25
+# Share of the time limit of a negotiation that init may spend searching.
+INIT_SHARE = 0.1
+
+
+def _finite(value):
+    return value is not None and math.isfinite(value)
+
+
+def call_budget(nmi, share=CALL_SHARE):
+    """The seconds one propose or respond call may search in the negotiation of nmi: share of the step time limit,
+    or of the (negotiator) time limit divided by the number of steps. None if there is no finite time limit."""
+    per_step = [nmi.step_time_limit] if _finite(nmi.step_time_limit) else []
+    for limit in (nmi.time_limit, nmi.negotiator_time_limit):
+        if _finite(limit):
+            per_step.append(limit / nmi.n_steps if _finite(nmi.n_steps) and nmi.n_steps > 0 else limit)
+    return share * min(per_step) if per_step else None
+
+
+def negotiation_budget(nmi, share=INIT_SHARE):
+    """The seconds a search outside of the negotiation steps (in init) may take: share of the (negotiator) time limit
+    of the negotiation of nmi. None if there is no finite time limit."""
+    limits = [limit for limit in (nmi.time_limit, nmi.negotiator_time_limit) if _finite(limit)]
+    return share * min(limits) if limits else None
+
+
+class Budget:
+    """A wall-clock budget of seconds, starting when it is created. Budget() (or Budget(None)) never runs out."""
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.deadline = None if seconds is None else time.perf_counter() + seconds
+
+    @property
+    def unbounded(self):
+        return self.deadline is None
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def remaining(self):
+        """Seconds left (inf for an unbounded budget)."""
+        return math.inf if self.deadline is None else max(self.deadline - time.perf_counter(), 0.0)
+
+
+def anytime_argmax(batches, score, budget=None, tie_break=None):
+    """Scores the batches of candidates with score (a batch to an array of utilities) in order and returns the best
+    candidate, its utility and whether every batch was scored, as (best, utility, complete). The scan stops when the
+    budget runs out, after at least one batch. The first best candidate is kept, unless tie_break (a candidate to a
+    key) is given, then a candidate with the same utility and a smaller key replaces it. NaN utilities never win, and
+    (None, -inf, complete) is returned if no candidate has a utility above -inf."""
+    best, best_utility, best_key = None, -math.inf, None
+    for batch in batches:
+        utilities = np.array(score(batch), dtype=float)
+        utilities[np.isnan(utilities)] = -math.inf
+        if tie_break is None:
+            i = int(np.argmax(utilities))
+            if utilities[i] > best_utility:
+                best, best_utility = batch[i], float(utilities[i])
+        else:
+            for candidate, utility in zip(batch, utilities.tolist()):
+                if utility > best_utility:
+                    best, best_utility, best_key = candidate, utility, tie_break(candidate)
+                elif utility == best_utility and best is not None:
+                    key = tie_break(candidate)
+                    if key < best_key:
+                        best, best_key = candidate, key
+        if budget is not None and budget.expired():
+            return best, best_utility, False
+    return best, best_utility, True
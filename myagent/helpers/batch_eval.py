@@ -0,0 +1,260 @@
+"""
+Scores many outcomes of one ufun at once.
+
+evaluate_many returns the same utilities as calling the ufun on every outcome, as a NumPy array. Center ufuns that
+combine side utilities are scored column by column: every side ufun is called once per distinct outcome of its edge,
+and the side utilities are combined with NumPy instead of once per joint outcome. Center ufuns whose evaluator can
+score a batch (evaluate_batch and encode, like the DinnersEvaluator and the CompiledGlobalServiceEvaluator) are
+scored with one call to it, evaluators of a total quantity (like the TargetEvaluator) from the sums of the quantities
+of the edges, and MeanSMCenterUFun from the mean and std of every distinct outcome of every edge.
+
+Edge ufuns are scored the same way: LinearAdditiveUtilityFunction issue by issue, with every value function called
+once per distinct value, and SideUFun through the kernel of its center ufun. A CachedUFun is scored by the kernel of
+the ufun it wraps. Ufuns without a kernel are called in a tight loop.
+"""
+import numpy as np
+from anl2025.ufun import (
+    MaxCenterUFun, LinearCombinationCenterUFun, LambdaCenterUFun, LocalEvaluationCenterUFun, MeanSMCenterUFun, SideUFun
+)
+from negmas import LinearAdditiveUtilityFunction
+
+from .quantity_sum import has_quantity_sum
+from .ufun_cache import CachedUFun
+
+
+_KEEP = object()
+
+# Set by the profiler and the benchmark (see profiling.py and benchmark.py) to count the utilities computed by the
+# kernels, which do not call the ufun once per outcome: evaluate_many then calls batch_counter(kernel, ufun, outcomes)
+# instead of kernel(ufun, outcomes).
+batch_counter = None
+
+
+def _distinct_columns(outcomes, i, missing=_KEEP):
+    """The distinct entries at position i of the outcomes (edge i of joint outcomes, or issue i of outcomes) and, for
+    every row, the position of its entry among them. If missing is given, falsy entries are replaced by it first."""
+    positions = {}
+    if missing is _KEEP:
+        entries = (outcome[i] for outcome in outcomes)
+    else:
+        entries = (outcome[i] if outcome[i] else missing for outcome in outcomes)
+    column = np.fromiter((positions.setdefault(e, len(positions)) for e in entries), dtype=int, count=len(outcomes))
+    return list(positions), column
+
+
+def _edge_columns(ufun, outcomes):
+    """The distinct outcomes of every edge of the joint outcomes with the column of each row, and whether all edges of
+    a row failed. Disagreements are replaced by the expected outcome of the edge first, like
+    CenterUFun.eval_with_expected does."""
+    edges = []
+    no_agreement = np.ones(len(outcomes), dtype=bool)
+    for i, expected in enumerate(ufun._expected):
+        distinct, column = _distinct_columns(outcomes, i, expected)
+        edges.append((distinct, column))
+        no_agreement &= np.array([o is None for o in distinct], dtype=bool)[column]
+    return edges, no_agreement
+
+
+def combine_side_utilities(ufun, columns):
+    """Combines the side utilities of the edges of a MaxCenterUFun or LinearCombinationCenterUFun (with weights), one
+    array per edge, into center utilities. The arrays are broadcast against each other, so they can be columns of the
+    same joint outcomes or vectors along the axes of a table."""
+    if isinstance(ufun, MaxCenterUFun):
+        utilities = columns[0]
+        for column in columns[1:]:
+            utilities = np.maximum(utilities, column)
+    else:
+        # Same order of additions as LinearCombinationCenterUFun.combine, so the values are identical.
+        utilities = 0
+        for column, w in zip(columns, ufun._weights):
+            utilities = utilities + column * w
+    return utilities
+
+
+def _combining_kernel(ufun, outcomes):
+    # The side utility of every joint outcome, as one column per edge.
+    edges, no_agreement = _edge_columns(ufun, outcomes)
+    columns = [evaluate_many(side, distinct)[column] for side, (distinct, column) in zip(ufun.ufuns, edges)]
+    utilities = np.array(combine_side_utilities(ufun, columns), dtype=float)
+
+    # When all subnegotiations fail (after filling in the expected outcomes), the center gets its reserved value.
+    utilities[no_agreement] = ufun.reserved_value
+    return utilities
+
+
+def _has_combining_kernel(ufun):
+    if not getattr(ufun, "allow_partial_agreements", True):
+        return False
+    if isinstance(ufun, MaxCenterUFun):
+        return True
+    # A linear combination without weights draws random weights on its first call, so it has to be called instead.
+    return isinstance(ufun, LinearCombinationCenterUFun) and ufun._weights is not None
+
+
+def _batch_evaluator_kernel(ufun, outcomes):
+    # Disagreements are replaced by the expected outcome of the edge first, like CenterUFun.eval_with_expected does.
+    outcomes = [tuple(o if o else e for o, e in zip(outcome, ufun._expected)) for outcome in outcomes]
+    evaluator = ufun._evaluator
+    utilities = np.array(evaluator.evaluate_batch(evaluator.encode(outcomes)), dtype=float)
+    no_agreement = np.fromiter((all(o is None for o in outcome) for outcome in outcomes), dtype=bool,
+                               count=len(outcomes))
+    utilities[no_agreement] = ufun.reserved_value
+    return utilities
+
+
+def _has_batch_evaluator(ufun):
+    evaluator = getattr(ufun, "_evaluator", None)
+    return isinstance(ufun, (LambdaCenterUFun, LocalEvaluationCenterUFun)) and hasattr(evaluator, "evaluate_batch") \
+        and hasattr(evaluator, "encode")
+
+
+def _quantity_sum_kernel(ufun, outcomes):
+    evaluator = ufun._evaluator
+    edges, no_agreement = _edge_columns(ufun, outcomes)
+    totals = np.zeros(len(outcomes), dtype=int)
+    for distinct, column in edges:
+        totals += np.array([evaluator.quantity(o) for o in distinct], dtype=int)[column]
+    distinct, column = np.unique(totals, return_inverse=True)
+    utilities = np.array([evaluator.value_of_sum(int(t)) for t in distinct], dtype=float)[column]
+    utilities[no_agreement] = ufun.reserved_value
+    return utilities
+
+
+def _mean_sm_entry(outcome, n_edges):
+    """Whether the agreement of an edge counts for MeanSMCenterUFun.eval, and its mean + std."""
+    x = [0.0] * n_edges
+    counts = False
+    for i, v in enumerate(outcome):
+        try:
+            value = float(v[1:])
+            # eval creates the entry of the edge before it stores the value, which can still fail.
+            counts = True
+            x[i] = value
+        except Exception:
+            pass
+    return counts, np.mean(x) + np.std(x)
+
+
+def _mean_sm_kernel(ufun, outcomes):
+    n_edges = len(ufun._expected)
+    if n_edges < 2:
+        return None
+    edges, no_agreement = _edge_columns(ufun, outcomes)
+    # Same order of additions as MeanSMCenterUFun.eval, so the values are identical.
+    total = np.zeros(len(outcomes), dtype=float)
+    n_counted = np.zeros(len(outcomes), dtype=int)
+    for distinct, column in edges:
+        entries = [_mean_sm_entry(o, n_edges) if o else (False, 0.0) for o in distinct]
+        counts = np.array([c for c, _ in entries], dtype=bool)[column]
+        values = np.array([v for _, v in entries], dtype=float)[column]
+        total = total + np.where(counts, values, 0.0)
+        n_counted += counts
+    if (n_counted[~no_agreement] == 0).any():
+        return None  # eval divides by zero, so the loop has to raise it
+    utilities = total / np.where(no_agreement, 1, n_counted)
+    utilities[no_agreement] = ufun.reserved_value
+    return utilities
+
+
+def _has_mean_sm_kernel(ufun):
+    return isinstance(ufun, MeanSMCenterUFun)
+
+
+def _none_rows(outcomes):
+    return np.fromiter((o is None for o in outcomes), dtype=bool, count=len(outcomes))
+
+
+def _linear_additive_kernel(ufun, outcomes):
+    none = _none_rows(outcomes)
+    present = [o for o in outcomes if o is not None]
+    if any(len(o) != len(ufun.values) for o in present):
+        return None
+    # Same order of additions as LinearAdditiveUtilityFunction.eval, so the values are identical.
+    utilities = np.full(len(present), ufun._bias, dtype=float)
+    invalid = np.zeros(len(present), dtype=bool)
+    for i, (w, value_fun) in enumerate(zip(ufun.weights, ufun.values)):
+        distinct, column = _distinct_columns(present, i)
+        values = [value_fun(v) for v in distinct]
+        missing = np.array([v is None for v in values], dtype=bool)
+        values = np.array([0.0 if v is None else v for v in values], dtype=float)
+        utilities = utilities + w * values[column]
+        invalid |= missing[column]
+    # eval gives up on an outcome with an issue value it cannot evaluate.
+    utilities[invalid] = float("nan")
+    result = np.full(len(outcomes), ufun.reserved_value, dtype=float)
+    result[~none] = utilities
+    return result
+
+
+def _has_linear_additive_kernel(ufun):
+    # Outcomes outside the outcome space get the invalid value, which only the ufun can check.
+    return isinstance(ufun, LinearAdditiveUtilityFunction) and ufun._invalid_value is None
+
+
+def _side_ufun_kernel(ufun, outcomes):
+    center, index = ufun._center_ufun, ufun._index
+    none = _none_rows(outcomes)
+    offers = []
+    for outcome in outcomes:
+        if outcome is not None:
+            offer = list(center._expected)
+            offer[index] = outcome
+            offer[index + 1:] = [None] * (len(offer) - index - 1)
+            offers.append(tuple(offer))
+    # Like SideUFun.eval, the negotiations after this one are assumed to fail while the center evaluates the offers.
+    expected = list(center._expected)
+    for i in range(index + 1, ufun._n_edges):
+        center.set_expected_outcome(i, None)
+    try:
+        utilities = _center_kernel(center, offers)
+    finally:
+        for i in range(index + 1, ufun._n_edges):
+            center.set_expected_outcome(i, expected[i])
+    if utilities is None:
+        return None
+    result = np.full(len(outcomes), ufun.reserved_value, dtype=float)
+    result[~none] = utilities
+    return result
+
+
+def _has_side_ufun_kernel(ufun):
+    return isinstance(ufun, SideUFun) and ufun._invalid_value is None and _has_center_kernel(ufun._center_ufun)
+
+
+def _has_center_kernel(ufun):
+    return _has_combining_kernel(ufun) or _has_batch_evaluator(ufun) or has_quantity_sum(ufun) \
+        or _has_mean_sm_kernel(ufun)
+
+
+def _center_kernel(ufun, outcomes):
+    """The utilities of the joint outcomes from the kernel of a center ufun, or None if it has none for them."""
+    if not outcomes or any(o is None for o in outcomes):
+        return None
+    if _has_combining_kernel(ufun):
+        return _combining_kernel(ufun, outcomes)
+    if _has_batch_evaluator(ufun):
+        return _batch_evaluator_kernel(ufun, outcomes)
+    if has_quantity_sum(ufun):
+        return _quantity_sum_kernel(ufun, outcomes)
+    if _has_mean_sm_kernel(ufun):
+        return _mean_sm_kernel(ufun, outcomes)
+    return None
+
+
+def _kernel(ufun, outcomes):
+    if not outcomes:
+        return None
+    if _has_linear_additive_kernel(ufun):
+        return _linear_additive_kernel(ufun, outcomes)
+    if _has_side_ufun_kernel(ufun):
+        return _side_ufun_kernel(ufun, outcomes)
+    return _center_kernel(ufun, outcomes)
+
+
+def evaluate_many(ufun, outcomes):
+    """Returns the utility of every outcome in outcomes (a list) as a float array."""
+    inner = ufun.ufun if isinstance(ufun, CachedUFun) else ufun
+    utilities = _kernel(inner, outcomes) if batch_counter is None else batch_counter(_kernel, inner, outcomes)
+    if utilities is not None:
+        return utilities
+    return np.fromiter((ufun(o) for o in outcomes), dtype=float, count=len(outcomes))
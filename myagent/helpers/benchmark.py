@@ -0,0 +1,307 @@
+"""
+Latency benchmark of the agents in myagent on every bundled scenario.
+
+Every agent plays one session per scenario in each role against fixed opponents: as the center against Boulware2025,
+Linear2025 and Conceder2025 edges (repeated for more edges), and as the first edge against a Boulware2025 center and
+Linear2025 edges. For every case the benchmark records the time of init(), the p50/p95/p99 latency of propose() and
+respond(), the number of ufun calls made inside them and the number of negotiations that ended with an error.
+
+Cases in EXCLUDED are not run, every other case has to finish without an exception. Times are measured around the
+outermost call of each method (an agent that calls its own propose is timed once), ufun calls are the outermost
+calls of any utility function while one of the agent's methods runs, and every outcome of an evaluate_many batch
+scored by a kernel counts as one call (utilities served by CachedUFun are not calls).
+
+Run as a module to print the results, store them as a baseline (--save, refused if a case failed) or compare them
+with one (--check, exits with status 1 if any case failed, called a method a different number of times, got slower
+or makes more ufun calls than the tolerance and the absolute floors allow). Latencies are wall-clock times, so they
+are only compared with a baseline recorded on the same host (see host_info):
+
+    python -m myagent.helpers.benchmark --check
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from fnmatch import fnmatch
+from pathlib import Path
+
+import numpy as np
+from anl2025 import MultidealScenario, run_session
+from anl2025.negotiator import Boulware2025, Conceder2025, Linear2025
+
+from . import batch_eval
+from .profiling import ufun_classes
+
+ROOT = Path(__file__).resolve().parents[2]
+SCENARIO_FOLDERS = (ROOT / "official_test_scenarios", ROOT / "new_test_scenarios")
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+CENTER_OPPONENTS = (Boulware2025, Linear2025, Conceder2025)
+METHODS = ("propose", "respond")
+# Cases that are not run ("agent/scenario/role" patterns, see fnmatch) and why.
+EXCLUDED = {
+    "*/service_provider/*": "anl2025 pairs the edge ufuns with the center outcome spaces in the order the files are "
+                            "listed, which differs from the order of the services here",
+    **{f"JobHunterNegotiator/{name}/center": "the center strategy of JobHunterNegotiator needs the options of a "
+                                             "job_hunt_target center"
+       for name in ("TargetQuantity_example", "dinners", "linear_combination_procurement", "research_collaboration")},
+}
+
+
+def benchmark_agents():
+    """The agents of myagent, imported here so that importing the module stays cheap."""
+    from myagent.dinners_agent import DinnersNegotiator
+    from myagent.itay_agent import ItayNegotiator
+    from myagent.itay_jhn_agent import ItayJhnNegotiator
+    from myagent.job_dinner_agent import ImprovedUnifiedNegotiator
+    from myagent.job_henter_agent import JobHunterNegotiator
+    from myagent.myagent import NewNegotiator
+
+    return [NewNegotiator, ItayNegotiator, ItayJhnNegotiator, DinnersNegotiator, JobHunterNegotiator,
+            ImprovedUnifiedNegotiator]
+
+
+def scenario_paths():
+    """Every scenario folder (a folder with a center.yml) in the scenario folders, sorted by name."""
+    return sorted((path for folder in SCENARIO_FOLDERS for path in folder.iterdir() if (path / "center.yml").exists()),
+                  key=lambda path: path.name)
+
+
+def excluded(key):
+    """The reason why the case key ("agent/scenario/role") is excluded, or None."""
+    return next((reason for pattern, reason in EXCLUDED.items() if fnmatch(key, pattern)), None)
+
+
+def host_info():
+    """The machine the benchmark runs on, latencies are only compared between runs on the same host."""
+    return dict(node=platform.node(), machine=platform.machine(), processor=platform.processor(),
+                python=platform.python_version())
+
+
+class CallStats:
+    """Times and ufun calls of the methods of one agent."""
+
+    def __init__(self):
+        self.times = defaultdict(list)
+        self.ufun_calls = 0
+        self.depth = 0  # > 0 while a method of the agent runs
+        self.ufun_depth = 0
+
+
+def _instrumented(cls, stats):
+    """A subclass of cls (with the same name) that records the times of init, propose and respond in stats."""
+
+    def timed(name):
+        method = getattr(cls, name)
+
+        def wrapper(self, *args, **kwargs):
+            if stats.depth:
+                return method(self, *args, **kwargs)
+            stats.depth += 1
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                stats.times[name].append(time.perf_counter() - start)
+                stats.depth -= 1
+
+        return wrapper
+
+    return type(cls.__name__, (cls,), {name: timed(name) for name in ("init",) + METHODS})
+
+
+def _counted(call, stats):
+    def wrapper(ufun, *args, **kwargs):
+        if stats.depth and not stats.ufun_depth:
+            stats.ufun_calls += 1
+        stats.ufun_depth += 1
+        try:
+            return call(ufun, *args, **kwargs)
+        finally:
+            stats.ufun_depth -= 1
+
+    return wrapper
+
+
+def _batch_counter(stats):
+    def counter(kernel, ufun, outcomes):
+        counted = stats.depth and not stats.ufun_depth
+        stats.ufun_depth += 1
+        try:
+            utilities = kernel(ufun, outcomes)
+        finally:
+            stats.ufun_depth -= 1
+        if counted and utilities is not None:
+            stats.ufun_calls += len(outcomes)
+        return utilities
+
+    return counter
+
+
+class _CountUFunCalls:
+    """Counts the ufun calls made while a method of the agent runs in stats, by wrapping __call__ of every utility
+    function class and counting the batches of evaluate_many while the context is active."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.originals = {}
+        self.batch_counter = None
+
+    def __enter__(self):
+        for cls in ufun_classes():
+            self.originals[cls] = cls.__dict__["__call__"]
+            cls.__call__ = _counted(self.originals[cls], self.stats)
+        self.batch_counter = batch_eval.batch_counter
+        batch_eval.batch_counter = _batch_counter(self.stats)
+        return self
+
+    def __exit__(self, *exc):
+        for cls, original in self.originals.items():
+            cls.__call__ = original
+        self.originals.clear()
+        batch_eval.batch_counter = self.batch_counter
+
+
+def _latencies(times):
+    """Number of calls and p50/p95/p99 latency in milliseconds."""
+    if not times:
+        return dict(n=0, p50=0.0, p95=0.0, p99=0.0)
+    p50, p95, p99 = np.percentile(np.array(times) * 1000, [50, 95, 99])
+    return dict(n=len(times), p50=float(p50), p95=float(p95), p99=float(p99))
+
+
+def run_case(scenario, agent, role, n_steps, seed):
+    """Benchmarks agent in role ("center" or "edge") on the scenario and returns the case as JSON data."""
+    stats = CallStats()
+    tested = _instrumented(agent, stats)
+    nedges = len(scenario.edge_ufuns)
+    if role == "center":
+        center, edges = tested, [CENTER_OPPONENTS[i % len(CENTER_OPPONENTS)] for i in range(nedges)]
+    else:
+        center, edges = Boulware2025, [tested] + [Linear2025] * (nedges - 1)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    error = None
+    with _CountUFunCalls(stats):
+        try:
+            results = run_session(scenario=scenario, center_type=center, edge_types=edges, nsteps=n_steps, output=None)
+        except Exception as e:
+            error, results = repr(e), None
+    return dict(
+        init_ms=sum(stats.times["init"]) * 1000,
+        **{name: _latencies(stats.times[name]) for name in METHODS},
+        ufun_calls=stats.ufun_calls,
+        errors=sum(bool(m.state.has_error) for m in results.mechanisms) if results is not None else None,
+        error=error,
+    )
+
+
+def run_benchmark(agents=None, scenarios=None, roles=("center", "edge"), n_steps=50, seed=0, verbose=False):
+    """Runs every case that is not excluded and returns the results as JSON data, with the cases under
+    "agent/scenario/role" keys. agents and scenarios (folder names) default to all of them."""
+    agents = agents if agents is not None else benchmark_agents()
+    paths = [p for p in scenario_paths() if scenarios is None or p.name in scenarios]
+    cases = dict()
+    for path in paths:
+        for agent in agents:
+            for role in roles:
+                key = f"{agent.__name__}/{path.name}/{role}"
+                if excluded(key) is not None:
+                    if verbose:
+                        print(f"{key:<60} excluded: {excluded(key)}", flush=True)
+                    continue
+                # a fresh scenario for every case, the agents change the expected outcomes of its ufuns
+                scenario = MultidealScenario.from_folder(path)
+                cases[key] = run_case(scenario, agent, role, n_steps, seed)
+                if verbose:
+                    print(format_case(key, cases[key]), flush=True)
+    return dict(n_steps=n_steps, seed=seed, host=host_info(), cases=cases)
+
+
+def format_case(key, case):
+    if case["error"] is not None:
+        return f"{key:<60} failed: {case['error']}"
+    calls = "  ".join(f"{name} n={case[name]['n']:<4} p50={case[name]['p50']:8.3f} p95={case[name]['p95']:8.3f} "
+                      f"p99={case[name]['p99']:8.3f}" for name in METHODS)
+    return (f"{key:<60} init={case['init_ms']:9.3f}  {calls}  ufun_calls={case['ufun_calls']:<8} "
+            f"errors={case['errors']}")
+
+
+def regressions(results, baseline, tolerance=0.5, min_ms=1.0, min_calls=10, latencies=True):
+    """Describes every case of results that is worse than in the baseline: a failure, a method called a different
+    number of times (the session went differently), an init time or a p95 latency more than tolerance (relative) and
+    min_ms (absolute) above the baseline (only if latencies), more than tolerance and min_calls more ufun calls, or
+    more erred negotiations. Cases missing from the baseline are not compared."""
+    found = []
+    for key, case in results["cases"].items():
+        if case["error"] is not None:
+            found.append(f"{key}: failed: {case['error']}")
+            continue
+        base = baseline["cases"].get(key)
+        if base is None:
+            continue
+
+        def worse(new, old, minimum):
+            return new > old * (1 + tolerance) and new - old > minimum
+
+        if latencies and worse(case["init_ms"], base["init_ms"], min_ms):
+            found.append(f"{key}: init {base['init_ms']:.3f} ms -> {case['init_ms']:.3f} ms")
+        for name in METHODS:
+            if case[name]["n"] != base[name]["n"]:
+                found.append(f"{key}: {name} calls {base[name]['n']} -> {case[name]['n']}")
+            elif latencies and worse(case[name]["p95"], base[name]["p95"], min_ms):
+                found.append(f"{key}: {name} p95 {base[name]['p95']:.3f} ms -> {case[name]['p95']:.3f} ms")
+        if worse(case["ufun_calls"], base["ufun_calls"], min_calls):
+            found.append(f"{key}: ufun calls {base['ufun_calls']} -> {case['ufun_calls']}")
+        if case["errors"] > base["errors"]:
+            found.append(f"{key}: erred negotiations {base['errors']} -> {case['errors']}")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the latency of the agents in myagent.")
+    parser.add_argument("--agents", nargs="*", help="agent class names (all by default)")
+    parser.add_argument("--scenarios", nargs="*", help="scenario folder names (all by default)")
+    parser.add_argument("--roles", nargs="*", default=["center", "edge"], choices=["center", "edge"])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE_PATH, type=Path,
+                        help="store the results as the baseline")
+    parser.add_argument("--check", nargs="?", const=DEFAULT_BASELINE_PATH, type=Path,
+                        help="compare the results with the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative increase")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="time increases below this are never regressions")
+    parser.add_argument("--min-calls", type=int, default=10,
+                        help="ufun call increases below this are never regressions")
+    args = parser.parse_args(argv)
+
+    agents = [a for a in benchmark_agents() if args.agents is None or a.__name__ in args.agents]
+    results = run_benchmark(agents, args.scenarios, tuple(args.roles), args.steps, args.seed, verbose=True)
+    failed = [key for key, case in results["cases"].items() if case["error"] is not None]
+    if args.save is not None and failed:
+        print(f"Not saving the baseline, {len(failed)} cases failed: {', '.join(failed)}")
+        return 1
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=1, sort_keys=True) + "\n")
+        print(f"Saved the baseline to {args.save}")
+    if args.check is not None:
+        baseline = json.loads(args.check.read_text())
+        if (baseline["n_steps"], baseline["seed"]) != (results["n_steps"], results["seed"]):
+            print(f"The baseline was run with {baseline['n_steps']} steps and seed {baseline['seed']}")
+            return 1
+        same_host = baseline.get("host") == results["host"]
+        if not same_host:
+            print(f"The baseline was recorded on another host ({baseline.get('host')}), latencies are not compared")
+        found = regressions(results, baseline, args.tolerance, args.min_ms, args.min_calls, latencies=same_host)
+        for line in found:
+            print(f"REGRESSION {line}")
+        print(f"{len(found)} regressions against {args.check}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
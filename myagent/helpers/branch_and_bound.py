@@ -0,0 +1,141 @@
+"""
+Depth-first branch-and-bound search for the best bid given the agreements of the finished negotiations.
+
+The joint outcomes are visited in the same order as itertools.product, one at a time, so memory stays linear in the
+number of subnegotiations. For center ufuns that combine side utilities (max or weighted sum) every partial
+assignment gets an optimistic upper bound, and subtrees that cannot beat the incumbent are skipped. With a Budget
+(see anytime.py) the search stops when it runs out and returns the incumbent.
+"""
+import math
+
+from anl2025.ufun import MaxCenterUFun, LinearCombinationCenterUFun
+
+from .batch_eval import evaluate_many
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class _NoBound:
+    """Used for center ufuns we know nothing about: every subtree can contain the best bid."""
+
+    def start(self, fixed):
+        return None
+
+    def extend(self, partial, index, outcome):
+        return None
+
+    def bound(self, partial, index):
+        return math.inf
+
+
+class _MaxBound:
+    """For MaxCenterUFun the value of a partial assignment is the max of its side utilities. The best it can reach
+    is that max, or the best side utility of one of the remaining edges."""
+
+    def __init__(self, ufun, spaces):
+        self.ufuns = ufun.ufuns
+        best = [max(evaluate_many(u, list(os)).tolist()) for u, os in zip(self.ufuns, spaces)]
+        # suffix[i] is the best side utility of any edge with index >= i.
+        self.suffix = [-math.inf] * (len(spaces) + 1)
+        for i in range(len(spaces) - 1, -1, -1):
+            self.suffix[i] = max(best[i], self.suffix[i + 1])
+
+    def start(self, fixed):
+        partial = -math.inf
+        for i, o in enumerate(fixed):
+            partial = self.extend(partial, i, o)
+        return partial
+
+    def extend(self, partial, index, outcome):
+        return max(partial, float(self.ufuns[index](outcome)))
+
+    def bound(self, partial, index):
+        return max(partial, self.suffix[index])
+
+
+class _LinearBound:
+    """For LinearCombinationCenterUFun the value of a partial assignment is the weighted sum of its side
+    utilities. The best it can reach adds the best weighted side utility of each remaining edge."""
+
+    def __init__(self, ufun, spaces):
+        self.ufuns = ufun.ufuns
+        self.weights = ufun._weights
+        self.best = [max((w * evaluate_many(u, list(os))).tolist())
+                     for u, w, os in zip(self.ufuns, self.weights, spaces)]
+
+    def start(self, fixed):
+        partial = 0.0
+        for i, o in enumerate(fixed):
+            partial = self.extend(partial, i, o)
+        return partial
+
+    def extend(self, partial, index, outcome):
+        return partial + self.weights[index] * float(self.ufuns[index](outcome))
+
+    def bound(self, partial, index):
+        # Added one edge at a time, in the same order as the ufun adds them. Rounding is monotone, so the bound can
+        # never end up below the utility of a joint outcome in the subtree.
+        for best in self.best[index:]:
+            partial = partial + best
+        return partial
+
+
+def _make_bound(ufun, spaces):
+    if not getattr(ufun, "allow_partial_agreements", True):
+        return _NoBound()
+    if isinstance(ufun, MaxCenterUFun):
+        return _MaxBound(ufun, spaces)
+    if isinstance(ufun, LinearCombinationCenterUFun) and ufun._weights is not None:
+        return _LinearBound(ufun, spaces)
+    return _NoBound()
+
+
+def has_upper_bound(ufun):
+    """Returns True if partial assignments can be bounded (and pruned) for this center ufun."""
+    return not isinstance(_make_bound(ufun, []), _NoBound)
+
+
+def branch_and_bound_best_bid(ufun, fixed, spaces, budget=None):
+    """Returns the best joint outcome (and its utility) that starts with the agreements in fixed.
+
+    spaces[i] lists the outcomes of subnegotiation i (including None), like the lists that are passed to
+    cartesian_product; the entries for the fixed agreements are not searched. Ties are broken in favour of the first
+    joint outcome in itertools.product order, so the result is the same as a linear scan. If the budget runs out
+    first, the best joint outcome found so far is returned (after at least one joint outcome was scored)."""
+    n = len(spaces)
+    n_fixed = len(fixed)
+    bounds = _make_bound(ufun, spaces)
+    current = list(fixed) + [None] * (n - n_fixed)
+    best, best_utility = None, -math.inf
+
+    def can_beat_incumbent(upper_bound, all_none):
+        # A center ufun returns its reserved value when every negotiation fails, which no side utility bounds.
+        if all_none:
+            upper_bound = max(upper_bound, ufun.reserved_value)
+        # Only a strictly better bid replaces the incumbent, so subtrees that can at most tie with it are skipped.
+        return upper_bound > best_utility
+
+    def search(index, partial, all_none):
+        nonlocal best, best_utility
+        if index == n:
+            u = ufun(tuple(current))
+            if u > best_utility:
+                best, best_utility = tuple(current), u
+            if budget is not None and budget.expired():
+                raise _OutOfTime
+            return
+        for outcome in spaces[index]:
+            current[index] = outcome
+            extended = bounds.extend(partial, index, outcome)
+            still_none = all_none and outcome is None
+            if can_beat_incumbent(bounds.bound(extended, index + 1), still_none):
+                search(index + 1, extended, still_none)
+        current[index] = None
+
+    try:
+        search(n_fixed, bounds.start(fixed), all(a is None for a in fixed))
+    except _OutOfTime:
+        pass
+    return best, best_utility
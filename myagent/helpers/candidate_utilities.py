@@ -0,0 +1,255 @@
+"""
+Candidate offers of ItayNegotiator and ItayJhnNegotiator and their utilities, as arrays.
+
+The utility of a candidate only depends on the agreements made so far, which do not change within a subnegotiation.
+It is therefore computed once per subnegotiation and kept on the agent, and every step only applies the rejection
+count adjustment to the whole array at once.
+"""
+import numpy as np
+
+from .batch_eval import evaluate_many
+from .prefix_eval import has_prefix_state, prefix_candidate_utilities
+from .ufun_cache import cached_ufun
+
+MAX_CANDIDATES = 1000
+
+
+def top_candidates(outcomes, utilities, k):
+    """Returns the k outcomes with the highest utilities, best first. Like a stable sort, ties keep the order of
+    outcomes (also at the k-th place), but only the top k are sorted. NaN utilities count as -inf."""
+    keys = np.asarray(utilities, dtype=float)
+    keys = np.where(np.isnan(keys), float("-inf"), keys)
+    n = len(outcomes)
+    if n > k:
+        threshold = np.partition(keys, n - k)[n - k]  # the k-th highest utility
+        above = np.flatnonzero(keys > threshold)
+        tied = np.flatnonzero(keys == threshold)[: k - len(above)]
+        chosen = np.concatenate((above, tied))
+    else:
+        chosen = np.arange(n)
+    order = chosen[np.lexsort((chosen, -keys[chosen]))]
+    return [outcomes[i] for i in order]
+
+
+def possible_outcomes(self, negotiator_id, max_candidates=MAX_CANDIDATES):
+    """Returns the candidate outcomes of a subnegotiation: its best max_candidates valid outcomes (the ufun can
+    evaluate them) sorted from best to worst, selected with top_candidates. They are computed once per negotiator and
+    outcome space and shared by every step, so callers must not modify the list."""
+    negotiator = self.negotiators[negotiator_id].negotiator
+    outcome_space = negotiator.nmi.outcome_space
+    cache = self.__dict__.setdefault("candidate_outcomes", {})
+    cached = cache.get(negotiator_id)
+    if cached is not None and cached[0] is outcome_space:
+        return cached[1]
+
+    all_outcomes = list(outcome_space.enumerate_or_sample())
+    ufun = negotiator.ufun
+    try:
+        valid_outcomes, utilities = all_outcomes, evaluate_many(ufun, all_outcomes)
+    except Exception:
+        # some outcome is malformed, find out which one by one.
+        valid_outcomes, utilities = [], []
+        for o in all_outcomes:
+            try:
+                utilities.append(ufun(o))
+                valid_outcomes.append(o)
+            except Exception:
+                continue  # skip malformed offers
+    candidates = top_candidates(valid_outcomes, utilities, max_candidates)
+
+    cache[negotiator_id] = (outcome_space, candidates)
+    return candidates
+
+
+def center_candidate_utilities(self, negotiator_id, outcomes):
+    """Returns the candidates (outcomes without None) and the center utility of proposing each of them in the
+    current subnegotiation, given the agreements so far and no agreement in the negotiations after it."""
+    remaining = len(self.negotiators) - len(self.finished_negotiators) - 1
+    key = ("center", negotiator_id, tuple(self.agreements), remaining, len(outcomes))
+    cached = getattr(self, "candidate_utilities", None)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+
+    context = list(self.agreements)
+    context += [(None, None)]
+    ufun = cached_ufun(self)
+    candidates = [o for o in outcomes if o is not None]
+    index = int(negotiator_id[1])
+    if has_prefix_state(self.ufun) and index < len(context):
+        base = prefix_candidate_utilities(self.ufun, context[:index], candidates,
+                                          context[index + 1:] + [None] * remaining)
+        self.candidate_utilities = (key, candidates, base)
+        return candidates, base
+
+    test_contexts = []
+    for outcome in candidates:
+        test_context = context.copy()
+        test_context[index] = outcome
+        test_contexts.append(tuple(test_context + [None] * remaining))
+    base = evaluate_many(ufun, test_contexts)
+
+    self.candidate_utilities = (key, candidates, base)
+    return candidates, base
+
+
+def edge_candidate_utilities(self, negotiator_id, outcomes, ufun):
+    """Returns the candidates (the outcomes followed by None) and the utility of each of them for the edge."""
+    key = ("edge", negotiator_id, id(ufun), len(outcomes))
+    cached = getattr(self, "candidate_utilities", None)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+
+    ufun = cached_ufun(self, ufun)
+    candidates = [o for o in outcomes if o is not None] + [None]
+    base = evaluate_many(ufun, candidates)
+
+    self.candidate_utilities = (key, candidates, base)
+    return candidates, base
+
+
+def offer_base_utility(self, negotiator_id, outcome, ufun=None):
+    """Returns the utility of a single outcome as center_candidate_utilities (without ufun) or
+    edge_candidate_utilities (with the edge ufun) compute it, for offers that are not among the candidates."""
+    if ufun is not None:
+        return float(cached_ufun(self, ufun)(outcome))
+    remaining = len(self.negotiators) - len(self.finished_negotiators) - 1
+    context = list(self.agreements) + [(None, None)]
+    context[int(negotiator_id[1])] = outcome
+    return float(cached_ufun(self)(tuple(context + [None] * remaining)))
+
+
+def rejection_counts(dict_outcome_space, negotiator_id, candidates):
+    """Returns how often each candidate was rejected by me and by the opponent, as two arrays. dict_outcome_space
+    maps negotiator ids to their RejectionTracker; without a tracker for this negotiator nothing was rejected."""
+    if isinstance(dict_outcome_space, dict) and negotiator_id in dict_outcome_space:
+        return dict_outcome_space[negotiator_id].counts_of(candidates)
+    return np.zeros(len(candidates), dtype=int), np.zeros(len(candidates), dtype=int)
+
+
+def best_candidate(candidates, utilities):
+    """Returns the first candidate with the highest utility and that utility, or (None, -inf) if there is none."""
+    comparable = np.where(np.isnan(utilities), float("-inf"), utilities)
+    if len(comparable) == 0 or not comparable.max() > float("-inf"):
+        return None, float("-inf")
+    i = int(np.argmax(comparable))
+    return candidates[i], float(utilities[i])
+
+
+class CandidateStatistics:
+    """Mean, standard deviation and maximum of the candidate utilities of one subnegotiation.
+
+    The utility of candidate j is scale[j] * ((base[j] + a * i_rejected[j]) - (b1 * opp_rejected[j]) * b2), where the
+    coefficients may change every step (the penalty of the center grows with the progress). Running sums of the terms
+    are only updated for the candidates whose rejection counts changed, so a query costs O(1) plus the number of
+    candidates that were rejected at least once. The sums are recomputed once there were more updates than candidates,
+    so the rounding errors of the updates cannot pile up over a long negotiation."""
+
+    def __init__(self, candidates, base, scale, tracker):
+        self.candidates = candidates
+        self.position = {o: k for k, o in enumerate(candidates)}
+        self.n = len(candidates)
+        self.base = base
+        self.scale = scale
+        self.tracker = tracker
+        tracker_positions = np.fromiter((tracker.index.get(o, -1) for o in candidates), dtype=int, count=self.n)
+        self.candidate_of = {int(t): k for k, t in enumerate(tracker_positions) if t >= 0}
+
+        i_rejected, opp_rejected = tracker.counts_of_ids(tracker_positions)
+        self.i_rejected = i_rejected.astype(float)
+        self.opp_rejected = opp_rejected.astype(float)
+        p = scale * base
+        self.p = p
+        # The sums are taken over p - shift (the spread of the utilities does not depend on the shift), so that
+        # E[x^2] - E[x]^2 does not lose the variance to cancellation when the utilities are large and close together.
+        self.shift = float(p.mean()) if self.n else 0.0
+        self.centered = p - self.shift
+        self._recompute()
+        self.rejected = set(np.flatnonzero((self.i_rejected > 0) | (self.opp_rejected > 0)).tolist())
+        # Candidates that were never rejected are worth p, so their maximum is the first of them in this order.
+        self.order = np.argsort(-p, kind="stable")
+        self.top = 0
+        self.synced = len(tracker.changes)
+
+    def _recompute(self):
+        """Sums the terms again from the arrays, which drops the rounding errors of the incremental updates."""
+        p = self.centered
+        q = self.scale * self.i_rejected
+        r = self.scale * self.opp_rejected
+        self.s_p, self.s_q, self.s_r = float(p.sum()), float(q.sum()), float(r.sum())
+        self.s_pp, self.s_qq, self.s_rr = float(p @ p), float(q @ q), float(r @ r)
+        self.s_pq, self.s_pr, self.s_qr = float(p @ q), float(p @ r), float(q @ r)
+        self.updates = 0
+
+    def _set_counts(self, k, i_rejected, opp_rejected):
+        s, p = self.scale[k], self.centered[k]
+        q_old, r_old = s * self.i_rejected[k], s * self.opp_rejected[k]
+        q_new, r_new = s * i_rejected, s * opp_rejected
+        self.s_q += q_new - q_old
+        self.s_r += r_new - r_old
+        self.s_qq += q_new * q_new - q_old * q_old
+        self.s_rr += r_new * r_new - r_old * r_old
+        self.s_pq += p * (q_new - q_old)
+        self.s_pr += p * (r_new - r_old)
+        self.s_qr += q_new * r_new - q_old * r_old
+        self.i_rejected[k] = i_rejected
+        self.opp_rejected[k] = opp_rejected
+        if i_rejected > 0 or opp_rejected > 0:
+            self.rejected.add(k)
+        self.updates += 1
+
+    def sync(self):
+        """Takes over the rejection counts that changed in the tracker since the last call."""
+        changes = self.tracker.changes
+        for t in changes[self.synced:]:
+            k = self.candidate_of.get(t)
+            if k is not None:
+                self._set_counts(k, float(self.tracker.i_rejected[t]), float(self.tracker.opp_rejected[t]))
+        self.synced = len(changes)
+        if self.updates > self.n:
+            self._recompute()
+
+    def utility(self, outcome, a, b1, b2, base=None):
+        """The utility of a single outcome. Outcomes that are not candidates get base(outcome) (with scale 1) and
+        their rejection counts from the tracker, or raise KeyError without base."""
+        k = self.position.get(outcome)
+        if k is None:
+            if base is None:
+                raise KeyError(outcome)
+            i_rejected, opp_rejected = self.tracker.counts(outcome)
+            return float((base(outcome) + a * i_rejected) - (b1 * opp_rejected) * b2)
+        return float(self.scale[k] * ((self.base[k] + a * self.i_rejected[k]) - (b1 * self.opp_rejected[k]) * b2))
+
+    def mean(self, a, b):
+        """The mean utility of the candidates, with b = b1 * b2."""
+        return self.shift + self._centered_mean(a, b)
+
+    def _centered_mean(self, a, b):
+        return (self.s_p + a * self.s_q - b * self.s_r) / self.n
+
+    def std(self, a, b):
+        """The (population) standard deviation of the utilities of the candidates, with b = b1 * b2."""
+        mean = self._centered_mean(a, b)
+        square = (self.s_pp + a * a * self.s_qq + b * b * self.s_rr
+                  + 2 * a * self.s_pq - 2 * b * self.s_pr - 2 * a * b * self.s_qr) / self.n
+        return float(np.sqrt(max(square - mean * mean, 0.0)))
+
+    def max(self, a, b1, b2):
+        """The highest utility of any candidate."""
+        while self.top < self.n and int(self.order[self.top]) in self.rejected:
+            self.top += 1
+        best = float(self.p[self.order[self.top]]) if self.top < self.n else float("-inf")
+        if self.rejected:
+            k = np.fromiter(self.rejected, dtype=int, count=len(self.rejected))
+            utilities = self.scale[k] * ((self.base[k] + a * self.i_rejected[k]) - (b1 * self.opp_rejected[k]) * b2)
+            best = max(best, float(utilities.max()))
+        return best
+
+
+def candidate_statistics(self, negotiator_id, candidates, base, scale, tracker):
+    """Returns the CandidateStatistics of the candidates of this subnegotiation, synced with the tracker. They are
+    rebuilt when the candidates change (a new subnegotiation) and kept on the agent otherwise."""
+    stats = getattr(self, "candidate_stats", None)
+    if stats is None or stats.candidates is not candidates or stats.tracker is not tracker:
+        stats = self.candidate_stats = CandidateStatistics(candidates, base, scale, tracker)
+    stats.sync()
+    return stats
@@ -3,6 +3,21 @@
 from negmas.sao.controllers import SAOState
 import itertools
 
+from anl2025.ufun import MaxCenterUFun
+
+from .utility_tensor import build_utility_tensor
+from .branch_and_bound import branch_and_bound_best_bid, has_upper_bound
+from .batch_eval import evaluate_many
+from .outcome_registry import OutcomeRegistry, outcome_spaces_of
+from .lookahead import build_lookahead_planner
+from .max_center_index import EvaluatedCenterIndex, MaxCenterIndex
+from .agreement_ledger import AgreementLedger
+from .anytime import Budget, anytime_argmax, call_budget, negotiation_budget
+from .quantity_sum import build_quantity_sum_engine, has_quantity_sum
+
+# Number of joint outcomes that iter_bids_with_agreements_fixed yields at once.
+BATCH_SIZE = 4096
+
 def set_id_dict(self):
     """Creates a dictionary that maps the index of the negotiation to the negotiator id. The index of the negotiation is the order in which the negotiation happen in sequence.
     This dictionary allows us to find the right id for easy access to further information about the specific negotiation."""
@@ -15,6 +30,8 @@ def did_negotiation_end(self):
     """The function finished_negotiators checks how many threads are finished. If that number changes, then the next negotiation has started."""
     if self.current_neg_index != len(self.finished_negotiators):
         self.current_neg_index = len(self.finished_negotiators)
+        # Record the agreement of the negotiation that just ended, once.
+        get_agreement_ledger(self)
         return True
     return False
 
@@ -30,15 +47,40 @@ def get_agreement_at_index(self, index):
     # print(agreement)
     return agreement
 
-def get_outcome_space_from_index(self, index):
-    """This function returns the outcome space of the subnegotiation with the given index."""
-    outcomes = self.ufun.outcome_spaces[index].enumerate_or_sample()
-    #  print(outcomes)
+def get_agreement_ledger(self):
+    """Returns the agreements of the finished negotiations (see agreement_ledger.py), kept on the agent. The agreements
+    of negotiations that finished since the last call are added first, so the ledger is always up to date."""
+    ledger = getattr(self, "agreement_ledger", None)
+    if ledger is None:
+        ledger = self.agreement_ledger = AgreementLedger(get_number_of_subnegotiations(self))
+    neg_index = get_current_negotiation_index(self)
+    if len(ledger) < neg_index:
+        ledger.extend(get_agreement_at_index(self, i) for i in range(len(ledger), neg_index))
+    return ledger
 
-    # Each subnegotiation can also end in disagreement aka outcome None. Therefore, we add this to all outcomes.
-    outcomes.append(None)
+def get_prev_agreements(self):
+    """Returns the agreements of the finished negotiations as a tuple, shared by all callers."""
+    return get_agreement_ledger(self).prefix
 
-    return outcomes
+def get_outcome_registry(self):
+    """Returns the registry with the outcomes (and their integer ids) of every subnegotiation, see outcome_registry.py.
+    The outcome spaces are enumerated the first time it is needed and the registry is then kept on the agent."""
+    if not hasattr(self, "outcome_registry"):
+        self.outcome_registry = OutcomeRegistry(outcome_spaces_of(self.ufun))
+    return self.outcome_registry
+
+def get_registry_index(self, negotiator_id):
+    """Returns the index of the subnegotiation of negotiator_id in the outcome registry. The registry of an edge agent
+    only has the outcome space of its own ufun, at index 0."""
+    if is_edge_agent(self):
+        return 0
+    return self.negotiators[negotiator_id].context['index']
+
+def get_outcome_space_from_index(self, index):
+    """This function returns the outcome space of the subnegotiation with the given index."""
+    # Each subnegotiation can also end in disagreement aka outcome None, which is the last outcome.
+    # The tuple comes from the outcome registry and is shared by all callers, so it is never enumerated again.
+    return get_outcome_registry(self).outcomes(index)
 
 def get_number_of_subnegotiations(self):
     """Returns the total number of (sub)negotiations that the agent is involved in. For edge agents, this is 1."""
@@ -56,6 +98,22 @@ def is_edge_agent(self):
         return True
     return False
 
+def possible_outcomes_per_index(self):
+    """Returns, for each subnegotiation, the outcomes that are still possible: the agreement for the negotiations that
+    ended and the whole outcome space (with None) for the others."""
+    agreements = get_prev_agreements(self)
+    neg_index = len(agreements)
+
+    #As the previous agreements are fixed, these are added first.
+    possible_outcomes = [[agreement] for agreement in agreements]
+
+    # The coming negotiations (with index higher than the current negotiation index) can still be anything, so we just list all possibilities there.
+    n = get_number_of_subnegotiations(self)
+    for i in range(neg_index, n):
+        possible_outcomes.append(get_outcome_space_from_index(self,i))
+    #print(possible_outcomes)
+    return possible_outcomes
+
 def all_possible_bids_with_agreements_fixed(self):
     """ This function returns all the bids that are still possible to achieve, given the agreements that were made in the previous negotiations."""
 
@@ -69,39 +127,128 @@ def all_possible_bids_with_agreements_fixed(self):
     if is_edge_agent(self):
         return self.ufun.outcome_space.enumerate_or_sample()
 
-    possible_outcomes = []
-    neg_index = get_current_negotiation_index(self)
+    #The cartesian product constructs the combinations of all possible outcomes.
+    adapted_outcomes = cartesian_product(possible_outcomes_per_index(self))
+    return adapted_outcomes
 
-    #As the previous agreements are fixed, these are added first.
-    for i in range(neg_index):
-        possible_outcomes.append([get_agreement_at_index(self,i)])
+def iter_bids_with_agreements_fixed(self, batch_size=BATCH_SIZE):
+    """Lazy version of all_possible_bids_with_agreements_fixed. Yields the same bids in the same order, in lists of at
+    most batch_size bids, so only one batch is in memory at a time."""
+    if is_edge_agent(self):
+        bids = iter(self.ufun.outcome_space.enumerate_or_sample())
+    else:
+        bids = itertools.product(*possible_outcomes_per_index(self))
+    while True:
+        batch = list(itertools.islice(bids, batch_size))
+        if not batch:
+            return
+        yield batch
 
-    # The coming negotiations (with index higher than the current negotiation index) can still be anything, so we just list all possibilities there.
-    n = get_number_of_subnegotiations(self)
-    for i in range(neg_index, n):
-        possible_outcomes.append(get_outcome_space_from_index(self,i))
-    #print(possible_outcomes)
+def get_utility_tensor(self):
+    """Returns the table with the center utility of every joint outcome (see utility_tensor.py).
+    The table is built the first time it is needed and then kept on the agent. It is None for edge agents and for
+    outcome spaces that are too large to tabulate."""
+    if not hasattr(self, "utility_tensor"):
+        self.utility_tensor = None if is_edge_agent(self) else build_utility_tensor(self.ufun, get_outcome_registry(self))
+    return self.utility_tensor
 
-    #The cartesian product constructs the combinations of all possible outcomes.
-    adapted_outcomes = cartesian_product(possible_outcomes)
-    return adapted_outcomes
+def get_max_center_index(self):
+    """Returns the sorted side utilities of a MaxCenterUFun center (see max_center_index.py), kept on the agent. Without
+    partial agreements it is an EvaluatedCenterIndex, which scores the options with the center ufun instead. It is
+    None for edge agents and other center ufuns."""
+    if not hasattr(self, "max_center_index"):
+        if is_edge_agent(self) or not isinstance(self.ufun, MaxCenterUFun):
+            self.max_center_index = None
+        elif getattr(self.ufun, "allow_partial_agreements", True):
+            self.max_center_index = MaxCenterIndex(self.ufun, get_outcome_registry(self))
+        else:
+            self.max_center_index = EvaluatedCenterIndex(self.ufun, get_outcome_registry(self))
+    return self.max_center_index
 
-def find_best_bid_in_outcomespace(self):
-    """Fixing previous agreements, this functions returns the best bid that can still be achieved."""
-    # get outcome space with all bids with fixed agreements
-    updated_outcomes = all_possible_bids_with_agreements_fixed(self)
-
-    # this function is also in self.ufun.extreme_outcomes()
-    mn, mx = float("inf"), float("-inf")
-    worst, best = None, None
-    for o in updated_outcomes:
-        u = self.ufun(o)
-        if u < mn:
-            worst, mn = o, u
-        if u > mx:
-            best, mx = o, u
+def get_quantity_sum_engine(self):
+    """Returns the tables of best values over the total quantity (see quantity_sum.py) for center ufuns whose value
+    only depends on it, and None otherwise. They are kept on the agent and rebuilt when the expected outcomes of the
+    ufun change."""
+    if is_edge_agent(self) or not has_quantity_sum(self.ufun):
+        return None
+    engine = getattr(self, "quantity_sum_engine", None)
+    if engine is None or engine.is_stale():
+        engine = self.quantity_sum_engine = build_quantity_sum_engine(self.ufun, get_outcome_registry(self))
+    return engine
+
+def get_call_budget(self, index=None):
+    """Returns the Budget (see anytime.py) of one propose or respond call in the subnegotiation with the given index,
+    the current one by default. It never runs out if the negotiation has no time limit."""
+    if is_edge_agent(self):
+        nmi = next(iter(self.negotiators.values())).negotiator.nmi
+    else:
+        if index is None:
+            index = min(get_current_negotiation_index(self), get_number_of_subnegotiations(self) - 1)
+        nmi = get_nmi_from_index(self, index)
+    return Budget(call_budget(nmi))
+
+def get_init_budget(self):
+    """Returns the Budget (see anytime.py) of the searches in init, a share of the time limit of a negotiation (all
+    negotiations of a session have the same limits). It never runs out if the negotiation has no time limit."""
+    if not self.negotiators:
+        return Budget()
+    return Budget(negotiation_budget(next(iter(self.negotiators.values())).negotiator.nmi))
+
+def find_best_bid_in_outcomespace(self, budget=None):
+    """Fixing previous agreements, this functions returns the best bid that can still be achieved.
+    The searches stop when the budget (the call budget of the current negotiation by default, see get_call_budget)
+    runs out and then return the best bid found so far; pass Budget() for an exhaustive search."""
+    # If the value only depends on the total quantity, the best bid follows from the reachable sums of the edges.
+    engine = get_quantity_sum_engine(self)
+    if engine is not None:
+        best, _ = engine.best_completion(get_prev_agreements(self))
+        return best
+
+    # If the utilities of all joint outcomes are tabulated, the best bid is just the maximum of a slice of the table.
+    tensor = get_utility_tensor(self)
+    if tensor is not None:
+        try:
+            best, _ = tensor.best_completion(get_prev_agreements(self))
+            return best
+        except KeyError:
+            # an agreement outside of the enumerated outcome space, search the outcome space instead.
+            pass
+
+    # Otherwise search the remaining combinations depth-first, without building the cartesian product.
+    budget = budget if budget is not None else get_call_budget(self)
+    if not is_edge_agent(self) and has_upper_bound(self.ufun):
+        best, _ = branch_and_bound_best_bid(self.ufun, get_prev_agreements(self), possible_outcomes_per_index(self),
+                                            budget)
+        return best
+
+    # Without bounds to prune on, every bid has to be scored. This is done batch by batch, keeping the first best bid.
+    best, _, _ = anytime_argmax(iter_bids_with_agreements_fixed(self), lambda batch: evaluate_many(self.ufun, batch),
+                                budget)
     return best
 
+def get_lookahead_planner(self, model=None):
+    """Returns the planner with the expected utility of every agreement prefix (see lookahead.py), for the given
+    agreement model (a constant probability by default). It is rebuilt when the model or the expected outcomes of the
+    center ufun change, and is None for edge agents and for outcome spaces that are too large to tabulate."""
+    if is_edge_agent(self):
+        return None
+    planner = getattr(self, "lookahead_planner", None)
+    if planner is None or planner.is_stale() or (model is not None and planner.model is not model):
+        planner = self.lookahead_planner = build_lookahead_planner(self.ufun, get_outcome_registry(self), model)
+    return planner
+
+def find_best_lookahead_outcome(self, model=None):
+    """Returns the outcome to aim for in the current negotiation given the previous agreements, taking into account
+    that the remaining negotiations may fail, together with its expected utility. Returns None if there is no
+    planner (see get_lookahead_planner) or one of the agreements is not part of the enumerated outcome space."""
+    planner = get_lookahead_planner(self, model)
+    if planner is None:
+        return None
+    try:
+        return planner.best_target(get_prev_agreements(self))
+    except KeyError:
+        return None
+
 def get_target_bid_at_current_index(self):
     """ Returns the bid for the current subnegotiation, with the target_bid as source.
         """
@@ -0,0 +1,289 @@
+"""
+Backward induction over the sequence of subnegotiations of a center agent.
+
+The center negotiates with its edges one after the other. If it aims for outcome o in subnegotiation i, the edge
+agrees with probability p_i(o) (given by an agreement model), and otherwise the subnegotiation ends without agreement.
+The planner computes the expected center utility of aiming for the best outcomes in the remaining subnegotiations,
+for every prefix of agreements:
+
+    V_n(a_0, ..., a_n-1) = u(a_0, ..., a_n-1)
+    V_i(prefix) = max over o of  p_i(o) * V_i+1(prefix + o) + (1 - p_i(o)) * V_i+1(prefix + None)
+
+The values are tabulated backwards with NumPy once, and again when the expected outcomes of the center ufun change.
+How they are tabulated depends on the center ufun:
+
+- MaxCenterUFun: the utility only depends on the highest side utility so far, so V_i is a vector over the distinct
+  side utilities of all edges.
+- LinearCombinationCenterUFun: the utility is a weighted sum, so V_i(prefix) is the sum of the prefix plus a constant.
+- Other center ufuns: the full utility table (see utility_tensor.py) is reduced one axis at a time.
+
+Outcomes follow the outcome registry: the last outcome of every subnegotiation is None (no agreement).
+"""
+import numpy as np
+from anl2025.ufun import MaxCenterUFun, LinearCombinationCenterUFun
+
+from .utility_tensor import build_utility_tensor
+
+
+class ConstantAgreementModel:
+    """Every outcome is agreed on with the same probability."""
+
+    def __init__(self, probability=0.5):
+        self.probability = probability
+
+    def __call__(self, index, outcomes, utilities):
+        return np.full(len(outcomes), self.probability, dtype=float)
+
+
+class ConcessionAgreementModel:
+    """The better an outcome is for the center, the less likely the edge agrees to it: the probability falls linearly
+    from high for the worst outcome to low for the best one."""
+
+    def __init__(self, low=0.2, high=0.9):
+        self.low = low
+        self.high = high
+
+    def __call__(self, index, outcomes, utilities):
+        utilities = np.asarray(utilities, dtype=float)
+        finite = utilities[np.isfinite(utilities)]
+        if len(finite) == 0 or finite.max() <= finite.min():
+            return np.full(len(outcomes), self.high, dtype=float)
+        worst, best = finite.min(), finite.max()
+        relative = np.clip((utilities - worst) / (best - worst), 0.0, 1.0)
+        relative[~np.isfinite(utilities)] = 0.0
+        return self.high - (self.high - self.low) * relative
+
+
+def _expectation(p, success, failure):
+    """p * success + (1 - p) * failure, where a term with probability 0 counts as 0 (also if its utility is -inf)."""
+    with np.errstate(invalid="ignore"):
+        return np.where(p > 0, p * success, 0.0) + np.where(p < 1, (1 - p) * failure, 0.0)
+
+
+def _planner_state(ufun):
+    """Everything besides the outcomes that the utilities depend on."""
+    expected = getattr(ufun, "_expected", None)
+    return ufun.reserved_value, None if expected is None else tuple(expected)
+
+
+def _side_utilities(ufun, outcomes):
+    """The side utility of every outcome of every edge, as one vector per edge. No agreement is replaced by the
+    expected outcome of the edge first, like CenterUFun.eval_with_expected does. NaN counts as -inf."""
+    vectors = []
+    for side, expected, os in zip(ufun.ufuns, ufun._expected, outcomes):
+        v = np.array([float(side(o if o else expected)) for o in os], dtype=float)
+        v[np.isnan(v)] = float("-inf")
+        vectors.append(v)
+    return vectors
+
+
+def _probabilities(model, outcomes, utilities):
+    return [np.clip(np.asarray(model(i, os, u), dtype=float), 0.0, 1.0)
+            for i, (os, u) in enumerate(zip(outcomes, utilities))]
+
+
+class _MaxKernel:
+    """Tabulation for MaxCenterUFun, over the highest side utility so far."""
+
+    def __init__(self, ufun, outcomes, model):
+        sides = _side_utilities(ufun, outcomes)
+        self.p = _probabilities(model, outcomes, sides)
+        self.n = len(outcomes)
+        self.reserved_value = ufun.reserved_value
+        # The center gets its reserved value only if all subnegotiations fail and no expected outcome is known.
+        self.reserved_possible = not any(ufun._expected)
+        # grid[x] is a possible highest side utility, position 0 (-inf) is the state before the first edge.
+        self.grid = np.unique(np.concatenate([[float("-inf")]] + sides))
+        self.states = [np.searchsorted(self.grid, s) for s in sides]
+
+        states = np.arange(len(self.grid))[:, None]
+        self.v = [None] * (self.n + 1)
+        self.v[self.n] = self.grid
+        for i in range(self.n - 1, -1, -1):
+            success = self.v[i + 1][np.maximum(states, self.states[i][None, :])]
+            q = _expectation(self.p[i], success, success[:, -1:])
+            q[:, -1] = success[:, -1]
+            self.v[i] = q.max(axis=1)
+
+        # a[i] is the value after i subnegotiations without agreement, none_state[i] the highest side utility then.
+        self.none_state = [0] * (self.n + 1)
+        for i in range(self.n):
+            self.none_state[i + 1] = max(self.none_state[i], int(self.states[i][-1]))
+        self.a = [None] * (self.n + 1)
+        self.a[self.n] = self.reserved_value
+        for i in range(self.n - 1, -1, -1):
+            self.a[i] = float(self.q_all_none(i).max())
+
+    def q_all_none(self, i):
+        success = self.v[i + 1][np.maximum(self.none_state[i], self.states[i])]
+        q = _expectation(self.p[i], success, self.a[i + 1])
+        q[-1] = self.a[i + 1]
+        return q
+
+    def _all_none(self, prefix_ids):
+        return self.reserved_possible and all(j == len(self.states[k]) - 1 for k, j in enumerate(prefix_ids))
+
+    def _state(self, prefix_ids):
+        return max((int(self.states[k][j]) for k, j in enumerate(prefix_ids)), default=0)
+
+    def q_values(self, prefix_ids):
+        i = len(prefix_ids)
+        if self._all_none(prefix_ids):
+            return self.q_all_none(i)
+        success = self.v[i + 1][np.maximum(self._state(prefix_ids), self.states[i])]
+        q = _expectation(self.p[i], success, success[-1])
+        q[-1] = success[-1]
+        return q
+
+    def value(self, prefix_ids):
+        if len(prefix_ids) < self.n:
+            return float(self.q_values(prefix_ids).max())
+        if self._all_none(prefix_ids):
+            return float(self.reserved_value)
+        return float(self.grid[self._state(prefix_ids)])
+
+
+class _AdditiveKernel:
+    """Tabulation for LinearCombinationCenterUFun: the value of a prefix is its weighted sum plus a constant."""
+
+    def __init__(self, ufun, outcomes, model):
+        sides = _side_utilities(ufun, outcomes)
+        self.p = _probabilities(model, outcomes, sides)
+        self.n = len(outcomes)
+        self.reserved_value = ufun.reserved_value
+        self.reserved_possible = not any(ufun._expected)
+        self.c = [s * w for s, w in zip(sides, ufun._weights)]
+
+        # w[i] is the expected sum of the contributions of subnegotiations i and later.
+        self.w = [0.0] * (self.n + 1)
+        for i in range(self.n - 1, -1, -1):
+            q = _expectation(self.p[i], self.c[i], self.c[i][-1])
+            q[-1] = self.c[i][-1]
+            self.w[i] = self.w[i + 1] + float(q.max())
+
+        # a[i] is the value after i subnegotiations without agreement, none_sum[i] the sum of their contributions.
+        self.none_sum = [0.0] * (self.n + 1)
+        for i in range(self.n):
+            self.none_sum[i + 1] = self.none_sum[i] + float(self.c[i][-1])
+        self.a = [None] * (self.n + 1)
+        self.a[self.n] = self.reserved_value
+        for i in range(self.n - 1, -1, -1):
+            self.a[i] = float(self.q_all_none(i).max())
+
+    def q_all_none(self, i):
+        success = self.none_sum[i] + self.c[i] + self.w[i + 1]
+        q = _expectation(self.p[i], success, self.a[i + 1])
+        q[-1] = self.a[i + 1]
+        return q
+
+    def _all_none(self, prefix_ids):
+        return self.reserved_possible and all(j == len(self.c[k]) - 1 for k, j in enumerate(prefix_ids))
+
+    def q_values(self, prefix_ids):
+        i = len(prefix_ids)
+        if self._all_none(prefix_ids):
+            return self.q_all_none(i)
+        total = sum(float(self.c[k][j]) for k, j in enumerate(prefix_ids))
+        success = total + self.c[i] + self.w[i + 1]
+        q = _expectation(self.p[i], success, success[-1])
+        q[-1] = success[-1]
+        return q
+
+    def value(self, prefix_ids):
+        if len(prefix_ids) < self.n:
+            return float(self.q_values(prefix_ids).max())
+        if self._all_none(prefix_ids):
+            return float(self.reserved_value)
+        return sum(float(self.c[k][j]) for k, j in enumerate(prefix_ids))
+
+
+class _TensorKernel:
+    """Tabulation for any center ufun, reducing its utility table one axis at a time."""
+
+    def __init__(self, tensor, model):
+        values = tensor.values
+        self.n = values.ndim
+        # How good every outcome is for the center on its own (all other subnegotiations failing).
+        alone = []
+        for i in range(self.n):
+            index = [-1] * self.n
+            index[i] = slice(None)
+            alone.append(values[tuple(index)])
+        self.p = _probabilities(model, tensor.outcomes, alone)
+
+        self.v = [None] * (self.n + 1)
+        self.v[self.n] = values
+        for i in range(self.n - 1, -1, -1):
+            success = self.v[i + 1]
+            # Axis i is the last axis of v[i + 1], the axes of the later subnegotiations were reduced already.
+            q = _expectation(self.p[i], success, success[..., -1:])
+            q[..., -1] = success[..., -1]
+            self.v[i] = q.max(axis=-1)
+
+    def q_values(self, prefix_ids):
+        success = self.v[len(prefix_ids) + 1]
+        success = np.asarray(success[tuple(prefix_ids)], dtype=float)
+        q = _expectation(self.p[len(prefix_ids)], success, success[-1])
+        q[-1] = success[-1]
+        return q
+
+    def value(self, prefix_ids):
+        return float(self.v[len(prefix_ids)][tuple(prefix_ids)])
+
+
+class LookaheadPlanner:
+    """Expected center utility of the best targets in the remaining subnegotiations, for every agreement prefix."""
+
+    def __init__(self, ufun, registry, kernel, model):
+        self.ufun = ufun
+        self.registry = registry
+        self.model = model
+        self.state = _planner_state(ufun)
+        self._kernel = kernel
+
+    def __len__(self):
+        return len(self.registry)
+
+    def is_stale(self):
+        """True if the expected outcomes or the reserved value of the ufun changed since the tables were built."""
+        return _planner_state(self.ufun) != self.state
+
+    def _ids(self, agreements):
+        return tuple(self.registry.id_of(i, a) for i, a in enumerate(agreements))
+
+    def q_values(self, agreements):
+        """The expected utility of aiming for each outcome of the next subnegotiation (index len(agreements)), as an
+        array aligned with registry.outcomes(len(agreements)). Raises KeyError for unknown agreements."""
+        return self._kernel.q_values(self._ids(agreements))
+
+    def value(self, agreements):
+        """The expected utility of the agreements so far, given the best targets in the remaining subnegotiations."""
+        return self._kernel.value(self._ids(agreements))
+
+    def best_target(self, agreements):
+        """The outcome to aim for in the next subnegotiation and its expected utility. Ties go to the first outcome,
+        and (None, -inf) is returned if no outcome has a valid utility."""
+        q = self.q_values(agreements)
+        q = np.where(np.isnan(q), float("-inf"), q)
+        j = int(np.argmax(q))
+        if q[j] == float("-inf"):
+            return None, float("-inf")
+        return self.registry.outcome_of(len(agreements), j), float(q[j])
+
+
+def build_lookahead_planner(ufun, registry, model=None):
+    """Builds the planner of a center ufun, or returns None if its outcome space is too large to tabulate (see
+    build_utility_tensor). model(index, outcomes, utilities) returns the probability that each outcome of
+    subnegotiation index is agreed on, given how good each is for the center; it defaults to a constant 0.5."""
+    if model is None:
+        model = ConstantAgreementModel()
+    outcomes = tuple(registry.outcomes(i) for i in range(len(registry)))
+    if getattr(ufun, "allow_partial_agreements", True):
+        if isinstance(ufun, MaxCenterUFun):
+            return LookaheadPlanner(ufun, registry, _MaxKernel(ufun, outcomes, model), model)
+        if isinstance(ufun, LinearCombinationCenterUFun) and ufun._weights is not None:
+            return LookaheadPlanner(ufun, registry, _AdditiveKernel(ufun, outcomes, model), model)
+    tensor = build_utility_tensor(ufun, registry)
+    if tensor is None:
+        return None
+    return LookaheadPlanner(ufun, registry, _TensorKernel(tensor, model), model)
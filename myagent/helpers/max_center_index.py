@@ -0,0 +1,166 @@
+"""
+Utilities of the options of the current negotiation under a MaxCenterUFun, without calling the center ufun.
+
+The utility of a MaxCenterUFun is the maximum of the side utilities of all edges. With the agreements of the finished
+negotiations locked in and no agreement in the negotiations after the current one, every edge but the current one
+contributes a fixed value, so the utility of bidding o is max(floor, side(o)). The side utilities of the current edge
+are computed once and kept sorted, so locking in a new round and ranking the options only needs a bisection.
+
+Without partial agreements the utility is not a maximum over the edges alone, so EvaluatedCenterIndex answers the same
+queries by scoring the options of the current negotiation with the center ufun once per round.
+"""
+from collections.abc import Sequence
+
+import numpy as np
+
+from .batch_eval import evaluate_many
+
+
+class RankedOptions(Sequence):
+    """The options of the current negotiation sorted by utility (ascending, ties in outcome order) as
+    (joint outcome, utility, outcome) entries, like the options_by_utilities lists of the agents. Entries are built
+    when they are accessed."""
+
+    def __init__(self, index, ranking, utilities):
+        self.index = index
+        self.ranking = ranking
+        self.utilities = utilities
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[j] for j in range(*k.indices(len(self)))]
+        outcome = self.index.outcomes[self.ranking[k]]
+        return self.index.joint_outcome(outcome), float(self.utilities[k]), outcome
+
+    def best(self):
+        """The entries with the highest utility, in order."""
+        if len(self) == 0:
+            return []
+        start = int(np.searchsorted(self.utilities, self.utilities[-1], side="left"))
+        return self[start:]
+
+
+class MaxCenterIndex:
+    """Side utilities of the outcomes of every edge of a MaxCenterUFun, sorted, for the negotiation set by lock."""
+
+    def __init__(self, ufun, registry):
+        self.ufun = ufun
+        self.registry = registry
+        self.n = len(registry)
+        # Per edge (computed when it is first locked): the side utility of every outcome without None, by outcome
+        # id, the ids sorted by side utility (stable) and the sorted side utilities.
+        self._values = {}
+        self._order = {}
+        self._sorted = {}
+        self.current = None
+
+    def _side(self, i, outcome):
+        return float(self.ufun.ufuns[i](outcome))
+
+    def _edge(self, i):
+        if i not in self._values:
+            outcomes = self.registry.outcomes(i)[:-1]
+            values = np.fromiter((self._side(i, o) for o in outcomes), dtype=float, count=len(outcomes))
+            order = np.argsort(values, kind="stable")
+            self._values[i], self._order[i], self._sorted[i] = values, order, values[order]
+        return self._values[i], self._order[i], self._sorted[i]
+
+    def lock(self, agreements):
+        """Fixes the agreements of the finished negotiations. Queries are then about the next negotiation (index
+        len(agreements)), assuming no agreement in the negotiations after it."""
+        i = len(agreements)
+        expected = self.ufun._expected
+        # Like CenterUFun.eval_with_expected, missing agreements are replaced by the expected outcomes.
+        others = [a if a else e for a, e in zip(agreements, expected)] + list(expected[i + 1:])
+        sides = [k for k in range(self.n) if k != i]
+        self.current = i
+        self.agreements = list(agreements)
+        self.floor = max((self._side(k, o) for k, o in zip(sides, others)), default=float("-inf"))
+        # If every other edge fails and the current one fails as well, the center gets its reserved value.
+        self.reserved_case = all(o is None for o in others)
+        self.outcomes = self.registry.outcomes(i)
+        self._ranked = None
+        self.none_utility = self._utility_of_none()
+        return self
+
+    def _utility_of_none(self):
+        expected = self.ufun._expected[self.current]
+        if not expected and self.reserved_case:
+            return float(self.ufun.reserved_value)
+        return max(self.floor, self._side(self.current, expected if expected else None))
+
+    def joint_outcome(self, outcome):
+        """The joint outcome of bidding outcome now: the agreements so far, outcome, and no agreement afterwards."""
+        return self.agreements + [outcome] + [None] * (self.n - self.current - 1)
+
+    def utility(self, outcome):
+        """The center utility of the joint outcome of bidding outcome in the current negotiation."""
+        if not outcome:
+            return self.none_utility
+        j = self.registry.id_map(self.current).get(outcome)
+        if j is None:
+            # not part of the enumerated outcome space, ask the side ufun.
+            return max(self.floor, self._side(self.current, outcome))
+        values, _, _ = self._edge(self.current)
+        return max(self.floor, float(values[j]))
+
+    def ranked_options(self):
+        """The options of the current negotiation (its outcomes and None) sorted by utility, see RankedOptions."""
+        if self._ranked is not None:
+            return self._ranked
+        _, order, sorted_values = self._edge(self.current)
+        # Outcomes with a side utility up to the floor are all worth the floor, so among them the outcome order
+        # decides; the others keep the order of their side utilities.
+        k = int(np.searchsorted(sorted_values, self.floor, side="right"))
+        ranking = np.concatenate((np.sort(order[:k]), order[k:]))
+        utilities = np.concatenate((np.full(k, self.floor), sorted_values[k:]))
+        # None has the last id, so it comes after all options with the same utility.
+        position = int(np.searchsorted(utilities, self.none_utility, side="right"))
+        ranking = np.insert(ranking, position, len(self.outcomes) - 1)
+        utilities = np.insert(utilities, position, self.none_utility)
+        self._ranked = RankedOptions(self, ranking, utilities)
+        return self._ranked
+
+
+class EvaluatedCenterIndex:
+    """The queries of MaxCenterIndex for a center ufun that has to be called on the joint outcomes (a MaxCenterUFun
+    without partial agreements). lock scores every option of the next negotiation once."""
+
+    def __init__(self, ufun, registry):
+        self.ufun = ufun
+        self.registry = registry
+        self.n = len(registry)
+        self.current = None
+
+    def lock(self, agreements):
+        """Fixes the agreements of the finished negotiations, see MaxCenterIndex.lock."""
+        self.current = len(agreements)
+        self.agreements = list(agreements)
+        self.outcomes = self.registry.outcomes(self.current)
+        # by outcome id, so None (the last id) is last
+        self.values = evaluate_many(self.ufun, [self.joint_outcome(o) for o in self.outcomes])
+        self.none_utility = float(self.values[-1])
+        ranking = np.argsort(self.values, kind="stable")
+        self._ranked = RankedOptions(self, ranking, self.values[ranking])
+        return self
+
+    def joint_outcome(self, outcome):
+        """The joint outcome of bidding outcome now: the agreements so far, outcome, and no agreement afterwards."""
+        return self.agreements + [outcome] + [None] * (self.n - self.current - 1)
+
+    def utility(self, outcome):
+        """The center utility of the joint outcome of bidding outcome in the current negotiation."""
+        if not outcome:
+            return self.none_utility
+        j = self.registry.id_map(self.current).get(outcome)
+        if j is None:
+            # not part of the enumerated outcome space, ask the center ufun.
+            return float(self.ufun(self.joint_outcome(outcome)))
+        return float(self.values[j])
+
+    def ranked_options(self):
+        """The options of the current negotiation (its outcomes and None) sorted by utility, see RankedOptions."""
+        return self._ranked
@@ -0,0 +1,82 @@
+"""
+The recent offers of the opponent in one subnegotiation, for ImprovedUnifiedNegotiator.
+
+Every offer is stored once, as its id in the outcome registry (see outcome_registry.py) with my utility and the
+opponent's utility of it, in fixed-size NumPy arrays used as a ring buffer, so choosing among the offers is a masked
+argmax over the stored utilities instead of evaluating the ufuns again. When the buffer is full, the oldest entries
+are dropped until keep entries are left (with the new one), like the list of the last 50 offers that was cut back to
+the last 30.
+"""
+import numpy as np
+
+
+class OfferBuffer:
+    """The last offers of the opponent (at most capacity) with my utility and the opponent's utility of each."""
+
+    def __init__(self, capacity=50, keep=30):
+        self.capacity = capacity
+        self.keep = keep
+        self.ids = np.zeros(capacity, dtype=int)
+        self.my_utilities = np.zeros(capacity)
+        self.opp_utilities = np.zeros(capacity)
+        # the outcomes of the subnegotiation by registry id, and the ids of the outcomes
+        self.outcomes = ()
+        self.id_map = {}
+        self.clear()
+
+    def reset(self, outcomes, id_map):
+        """Forgets the offers and takes the outcomes and the id map of the next subnegotiation from the outcome
+        registry (registry.outcomes(index) and registry.id_map(index))."""
+        self.outcomes = outcomes
+        self.id_map = id_map
+        self.clear()
+
+    def clear(self):
+        """Forgets the offers."""
+        self.start = 0  # slot of the oldest entry
+        self.size = 0
+        self._order = None
+
+    def __len__(self):
+        return self.size
+
+    def add(self, outcome, my_utility, opp_utility):
+        """Stores an offer. Raises KeyError (and stores nothing) for outcomes outside the outcome space."""
+        i = self.id_map[outcome]
+        if self.size == self.capacity:
+            dropped = self.capacity - self.keep + 1
+            self.start = (self.start + dropped) % self.capacity
+            self.size -= dropped
+        slot = (self.start + self.size) % self.capacity
+        self.ids[slot] = i
+        self.my_utilities[slot] = my_utility
+        self.opp_utilities[slot] = opp_utility
+        self.size += 1
+        self._order = None
+
+    def order(self):
+        """The slots of the entries, oldest first."""
+        if self._order is None:
+            self._order = (self.start + np.arange(self.size)) % self.capacity
+        return self._order
+
+    def mine(self):
+        """My utility of every entry, oldest first."""
+        return self.my_utilities[self.order()]
+
+    def theirs(self):
+        """The opponent's utility of every entry, oldest first."""
+        return self.opp_utilities[self.order()]
+
+    def best(self, mask, *keys):
+        """The outcome of the entry with the highest keys (arrays like mine(), compared in order) among the entries
+        where mask holds, the oldest one on ties, or None if mask holds for no entry."""
+        candidates = np.flatnonzero(mask)
+        for key in keys:
+            if len(candidates) == 0:
+                break
+            values = key[candidates]
+            candidates = candidates[values == values.max()]
+        if len(candidates) == 0:
+            return None
+        return self.outcomes[self.ids[self.order()[candidates[0]]]]
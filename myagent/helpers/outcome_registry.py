@@ -0,0 +1,63 @@
+"""
+Dense integer ids for the outcomes of every subnegotiation.
+
+The outcome spaces of a scenario never change, so they are enumerated once. Id j of edge i is the j-th outcome of
+the outcome space of edge i, and the last id of every edge (none_id) stands for no agreement (None). All views are
+read-only (tuples, mapping proxies and non-writeable arrays), so they can be shared safely by every helper.
+"""
+from types import MappingProxyType
+
+import numpy as np
+
+
+class OutcomeRegistry:
+    """Outcomes and integer ids of the outcomes of every subnegotiation of a scenario."""
+
+    def __init__(self, outcome_spaces):
+        # _outcomes[i] has the outcomes of subnegotiation i followed by None.
+        self._outcomes = tuple(tuple(os.enumerate_or_sample()) + (None,) for os in outcome_spaces)
+        self._ids = tuple(MappingProxyType({o: j for j, o in enumerate(os)}) for os in self._outcomes)
+        self._id_arrays = []
+        for os in self._outcomes:
+            ids = np.arange(len(os))
+            ids.flags.writeable = False
+            self._id_arrays.append(ids)
+
+    def __len__(self):
+        return len(self._outcomes)
+
+    def outcomes(self, index):
+        """All outcomes of subnegotiation index, ending with None."""
+        return self._outcomes[index]
+
+    def ids(self, index):
+        """All ids of subnegotiation index, as a read-only array."""
+        return self._id_arrays[index]
+
+    def none_id(self, index):
+        """The id of no agreement (None) in subnegotiation index."""
+        return len(self._outcomes[index]) - 1
+
+    def id_map(self, index):
+        """Read-only mapping from the outcomes of subnegotiation index to their ids."""
+        return self._ids[index]
+
+    def id_of(self, index, outcome):
+        """The id of outcome in subnegotiation index. Raises KeyError for outcomes outside the outcome space."""
+        return self._ids[index][outcome]
+
+    def ids_of(self, index, outcomes):
+        """The ids of a sequence of outcomes of subnegotiation index, as an array."""
+        id_map = self._ids[index]
+        return np.fromiter((id_map[o] for o in outcomes), dtype=int, count=len(outcomes))
+
+    def outcome_of(self, index, outcome_id):
+        return self._outcomes[index][outcome_id]
+
+
+def outcome_spaces_of(ufun):
+    """The outcome space of every subnegotiation of ufun. Edge ufuns have a single one."""
+    spaces = getattr(ufun, "outcome_spaces", None)
+    if spaces is None:
+        spaces = (ufun.outcome_space,)
+    return spaces
@@ -0,0 +1,75 @@
+"""
+Center utilities of "prefix + candidate + rest" joint outcomes, folding the prefix once.
+
+The agents score every candidate of the current negotiation in the context of the agreements so far followed by no
+agreement in the negotiations after it. Center evaluators that are folds over the agreements can opt in by providing:
+
+    init_state()                the state of no agreements at all
+    extend(state, agreement)    the state after one more agreement (None for no agreement)
+    finalize(state)             the value of the agreements folded into state
+
+like the TargetEvaluator, DinnersEvaluator and GlobalServiceEvaluator. States are immutable, so the state of the prefix
+is computed once and every candidate only extends it by itself and the rest. Evaluators whose states do not depend on
+the order of the agreements (like the counts of TargetEvaluator and DinnersEvaluator, but not a float sum, which rounds
+differently in another order) can also provide
+
+    extend_at(state, index, agreement)    the state after the agreement of negotiation index, in any order
+
+and then the rest is folded into the state of the prefix once as well, so every candidate costs one extend_at.
+"""
+import numpy as np
+from anl2025.ufun import LambdaCenterUFun, LocalEvaluationCenterUFun
+
+
+def has_prefix_state(ufun):
+    """True if the evaluator of the center ufun can be evaluated incrementally."""
+    evaluator = getattr(ufun, "_evaluator", None)
+    return isinstance(ufun, (LambdaCenterUFun, LocalEvaluationCenterUFun)) and all(
+        hasattr(evaluator, name) for name in ("init_state", "extend", "finalize"))
+
+
+def fold(evaluator, state, agreements):
+    """The state after extending state by every agreement in order."""
+    for agreement in agreements:
+        state = evaluator.extend(state, agreement)
+    return state
+
+
+def prefix_candidate_utilities(ufun, before, candidates, after):
+    """Returns the utility of before + [c] + after for every candidate c as a float array, the same as calling ufun
+    on each of them (see has_prefix_state)."""
+    expected = list(ufun._expected)
+    i = len(before)
+    if i + 1 + len(after) != len(expected):
+        # CenterUFun rejects joint outcomes of the wrong length, so let it.
+        return np.fromiter((ufun(list(before) + [c] + list(after)) for c in candidates), dtype=float,
+                           count=len(candidates))
+
+    # Like CenterUFun.eval_with_expected, missing agreements are replaced by the expected outcomes.
+    before = [o if o else e for o, e in zip(before, expected)]
+    after = [o if o else e for o, e in zip(after, expected[i + 1:])]
+    others_fail = all(o is None for o in before) and all(o is None for o in after)
+
+    evaluator = ufun._evaluator
+    prefix = fold(evaluator, evaluator.init_state(), before)
+    extend_at = getattr(evaluator, "extend_at", None)
+    if extend_at is not None:
+        rest = prefix
+        for j, agreement in enumerate(after, start=i + 1):
+            rest = extend_at(rest, j, agreement)
+
+        def value(candidate):
+            return evaluator.finalize(extend_at(rest, i, candidate))
+    else:
+        def value(candidate):
+            return evaluator.finalize(fold(evaluator, evaluator.extend(prefix, candidate), after))
+
+    utilities = np.empty(len(candidates), dtype=float)
+    for k, candidate in enumerate(candidates):
+        candidate = candidate if candidate else expected[i]
+        if others_fail and candidate is None:
+            # When all subnegotiations fail, the center gets its reserved value.
+            utilities[k] = ufun.reserved_value
+        else:
+            utilities[k] = value(candidate)
+    return utilities
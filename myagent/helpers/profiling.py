@@ -0,0 +1,237 @@
+"""
+Opt-in profiling of the agents.
+
+Profiling is enabled by setting the environment variable ANL2025_PROFILE to a folder before the agents are imported.
+Negotiators deriving from ProfiledNegotiator then get init, propose, respond and the methods named in their
+profiled_methods timed, and any other function can be timed with the profiled decorator. When the variable is not set
+neither of them wraps anything, so the agents run exactly as without them.
+
+Every process keeps, for every call stack of profiled functions, the number of calls, the self time (not spent in the
+profiled functions it called) and the number of ufun calls made directly in it. The profile of a process is written to
+the folder when the process exits, tournament worker processes included, and merge_profiles adds up the profiles of
+all processes and writes them as collapsed stacks (one "a;b;c value" line per stack) that flamegraph.pl, inferno and
+speedscope read:
+
+    ANL2025_PROFILE=profile python tournament.py
+    python -m myagent.helpers.profiling profile
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+from negmas.preferences import BaseUtilityFunction
+
+from . import batch_eval
+
+PROFILE_ENV = "ANL2025_PROFILE"
+PROFILE_FOLDER = os.environ.get(PROFILE_ENV) or None
+ENABLED = PROFILE_FOLDER is not None
+
+
+def ufun_classes():
+    """Every loaded utility function class that defines __call__."""
+    classes, todo = [], [BaseUtilityFunction]
+    while todo:
+        cls = todo.pop()
+        if "__call__" in cls.__dict__:
+            classes.append(cls)
+        todo.extend(cls.__subclasses__())
+    return classes
+
+
+class _Profile:
+    """The profile of this process, started again by the first profiled call after a fork."""
+
+    def __init__(self):
+        self.pid = None
+        self.local = threading.local()
+
+    def _start(self):
+        self.pid = os.getpid()
+        self.path = Path(PROFILE_FOLDER) / f"{self.pid}-{time.time_ns()}.json"
+        self.time = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.ufun_calls = defaultdict(int)
+        self.local = threading.local()
+        _count_ufun_calls()
+        # multiprocessing runs its finalizers when a worker exits, and (through atexit) when the main process does
+        Finalize(None, self.write, exitpriority=10)
+
+    def _stack(self):
+        local = self.local
+        if not hasattr(local, "names"):
+            local.names, local.children, local.ufun_depth = [], [], 0
+        return local
+
+    def enter(self, name):
+        if self.pid != os.getpid():
+            self._start()
+        local = self._stack()
+        local.names.append(name)
+        local.children.append(0.0)
+
+    def exit(self, elapsed):
+        local = self.local
+        key = ";".join(local.names)
+        self.time[key] += elapsed - local.children.pop()
+        self.calls[key] += 1
+        local.names.pop()
+        if local.children:
+            local.children[-1] += elapsed
+
+    def ufun_call(self):
+        """Called on every ufun call, returns the stack to count it for (None if it is not counted)."""
+        local = self._stack() if self.pid == os.getpid() else None
+        if local is None or not local.names or local.ufun_depth:
+            return None
+        return ";".join(local.names)
+
+    def write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(dict(time=self.time, calls=self.calls, ufun_calls=self.ufun_calls)))
+        os.replace(tmp, self.path)
+
+
+_profile = _Profile()
+
+
+def _counted(call):
+    def wrapper(ufun, *args, **kwargs):
+        key = _profile.ufun_call()
+        if key is None:
+            return call(ufun, *args, **kwargs)
+        _profile.ufun_calls[key] += 1
+        local = _profile.local
+        local.ufun_depth += 1
+        try:
+            return call(ufun, *args, **kwargs)
+        finally:
+            local.ufun_depth -= 1
+
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def _count_batch(kernel, ufun, outcomes):
+    """Counts a batch of evaluate_many scored by a kernel as one ufun call per outcome (and the side ufun calls made
+    by the kernel not at all, like the calls made inside a ufun call)."""
+    key = _profile.ufun_call()
+    if key is None:
+        return kernel(ufun, outcomes)
+    local = _profile.local
+    local.ufun_depth += 1
+    try:
+        utilities = kernel(ufun, outcomes)
+    finally:
+        local.ufun_depth -= 1
+    if utilities is not None:
+        _profile.ufun_calls[key] += len(outcomes)
+    return utilities
+
+
+def _count_ufun_calls():
+    """Wraps __call__ of every utility function class (once per class, forked processes inherit the wrappers) and
+    counts the batches of evaluate_many."""
+    for cls in ufun_classes():
+        call = cls.__dict__["__call__"]
+        if not getattr(call, "__profiled__", False):
+            cls.__call__ = _counted(call)
+    batch_eval.batch_counter = _count_batch
+
+
+def _wrap(func, name):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _profile.enter(name)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _profile.exit(time.perf_counter() - start)
+
+    return wrapper
+
+
+def profiled(func=None, *, name=None):
+    """Times func (named by its qualified name unless name is given) if profiling is enabled, and returns it
+    unchanged otherwise. Use as @profiled or @profiled(name=...)."""
+    if func is None:
+        return functools.partial(profiled, name=name)
+    if not ENABLED:
+        return func
+    return _wrap(func, name or func.__qualname__)
+
+
+class ProfiledNegotiator:
+    """Mixin for negotiators (put it before ANL2025Negotiator in the bases) that profiles init, propose, respond and
+    the methods named in profiled_methods, as defined in each subclass, when profiling is enabled."""
+
+    profiled_methods = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not ENABLED:
+            return
+        for name in ("init", "propose", "respond") + tuple(cls.profiled_methods):
+            method = cls.__dict__.get(name)
+            if callable(method):
+                setattr(cls, name, _wrap(method, f"{cls.__name__}.{name}"))
+
+
+def merge_profiles(folder):
+    """Adds up the profiles of all processes written to folder, as dict(time=..., calls=..., ufun_calls=...) keyed by
+    collapsed stack (times in seconds)."""
+    merged = dict(time=defaultdict(float), calls=defaultdict(int), ufun_calls=defaultdict(int))
+    for path in sorted(Path(folder).glob("*.json")):
+        profile = json.loads(path.read_text())
+        for kind, values in merged.items():
+            for key, value in profile[kind].items():
+                values[key] += value
+    return merged
+
+
+def write_collapsed(merged, folder):
+    """Writes the self times (in microseconds) and the ufun calls of every stack as collapsed stacks to time.folded and
+    ufun_calls.folded in folder, and returns their paths."""
+    paths = []
+    for kind, scale in (("time", 1e6), ("ufun_calls", 1)):
+        lines = [f"{key} {round(value * scale)}" for key, value in sorted(merged[kind].items())
+                 if round(value * scale) > 0]
+        path = Path(folder) / f"{kind}.folded"
+        path.write_text("".join(line + "\n" for line in lines))
+        paths.append(path)
+    return paths
+
+
+def summary(merged, top=20):
+    """The profiled functions with the most self time: (name, calls, self seconds, ufun calls)."""
+    rows = defaultdict(lambda: [0, 0.0, 0])
+    for key, value in merged["calls"].items():
+        rows[key.rsplit(";", 1)[-1]][0] += value
+    for key, value in merged["time"].items():
+        rows[key.rsplit(";", 1)[-1]][1] += value
+    for key, value in merged["ufun_calls"].items():
+        rows[key.rsplit(";", 1)[-1]][2] += value
+    return sorted(((name, *row) for name, row in rows.items()), key=lambda row: -row[2])[:top]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    folder = Path(argv[0] if argv else PROFILE_FOLDER or "profile")
+    merged = merge_profiles(folder)
+    for path in write_collapsed(merged, folder):
+        print(f"Wrote {path}")
+    print(f"{'function':<60} {'calls':>10} {'self ms':>12} {'ufun calls':>12}")
+    for name, calls, seconds, ufun_calls in summary(merged):
+        print(f"{name:<60} {calls:>10} {seconds * 1000:>12.3f} {ufun_calls:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Best bids for center ufuns whose value only depends on the total quantity of the agreements.
+
+The TargetEvaluator of the TargetQuantity scenarios gives every agreement a quantity and values a set of agreements
+by the sum of their quantities. The sums that the remaining edges can still add are found by convolving the quantities
+of their outcomes, so the best achievable value for the sum so far, and the best bid of an edge, are looked up in
+tables over the sum instead of enumerating joint outcomes. Evaluators opt in by providing quantity(agreement) and
+value_of_sum(total).
+"""
+import numpy as np
+from anl2025.ufun import LambdaCenterUFun
+
+
+def has_quantity_sum(ufun):
+    """True if the value of ufun only depends on the total quantity of the agreements."""
+    evaluator = getattr(ufun, "_evaluator", None)
+    return isinstance(ufun, LambdaCenterUFun) and hasattr(evaluator, "quantity") and hasattr(evaluator, "value_of_sum")
+
+
+def _engine_state(ufun):
+    """Everything besides the outcomes that the utilities depend on."""
+    return ufun.reserved_value, tuple(ufun._expected)
+
+
+class QuantitySumEngine:
+    """Best achievable values and best bids over the total quantity of the agreements."""
+
+    def __init__(self, ufun, registry):
+        self.ufun = ufun
+        self.registry = registry
+        self.evaluator = ufun._evaluator
+        self.n = len(registry)
+        self.state = _engine_state(ufun)
+        expected = ufun._expected
+
+        # The quantity of every outcome of every edge and whether it is an agreement, after replacing no agreement by
+        # the expected outcome of the edge like CenterUFun.eval_with_expected does.
+        self.quantities, self.agrees = [], []
+        for i in range(self.n):
+            outcomes = [o if o else expected[i] for o in registry.outcomes(i)]
+            self.quantities.append(np.array([self.evaluator.quantity(o) for o in outcomes], dtype=int))
+            self.agrees.append(np.array([o is not None for o in outcomes], dtype=bool))
+        if any(q.min() < 0 for q in self.quantities):
+            raise ValueError("quantities must not be negative")
+        self.max_sum = sum(int(q.max()) for q in self.quantities)
+        self.values = self._values_of(np.arange(self.max_sum + 1))
+
+        # reach_all[i][t]: the edges from i on can add up to t; reach_any[i][t]: they can with at least one agreement.
+        # none_possible[i]: the edges from i on can all end without agreement.
+        reach_all = [None] * (self.n + 1)
+        reach_any = [None] * (self.n + 1)
+        self.none_possible = [True] * (self.n + 1)
+        reach_all[self.n] = np.ones(1, dtype=int)
+        reach_any[self.n] = np.zeros(1, dtype=int)
+        for i in range(self.n - 1, -1, -1):
+            q = self.quantities[i]
+            agree = np.zeros(int(q.max()) + 1, dtype=int)
+            agree[q[self.agrees[i]]] = 1
+            fail = np.zeros(len(agree), dtype=int)
+            fail[q[~self.agrees[i]]] = 1
+            reach_all[i] = (np.convolve(agree | fail, reach_all[i + 1]) > 0).astype(int)
+            reach_any[i] = ((np.convolve(agree, reach_all[i + 1]) > 0)
+                            | (np.convolve(fail, reach_any[i + 1]) > 0)).astype(int)
+            self.none_possible[i] = bool(fail[0]) and self.none_possible[i + 1]
+
+        # best[i][x]: the best value of a total quantity x so far plus what the edges from i on add, with at least one
+        # agreement among them.
+        sums = np.arange(self.max_sum + 1)
+        padded = np.concatenate((self.values, np.full(self.max_sum + 1, float("-inf"))))
+        self.best = []
+        for i in range(self.n + 1):
+            added = np.flatnonzero(reach_any[i])
+            if len(added) == 0:
+                self.best.append(np.full(self.max_sum + 1, float("-inf")))
+            else:
+                self.best.append(padded[sums[:, None] + added[None, :]].max(axis=1))
+        self.reach_any = reach_any
+
+    def is_stale(self):
+        """True if the expected outcomes or the reserved value of the ufun changed since the tables were built."""
+        return _engine_state(self.ufun) != self.state
+
+    def _values_of(self, sums):
+        values = np.array([float(self.evaluator.value_of_sum(int(s))) for s in sums], dtype=float)
+        values[np.isnan(values)] = float("-inf")
+        return values
+
+    def _value(self, sums):
+        sums = np.asarray(sums)
+        if sums.size and sums.max() <= self.max_sum:
+            return self.values[sums]
+        return self._values_of(sums.ravel()).reshape(sums.shape)
+
+    def _best(self, i, sums):
+        sums = np.asarray(sums)
+        if sums.size and sums.max() <= self.max_sum:
+            return self.best[i][sums]
+        # A sum so far beyond the tables (an agreement outside the enumerated outcome space), O(max_sum) per sum.
+        added = np.flatnonzero(self.reach_any[i])
+        if len(added) == 0:
+            return np.full(sums.shape, float("-inf"))
+        return self._value(sums[..., None] + added).max(axis=-1)
+
+    def _prefix(self, agreements):
+        """The total quantity of the agreements and whether there is at least one."""
+        outcomes = [a if a else e for a, e in zip(agreements, self.ufun._expected)]
+        return sum(self.evaluator.quantity(o) for o in outcomes), any(o is not None for o in outcomes)
+
+    def _completion_values(self, i, sums, any_agreement):
+        """The best value of completing the sums so far with the edges from i on."""
+        values = self._best(i, sums)
+        if self.none_possible[i]:
+            no_more = np.where(any_agreement, self._value(sums), self.ufun.reserved_value)
+            values = np.maximum(values, no_more)
+        return values
+
+    def best_value(self, agreements):
+        """The best value that can still be achieved given the agreements of the finished negotiations."""
+        total, any_agreement = self._prefix(agreements)
+        return float(self._completion_values(len(agreements), np.array([total]), np.array([any_agreement]))[0])
+
+    def bid_values(self, agreements):
+        """The best value that can still be achieved after bidding each outcome of the next negotiation (index
+        len(agreements)), as an array aligned with registry.outcomes(len(agreements))."""
+        i = len(agreements)
+        total, any_agreement = self._prefix(agreements)
+        return self._completion_values(i + 1, total + self.quantities[i], any_agreement | self.agrees[i])
+
+    def best_bid(self, agreements):
+        """The outcome to bid in the next negotiation and the best value it leads to. Ties go to the first outcome,
+        and (None, -inf) is returned if no outcome has a valid value."""
+        values = self.bid_values(agreements)
+        j = int(np.argmax(values))
+        if values[j] == float("-inf"):
+            return None, float("-inf")
+        return self.registry.outcome_of(len(agreements), j), float(values[j])
+
+    def best_completion(self, agreements):
+        """The best joint outcome that starts with the given agreements and its value, like
+        UtilityTensor.best_completion (the first best joint outcome in itertools.product order)."""
+        completion = list(agreements)
+        value = self.best_value(completion)
+        if value == float("-inf"):
+            return None, value
+        while len(completion) < self.n:
+            bid, _ = self.best_bid(completion)
+            completion.append(bid)
+        return tuple(completion), value
+
+
+def build_quantity_sum_engine(ufun, registry):
+    """Builds the engine of a center ufun, or returns None if its value does not only depend on the total quantity
+    (see has_quantity_sum) or an outcome has no valid quantity."""
+    if not has_quantity_sum(ufun):
+        return None
+    try:
+        return QuantitySumEngine(ufun, registry)
+    except (ValueError, TypeError, IndexError):
+        return None
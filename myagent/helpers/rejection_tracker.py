@@ -0,0 +1,63 @@
+"""
+Counts how often every outcome was rejected in one subnegotiation.
+
+Every offer in the trace that was not the last one was rejected: offers made by us were rejected by the opponent,
+offers made by the opponent were rejected by us. The tracker keeps a cursor into nmi.history, so every update only
+reads the offers made since the previous update, and stores the counts in NumPy arrays indexed like its outcomes.
+"""
+import numpy as np
+
+
+class RejectionTracker:
+    """Rejection counts of the outcomes of one subnegotiation (offers outside outcomes are not counted)."""
+
+    def __init__(self, negotiator_id, outcomes, index=None):
+        self.negotiator_id = negotiator_id
+        self.outcomes = list(outcomes)
+        # index maps the outcomes to their position in the counters, e.g. the id map of an OutcomeRegistry.
+        self.index = index if index is not None else {o: i for i, o in enumerate(self.outcomes)}
+        # The last slot stays 0, so that outcomes that are not tracked can point at it.
+        self.i_rejected = np.zeros(len(self.outcomes) + 1, dtype=int)
+        self.opp_rejected = np.zeros(len(self.outcomes) + 1, dtype=int)
+        self.cursor = 0
+        # positions of the counters that changed, in order, so that users of the counts can update incrementally.
+        self.changes = []
+        self._positions = (None, None)
+
+    def update(self, nmi):
+        """Counts the offers that were made since the last update."""
+        history = nmi.history
+        for k in range(self.cursor, len(history)):
+            for proposer, offer in history[k].new_offers:
+                i = self.index.get(offer)
+                if i is None:
+                    continue
+                if proposer == self.negotiator_id:
+                    self.opp_rejected[i] += 1  # opponent rejected mine
+                else:
+                    self.i_rejected[i] += 1  # I rejected theirs
+                self.changes.append(i)
+        self.cursor = len(history)
+
+    @classmethod
+    def from_registry(cls, negotiator_id, registry, subnegotiation):
+        """A tracker whose counters are indexed by the outcome ids of the registry."""
+        return cls(negotiator_id, registry.outcomes(subnegotiation), registry.id_map(subnegotiation))
+
+    def counts(self, outcome):
+        """Returns [i_rejected, opp_rejected] of a single outcome."""
+        i = self.index.get(outcome, -1)
+        return [int(self.i_rejected[i]), int(self.opp_rejected[i])]
+
+    def counts_of(self, candidates):
+        """Returns the i_rejected and opp_rejected counts of every candidate, as two arrays. The positions of the
+        candidates are looked up once per candidates list."""
+        if self._positions[0] is not candidates:
+            positions = np.fromiter((self.index.get(o, -1) for o in candidates), dtype=int, count=len(candidates))
+            self._positions = (candidates, positions)
+        positions = self._positions[1]
+        return self.i_rejected[positions], self.opp_rejected[positions]
+
+    def counts_of_ids(self, ids):
+        """Returns the i_rejected and opp_rejected counts of the outcomes at the given positions (outcome ids)."""
+        return self.i_rejected[ids], self.opp_rejected[ids]
@@ -0,0 +1,160 @@
+"""
+Scaling test of the agents on generated scenarios.
+
+For every scenario family, run_scaling writes versions with more edges (at base_values values per issue) and with
+more values per issue (at base_edges edges) with generate_scenario, and runs every agent in one role on each of them
+like the benchmark does (see benchmark.run_case). Every case runs in a fresh process that is stopped after timeout
+seconds, and also records how much the session raised the peak memory (resident set size) of that process.
+plot_scaling draws the p95 latency of propose and respond, the init time and the memory against the number of edges
+and the number of values, one figure per family and one line per agent:
+
+    python -m myagent.helpers.scaling --edges 2 4 8 12 --values 3 5 8 12 --out scaling
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+from pathlib import Path
+
+from anl2025 import MultidealScenario
+
+from .benchmark import METHODS, benchmark_agents, run_case, scenario_paths
+from .scenario_generator import generate_scenario
+
+
+def _measure(connection, path, agent, role, n_steps, seed):
+    try:
+        scenario = MultidealScenario.from_folder(path)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        case = run_case(scenario, agent, role, n_steps, seed)
+        # ru_maxrss is in kilobytes (on Linux)
+        case["memory_mb"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+    except Exception as e:
+        case = dict(error=repr(e))
+    connection.send(case)
+    connection.close()
+
+
+def measure_case(path, agent, role, n_steps=20, seed=0, timeout=120):
+    """Runs run_case for the scenario in the folder path in a new process and returns the case with its memory_mb,
+    dict(error="timeout") if it did not finish within timeout seconds, or the exit code of the process as the error
+    if it died without sending the case (killed for running out of memory, for example)."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure, args=(sender, path, agent, role, n_steps, seed))
+    process.start()
+    sender.close()
+    try:
+        case = receiver.recv() if receiver.poll(timeout) else dict(error="timeout")
+    except EOFError:
+        # the pipe was closed without a case
+        process.join()
+        case = dict(error=f"exit code {process.exitcode}")
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    return case
+
+
+def run_scaling(folder, families=None, edges=(2, 4, 8), values=(3, 5, 8), base_edges=None, base_values=None,
+                agents=None, role="center", n_steps=20, seed=0, timeout=120, verbose=False):
+    """Generates the scenarios under folder/scenarios and measures every agent on them. families are scenario folder
+    names (all bundled ones by default), base_edges and base_values (the first of edges and values by default) are
+    kept fixed while the other one grows. Returns one row per case."""
+    folder = Path(folder)
+    base_edges = base_edges if base_edges is not None else edges[0]
+    base_values = base_values if base_values is not None else values[0]
+    sizes = sorted({(n, base_values) for n in edges} | {(base_edges, m) for m in values})
+    agents = agents if agents is not None else benchmark_agents()
+    rows = []
+    for source in scenario_paths():
+        if families is not None and source.name not in families:
+            continue
+        for n_edges, n_values in sizes:
+            path = generate_scenario(source, folder / "scenarios" / f"{source.name}_{n_edges}x{n_values}", n_edges,
+                                     n_values, seed)
+            for agent in agents:
+                case = measure_case(path, agent, role, n_steps, seed, timeout)
+                row = dict(family=source.name, n_edges=n_edges, n_values=n_values, agent=agent.__name__, role=role,
+                           **case)
+                rows.append(row)
+                if verbose:
+                    print(format_row(row), flush=True)
+    return rows
+
+
+def latency(row):
+    """The larger p95 latency of propose and respond of a case, in milliseconds."""
+    return max(row[name]["p95"] for name in METHODS)
+
+
+def format_row(row):
+    key = f"{row['family']} {row['n_edges']}x{row['n_values']} {row['agent']}"
+    if row.get("error") is not None:
+        return f"{key:<70} failed: {row['error']}"
+    return (f"{key:<70} init={row['init_ms']:10.3f} ms  p95={latency(row):10.3f} ms  "
+            f"memory={row['memory_mb']:8.1f} MB  ufun_calls={row['ufun_calls']}")
+
+
+def plot_scaling(rows, folder, base_edges, base_values):
+    """Writes folder/<family>.png for every family in rows and returns their paths."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    metrics = (("p95 latency (ms)", latency), ("init (ms)", lambda r: r["init_ms"]),
+               ("peak memory added (MB)", lambda r: r["memory_mb"]))
+    sweeps = (("edges", "n_edges", "n_values", base_values), ("values per issue", "n_values", "n_edges", base_edges))
+    paths = []
+    for family in sorted({r["family"] for r in rows}):
+        done = [r for r in rows if r["family"] == family and r.get("error") is None]
+        figure, axes = plt.subplots(len(sweeps), len(metrics), figsize=(5 * len(metrics), 4 * len(sweeps)),
+                                    squeeze=False)
+        for i, (label, x, fixed, fixed_value) in enumerate(sweeps):
+            for j, (metric, value) in enumerate(metrics):
+                ax = axes[i][j]
+                for agent in sorted({r["agent"] for r in done}):
+                    points = sorted((r[x], value(r)) for r in done if r["agent"] == agent and r[fixed] == fixed_value)
+                    if points:
+                        ax.plot(*zip(*points), marker="o", label=agent)
+                ax.set_xlabel(f"{label} ({fixed.replace('n_', '')} = {fixed_value})")
+                ax.set_ylabel(metric)
+                if j != len(metrics) - 1:
+                    ax.set_yscale("log")
+        axes[0][0].legend(fontsize="small")
+        figure.suptitle(family)
+        figure.tight_layout()
+        path = Path(folder) / f"{family}.png"
+        figure.savefig(path)
+        plt.close(figure)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measures the agents on larger versions of the bundled scenarios.")
+    parser.add_argument("--families", nargs="*", help="scenario folder names (all by default)")
+    parser.add_argument("--agents", nargs="*", help="agent class names (all by default)")
+    parser.add_argument("--edges", nargs="+", type=int, default=[2, 4, 8])
+    parser.add_argument("--values", nargs="+", type=int, default=[3, 5, 8])
+    parser.add_argument("--base-edges", type=int)
+    parser.add_argument("--base-values", type=int)
+    parser.add_argument("--role", default="center", choices=["center", "edge"])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per case")
+    parser.add_argument("--out", type=Path, default=Path("scaling"))
+    args = parser.parse_args(argv)
+
+    base_edges = args.base_edges if args.base_edges is not None else args.edges[0]
+    base_values = args.base_values if args.base_values is not None else args.values[0]
+    agents = [a for a in benchmark_agents() if args.agents is None or a.__name__ in args.agents]
+    rows = run_scaling(args.out, args.families, args.edges, args.values, base_edges, base_values, agents, args.role,
+                       args.steps, args.seed, args.timeout, verbose=True)
+    (args.out / "scaling.json").write_text(json.dumps(rows, indent=1) + "\n")
+    for path in plot_scaling(rows, args.out, base_edges, base_values):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
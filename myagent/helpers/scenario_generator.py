@@ -0,0 +1,192 @@
+"""
+Larger versions of the bundled scenarios, for scaling tests.
+
+generate_scenario reads a scenario folder (center.yml, edges/*.yml and the evaluator modules it names) and writes a
+scenario of the same family with n_edges edges and n_values values per issue, in the same folder format, so
+MultidealScenario.from_folder loads it like the original:
+
+- every list with one entry per edge (outcome_spaces, side_ufuns, side_evaluators, the weights of a linear combination
+  center and the edge files) is repeated cyclically up to n_edges entries;
+- the values of every issue are stretched or shrunk to n_values values of the same kind (consecutive integers stay
+  consecutive, other numbers are spread between the smallest and the largest, "q1".."q10" like values keep their
+  prefix, days continue the week), and every TableFun maps the new values to the utilities at the same relative
+  positions of its old mapping;
+- the centers that read their values from center.csv get a new table: TargetEvaluator values over the larger
+  quantity sums by relative position, DinnersEvaluator values of random outings (drawn from a generator seeded with
+  seed). The table is also passed to the evaluator in center.yml, because from_folder imports the evaluator module
+  of the first folder of a family only, and that module reads center.csv next to itself.
+
+from_folder reads the edges in directory order, not by name, so in a family whose edges have different outcome spaces
+(service_provider) an edge may get the ufun of another one, in the bundled scenario as in the generated ones.
+"""
+import ast
+import csv
+import random
+import re
+import shutil
+from copy import deepcopy
+from pathlib import Path
+
+import yaml
+
+WEEK = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# Lists in center.yml that have one entry per edge
+EDGE_LISTS = ("outcome_spaces", "side_ufuns", "side_evaluators", "weights")
+
+
+def _is_int(value):
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
+    return not isinstance(value, bool)
+
+
+def scale_values(values, n_values):
+    """n_values values of the same kind as values (see the module docstring), in order."""
+    values = list(values)
+    as_str = isinstance(values[0], str)
+    if all(_is_int(v) for v in values):
+        ints = [int(v) for v in values]
+        lo, hi = min(ints), max(ints)
+        if ints == list(range(lo, lo + len(ints))) or hi - lo + 1 < n_values:
+            new = list(range(lo, lo + n_values))
+        else:
+            new = sorted({lo + round(k * (hi - lo) / max(n_values - 1, 1)) for k in range(n_values)})
+        return [str(v) for v in new] if as_str else new
+    if all(v in WEEK for v in values):
+        return [WEEK[k] if k < len(WEEK) else f"Day{k + 1}" for k in range(n_values)]
+    matches = [re.fullmatch(r"(\D*)(\d+)", str(v)) for v in values]
+    if all(matches) and len({m.group(1) for m in matches}) == 1:
+        prefix, first = matches[0].group(1), int(matches[0].group(2))
+        return [f"{prefix}{first + k}" for k in range(n_values)]
+    return [values[k] if k < len(values) else f"{values[k % len(values)]}{k // len(values) + 1}"
+            for k in range(n_values)]
+
+
+def _at_relative_position(items, k, n):
+    """The item of items at the relative position of k among n positions."""
+    return items[round(k * (len(items) - 1) / max(n - 1, 1))]
+
+
+def _scale_issue(issue, n_values):
+    issue = dict(issue)
+    if issue.get("type", "").endswith("ContiguousIssue"):
+        lo = issue["values"][0]
+        issue["values"] = [lo, lo + n_values - 1]
+    else:
+        issue["values"] = scale_values(issue["values"], n_values)
+    if "n_values" in issue:
+        issue["n_values"] = n_values
+    return issue
+
+
+def _scale_table(table, n_values):
+    keys, utilities = list(table["mapping"].keys()), list(table["mapping"].values())
+    table = dict(table)
+    table["mapping"] = {key: _at_relative_position(utilities, k, n_values)
+                        for k, key in enumerate(scale_values(keys, n_values))}
+    return table
+
+
+def _scale(node, n_values):
+    """node (parsed YAML) with every issue and TableFun scaled to n_values values."""
+    if isinstance(node, list):
+        return [_scale(item, n_values) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "mapping" in node:
+        return _scale_table(node, n_values)
+    node = {key: _scale(value, n_values) for key, value in node.items()}
+    if "issues" in node:
+        node["issues"] = [_scale_issue(issue, n_values) for issue in node["issues"]]
+    return node
+
+
+def _cycle(items, n):
+    """items repeated up to n entries (as copies, so that YAML has no aliases), with the names of the repeated ones
+    numbered."""
+    cycled = []
+    for k in range(n):
+        item = deepcopy(items[k % len(items)])
+        if isinstance(item, dict) and "name" in item and k >= len(items):
+            item["name"] = f"{item['name']}{k // len(items) + 1}"
+        cycled.append(item)
+    return cycled
+
+
+def _read_csv(path):
+    with open(path, newline="") as file:
+        return [{key.strip(): value.strip() for key, value in row.items()} for row in csv.DictReader(file)]
+
+
+def _write_csv(path, header, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _target_values(source, center, n_edges):
+    """The TargetEvaluator values over the quantity sums of the new scenario, by relative position of the sum."""
+    rows = sorted(((int(r["quantity"]), float(r["value"])) for r in _read_csv(source / "center.csv")))
+    values = [value for _, value in rows]
+    spaces = center.get("outcome_spaces") or [center["outcome_space"]] * n_edges
+    max_sum = sum(max(int(v) for v in space["issues"][0]["values"]) for space in spaces)
+    return {q: _at_relative_position(values, q, max_sum + 1) for q in range(max_sum + 1)}
+
+
+def _dinners_values(center, n_edges, rng):
+    """DinnersEvaluator values of random outings: one to n_edges dinners, with as many dinners on a day as there are
+    edges per day at most (one, like the bundled scenario, unless there are more edges than days)."""
+    days = list(center["outcome_space"]["issues"][0]["values"])
+    per_day = -(-n_edges // len(days))
+    values = dict()
+    for _ in range(3 * len(days)):
+        counts = [0] * len(days)
+        for _ in range(rng.randint(1, n_edges)):
+            day = rng.choice([d for d in range(len(days)) if counts[d] < per_day])
+            counts[day] += 1
+        values[str(tuple(counts))] = round(rng.uniform(0.1, 1.0), 3)
+    return days, values
+
+
+def generate_scenario(source, folder, n_edges, n_values, seed=0):
+    """Writes a version of the scenario in the folder source with n_edges edges and n_values values per issue to
+    folder (replacing it) and returns its path."""
+    source, folder = Path(source), Path(folder)
+    center = yaml.safe_load((source / "center.yml").read_text())
+    edges = [yaml.safe_load(path.read_text()) for path in sorted((source / "edges").glob("*.yml"))]
+
+    center = _scale(center, n_values)
+    center["n_edges"] = n_edges
+    for key in EDGE_LISTS:
+        if isinstance(center.get(key), list):
+            center[key] = _cycle(center[key], n_edges)
+    if "weights" in center:
+        total = sum(center["weights"])
+        center["weights"] = [w / total for w in center["weights"]]
+    edges = _cycle([_scale(edge, n_values) for edge in edges], n_edges)
+
+    if folder.exists():
+        shutil.rmtree(folder)
+    (folder / "edges").mkdir(parents=True)
+    evaluator = center.get("evaluator", dict())
+    if evaluator.get("type", "").endswith(".TargetEvaluator"):
+        evaluator["values"] = _target_values(source, center, n_edges)
+        _write_csv(folder / "center.csv", ["quantity", "value"], evaluator["values"].items())
+    elif evaluator.get("type", "").endswith(".DinnersEvaluator"):
+        evaluator["days"], evaluator["values"] = _dinners_values(center, n_edges, random.Random(seed))
+        _write_csv(folder / "center.csv", evaluator["days"] + ["value"],
+                   [list(ast.literal_eval(key)) + [value] for key, value in evaluator["values"].items()])
+
+    # the evaluator modules named in center.yml
+    types = [evaluator.get("type", "")] + [e.get("type", "") for e in center.get("side_evaluators", [])]
+    for module in {t.split(".")[0] for t in types if t.count(".") == 1}:
+        if (source / f"{module}.py").exists():
+            shutil.copy(source / f"{module}.py", folder / f"{module}.py")
+
+    (folder / "center.yml").write_text(yaml.safe_dump(center, sort_keys=False))
+    for k, edge in enumerate(edges):
+        (folder / "edges" / f"edge{k + 1:03}.yml").write_text(yaml.safe_dump(edge, sort_keys=False))
+    return folder
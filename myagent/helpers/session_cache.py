@@ -0,0 +1,360 @@
+"""
+An on-disk cache of tournament session results.
+
+A session is identified by the content of its scenario, the source code of its agent classes, the seed, the number of
+steps and the role assignment (the center and the edges in order, with their parameters). SessionCache stores the
+result of every session under a hash of all of them, so after editing an agent (or a helper module it imports) only
+the sessions in which that agent plays are run again and every other session is read from disk.
+
+run_cached_tournament runs the sessions of an anl2025_tournament (every competitor is the center once per scenario and
+repetition) through the cache. The sessions are drawn from a seeded random generator and every session is run with
+its own seed on a fresh copy of the scenario, so the same call always runs the same sessions with the same results.
+"""
+import hashlib
+import inspect
+import json
+import os
+import random
+import sys
+from collections import defaultdict
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+from anl2025.common import DEFAULT_METHOD, RunParams, get_agent_class
+from anl2025.runner import assign_scenario
+from negmas.helpers import get_full_type_name
+
+DEFAULT_CACHE_PATH = Path.home() / "negmas" / "anl2025" / "session_cache"
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _package_modules(module_name):
+    """The modules of the top-level package of module_name that it uses, directly or through each other."""
+    package = module_name.split(".")[0]
+    found, pending = set(), [module_name]
+    while pending:
+        name = pending.pop()
+        if name in found or name not in sys.modules:
+            continue
+        found.add(name)
+        for value in list(vars(sys.modules[name]).values()):
+            try:
+                dependency = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+            except Exception:
+                continue
+            if isinstance(dependency, str) and dependency.split(".")[0] == package:
+                pending.append(dependency)
+    return sorted(found)
+
+
+def source_hash(cls):
+    """A hash of the source of cls and of every module of its package that its module uses, so it changes when the
+    class or a helper it relies on changes."""
+    sources = {"class": cls.__qualname__}
+    for name in _package_modules(cls.__module__):
+        path = getattr(sys.modules[name], "__file__", None)
+        sources[name] = hashlib.sha256(Path(path).read_bytes()).hexdigest() if path and Path(path).is_file() else None
+    return _digest(sources)
+
+
+def _canonical(value, types):
+    """value as plain JSON data that does not depend on object ids or addresses. The types of the objects that are
+    only described by their attributes are added to types, so their source can be hashed as well."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (np.generic, np.ndarray)):
+        return _canonical(value.tolist(), types)
+    if isinstance(value, dict):
+        # negmas gives every object a fresh unique id
+        return {repr(k) if not isinstance(k, str) else k: _canonical(v, types) for k, v in value.items() if k != "id"}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v, types) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(v, types) for v in value), key=json.dumps)
+    if inspect.isfunction(value) or inspect.ismethod(value):
+        try:
+            return {"function": value.__qualname__, "source": inspect.getsource(value)}
+        except (OSError, TypeError):
+            return {"function": value.__qualname__}
+    if isinstance(value, type):
+        types.add(value)
+        return {"type": get_full_type_name(value)}
+    types.add(type(value))
+    state = vars(value) if hasattr(value, "__dict__") else {}
+    return {"type": get_full_type_name(type(value)), "state": _canonical(state, types)}
+
+
+def scenario_hash(scenario):
+    """A hash of the content of a MultidealScenario: its serialized ufuns and outcome spaces, the attributes of the
+    objects the serialization keeps as they are (like the evaluators of LambdaCenterUFun) and their source."""
+    types = set()
+    content = _canonical(scenario.to_dict(), types)
+    sources = {get_full_type_name(t): source_hash(t) for t in types if t.__module__ != "builtins"}
+    return _digest(dict(content=content, sources=sources))
+
+
+def type_name(cls):
+    """The name of an agent type in the scores, like anl2025 names it."""
+    return get_full_type_name(cls).replace("anl2025.negotiator.", "")
+
+
+def agent_name(cls, params):
+    """The name of an agent type with its parameters in the scores. Unlike anl2025, which appends hash(str(params)),
+    the suffix is stable across processes, so scores of different runs can be merged."""
+    if not params:
+        return type_name(cls)
+    return f"{type_name(cls)}_{hashlib.sha256(str(params).encode()).hexdigest()[:8]}"
+
+
+class TournamentSession:
+    """One session of a tournament: who plays where on which scenario, and the seed it runs with."""
+
+    def __init__(self, scenario_index, scenario_name, repetition, rotation, center, edge_info, nedges_counted, seed):
+        self.scenario_index = scenario_index
+        self.scenario_name = scenario_name
+        self.repetition = repetition
+        self.rotation = rotation
+        self.center = center  # (type, params)
+        self.edge_info = edge_info  # [(type, params)] in edge order
+        self.nedges_counted = nedges_counted
+        self.seed = seed
+
+    @property
+    def id(self):
+        """Unique within a tournament."""
+        return f"{self.scenario_name}:{self.scenario_index}:{self.repetition}:{self.rotation}"
+
+    def roles(self):
+        """The role assignment as JSON data: the name of the center and of every edge."""
+        return dict(center=agent_name(*self.center), edges=[agent_name(c, p) for c, p in self.edge_info])
+
+    def entry(self, record, key=None):
+        """The session and its record as JSON data, everything TournamentScores needs to score it, and the key of the
+        session (see SessionKeys) if given."""
+        return dict(session=self.id, scenario=self.scenario_name, scenario_index=self.scenario_index,
+                    repetition=self.repetition, rotation=self.rotation, seed=self.seed, **self.roles(),
+                    nedges_counted=self.nedges_counted, key=key, record=record)
+
+
+def tournament_sessions(scenarios, competitors, n_repetitions, competitor_params=None, no_double_scores=True,
+                        non_comptitor_types=None, non_comptitor_params=None, seed=0):
+    """The sessions of an anl2025_tournament with the same arguments, in the same order, drawn from a random
+    generator seeded with seed instead of the global one."""
+    rng = random.Random(seed)
+    competitor_params = competitor_params if competitor_params else tuple(dict() for _ in competitors)
+    if non_comptitor_types:
+        non_comptitor_params = non_comptitor_params if non_comptitor_params else tuple(
+            dict() for _ in non_comptitor_types)
+        non_competitors = [(get_agent_class(n), p) for n, p in zip(non_comptitor_types, non_comptitor_params,
+                                                                     strict=True)]
+    else:
+        non_competitors = None
+
+    sessions = []
+    for i in range(n_repetitions):
+        players_pool = [(get_agent_class(c), p) for c, p in zip(competitors, competitor_params, strict=True)]
+        for k, scenario in enumerate(scenarios):
+            nedges = len(scenario.edge_ufuns)
+            sname = scenario.name if scenario.name else f"s{k:03}"
+            rng.shuffle(players_pool)
+            # put each competitor in center once per scenario
+            for j in range(len(players_pool)):
+                if len(players_pool) >= nedges + 1:
+                    players = list(players_pool)
+                else:
+                    # add extra players at the end if not enough competitors are available
+                    players = players_pool + list(rng.choices(non_competitors if non_competitors else players_pool,
+                                                              k=nedges + 1 - len(players_pool)))
+                nedges_counted = nedges if not no_double_scores else min(len(players_pool) - 1, nedges)
+                edge_info = (players[:j] + players[j + 1:])[: nedges + 1]
+                rng.shuffle(edge_info)
+                sessions.append(TournamentSession(k, sname, i, j, players[j], edge_info, nedges_counted,
+                                                  rng.randrange(2 ** 32)))
+                players_pool = [players_pool[-1]] + players_pool[:-1]
+    return sessions
+
+
+def session_record(results):
+    """The parts of a SessionResults that scoring needs, as JSON data."""
+    return dict(
+        center_utility=float(results.center_utility),
+        edge_utilities=[float(u) for u in results.edge_utilities],
+        agreements=[list(a) if a is not None else None for a in results.agreements],
+        total_time=float(results.total_time),
+        times=[float(t) for t in results.times],
+        n_succeeded=results.n_succeeded,
+        n_timedout=results.n_timedout,
+        n_failed=results.n_failed,
+        errors=[[bool(m.state.has_error), m.state.erred_negotiator] for m in results.mechanisms],
+    )
+
+
+def run_session(scenario, session, run_params):
+    """Runs a session on a copy of the scenario (the agents change the expected outcomes of its ufuns) with the
+    global random generators seeded by the session, and returns its record."""
+    random.seed(session.seed)
+    np.random.seed(session.seed % 2 ** 32)
+    center, center_params = session.center
+    assigned = assign_scenario(
+        scenario=deepcopy(scenario),
+        run_params=run_params,
+        center_type=center,
+        center_params=center_params,
+        edge_types=[c for c, _ in session.edge_info],
+        edge_params=[p if p else dict() for _, p in session.edge_info],
+        sample_edges=False,
+    )
+    return session_record(assigned.run(output=None, name=session.id))
+
+
+class SessionKeys:
+    """Computes session keys, hashing every scenario and agent class once."""
+
+    def __init__(self):
+        self._scenario_hashes = {}
+        self._source_hashes = {}
+
+    def __call__(self, scenario, session, run_params):
+        """The key of a session: its scenario content, the source of its agents, its seed and role assignment, and
+        the run parameters."""
+        if id(scenario) not in self._scenario_hashes:
+            self._scenario_hashes[id(scenario)] = (scenario, scenario_hash(scenario))
+        players = [session.center] + list(session.edge_info)
+        for cls, _ in players:
+            if cls not in self._source_hashes:
+                self._source_hashes[cls] = source_hash(cls)
+        types = set()
+        return _digest(dict(
+            scenario=self._scenario_hashes[id(scenario)][1],
+            players=[[get_full_type_name(c), self._source_hashes[c], _canonical(p if p else dict(), types)]
+                     for c, p in players],
+            seed=session.seed,
+            nsteps=run_params.nsteps,
+            run_params=[run_params.keep_order, run_params.share_ufuns, run_params.atomic, run_params.method],
+        ))
+
+
+class SessionCache:
+    """Session records on disk, one JSON file per session key."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.keys = SessionKeys()
+
+    def _file(self, key):
+        return self.path / key[:2] / f"{key}.json"
+
+    def key(self, scenario, session, run_params):
+        """The key of a session, see SessionKeys."""
+        return self.keys(scenario, session, run_params)
+
+    def get(self, key):
+        """The record stored under key, or None."""
+        try:
+            record = json.loads(self._file(key).read_text())
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def put(self, key, record):
+        path = self._file(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(record))
+        os.replace(tmp, path)
+
+    def run(self, scenario, session, run_params):
+        """The record of a session, from the cache or by running it."""
+        key = self.key(scenario, session, run_params)
+        record = self.get(key)
+        if record is None:
+            record = run_session(scenario, session, run_params)
+            self.put(key, record)
+        return record
+
+
+class TournamentScores:
+    """Scores of tournament sessions, added one by one, computed like anl2025_tournament does."""
+
+    def __init__(self, center_multiplier=None, edge_multiplier=1):
+        self.center_multiplier = center_multiplier
+        self.edge_multiplier = edge_multiplier
+        self.final_scores = defaultdict(float)
+        self.final_scoresC = defaultdict(float)
+        self.final_scoresE = defaultdict(float)
+        self.center_count = defaultdict(float)
+        self.edge_count = defaultdict(float)
+        self.scores = []
+
+    def _score(self, entry, name, index, utility, partner_average_utility, time):
+        errors = [(has_error, erred) for has_error, erred in entry["record"]["errors"] if has_error]
+        self.scores.append(dict(
+            agent=name,
+            utility=utility,
+            partner_average_utility=partner_average_utility,
+            scenario=entry["scenario"],
+            repetition=entry["repetition"],
+            rotation=entry["rotation"],
+            scenario_index=entry["scenario_index"],
+            index=index,
+            time=time,
+            errors=sum(erred == name for _, erred in errors),
+            partner_errors=sum(erred != name for _, erred in errors),
+            mechanism_errors=0,
+        ))
+
+    def add(self, entry):
+        """Adds the scores of the center and the counted edges of a finished session (see TournamentSession.entry)."""
+        record = entry["record"]
+        center_multiplier = self.center_multiplier if self.center_multiplier is not None else len(entry["edges"])
+        cname = entry["center"]
+        center_utility = record["center_utility"] * center_multiplier
+        edge_utilities = record["edge_utilities"]
+        self._score(entry, cname, 0, center_utility, sum(edge_utilities) / len(edge_utilities), record["total_time"])
+        self.final_scores[cname] += center_utility
+        self.final_scoresC[cname] += center_utility
+        self.center_count[cname] += 1
+        for e, ename in enumerate(entry["edges"][: entry["nedges_counted"]]):
+            edge_utility = edge_utilities[e] * self.edge_multiplier
+            self._score(entry, ename, e + 1, edge_utility, record["center_utility"], record["times"][e])
+            self.final_scores[ename] += edge_utility
+            self.final_scoresE[ename] += edge_utility
+            self.edge_count[ename] += 1
+
+    @property
+    def weighted_average(self):
+        """The mean of the average center score and the average edge score of every agent."""
+        weighted = {}
+        for agent in self.final_scores:
+            average_e = self.final_scoresE[agent] / self.edge_count[agent] if self.edge_count[agent] > 0 else 0
+            average_c = self.final_scoresC[agent] / self.center_count[agent] if self.center_count[agent] > 0 else 0
+            weighted[agent] = 0.5 * (average_c + average_e)
+        return weighted
+
+
+def run_cached_tournament(scenarios, competitors, n_repetitions=3, n_steps=100, competitor_params=None,
+                          no_double_scores=True, non_comptitor_types=None, non_comptitor_params=None,
+                          center_multiplier=None, edge_multiplier=1, seed=0, cache=None, verbose=False,
+                          keep_order=True, share_ufuns=False, atomic=False, method=DEFAULT_METHOD):
+    """Runs a tournament like anl2025_tournament (serially), serving unchanged sessions from cache (a SessionCache,
+    by default at DEFAULT_CACHE_PATH). Returns its TournamentScores."""
+    cache = cache if cache is not None else SessionCache()
+    run_params = RunParams(nsteps=n_steps, keep_order=keep_order, share_ufuns=share_ufuns, atomic=atomic,
+                           method=method)
+    sessions = tournament_sessions(scenarios, competitors, n_repetitions, competitor_params, no_double_scores,
+                                   non_comptitor_types, non_comptitor_params, seed)
+    scores = TournamentScores(center_multiplier, edge_multiplier)
+    for session in sessions:
+        scores.add(session.entry(cache.run(scenarios[session.scenario_index], session, run_params)))
+    if verbose:
+        print(f"{len(sessions)} sessions: {cache.hits} from the cache, {cache.misses} run")
+    return scores
@@ -0,0 +1,136 @@
+"""
+A process pool that runs independent negotiation sessions.
+
+A farm gets a list of SessionJob (the scenario, the center type, the edge types and the number of steps of one
+run_session call) and runs them on a pool of worker processes, yielding the result of every job in the order of the
+jobs as soon as it and all jobs before it are done. Every distinct scenario is sent to each worker once, and every job
+runs on a fresh copy of it (the agents change the expected outcomes of its ufuns), so the result of a job does not
+depend on which worker ran it or on the jobs that ran before it.
+
+farm_map runs any function of a scenario and an item the same way, for callers that need more than run_session (like
+the tournament runner, see tournament_runner.py).
+
+Scenarios loaded with MultidealScenario.from_folder refer to modules of the scenario folder (like dinners_center) that
+are not on sys.path; they are loaded in the workers from their files before the scenarios are unpickled.
+"""
+import importlib.util
+import os
+import pickle
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+from anl2025 import run_session
+
+# The scenarios of the farm, set in every worker by _init_worker
+_scenarios = []
+
+
+class SessionJob:
+    """One run_session call of a farm. If seed is given, the global random generators are seeded with it first."""
+
+    def __init__(self, scenario, center_type, edge_types, nsteps=100, center_params=None, seed=None):
+        self.scenario = scenario
+        self.center_type = center_type
+        self.edge_types = list(edge_types)
+        self.nsteps = nsteps
+        self.center_params = center_params
+        self.seed = seed
+
+
+class SessionSummary:
+    """The parts of a SessionResults that can be sent back from a worker (no mechanisms or agents)."""
+
+    def __init__(self, results):
+        self.agreements = results.agreements
+        self.center_utility = results.center_utility
+        self.edge_utilities = results.edge_utilities
+        self.total_time = results.total_time
+        self.times = results.times
+        self.n_succeeded = results.n_succeeded
+        self.n_timedout = results.n_timedout
+        self.n_failed = results.n_failed
+
+
+def _folder_modules():
+    """The name and file of every loaded top level module that cannot be imported from sys.path."""
+    paths = {Path(p or os.getcwd()).resolve() for p in sys.path}
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        file = getattr(module, "__file__", None)
+        if "." in name or not file or name == "__main__":
+            continue
+        file = Path(file)
+        if file.name != "__init__.py" and file.parent.resolve() not in paths:
+            modules[name] = str(file)
+    return modules
+
+
+def _init_worker(modules, scenarios):
+    global _scenarios
+    for name, file in modules.items():
+        if name not in sys.modules:
+            spec = importlib.util.spec_from_file_location(name, file)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            spec.loader.exec_module(module)
+    _scenarios = pickle.loads(scenarios)
+    # forked workers start with the random state of the parent, so they would all draw the same numbers
+    random.seed()
+    np.random.seed()
+
+
+def _run(scenario, job):
+    if job.seed is not None:
+        random.seed(job.seed)
+        np.random.seed(job.seed % 2 ** 32)
+    results = run_session(
+        scenario=deepcopy(scenario),
+        center_type=job.center_type,
+        center_params=job.center_params,
+        edge_types=job.edge_types,
+        nsteps=job.nsteps,
+        output=None,
+    )
+    return SessionSummary(results)
+
+
+def _call(function, scenario_index, item):
+    return function(_scenarios[scenario_index], item)
+
+
+def farm_map(function, scenarios, items, n_workers=None):
+    """Calls function(scenario, item) for every scenario and item (two sequences of the same length) on n_workers
+    processes (the number of CPUs by default) and yields the results in order. function must be a module level
+    function, so that the workers can unpickle it. With one worker, the calls run one by one in this process."""
+    scenarios, items = list(scenarios), list(items)
+    n_workers = min(n_workers or os.cpu_count() or 1, len(items))
+    if n_workers <= 1:
+        for scenario, item in zip(scenarios, items):
+            yield function(scenario, item)
+        return
+
+    distinct, scenario_indices = [], []
+    for scenario in scenarios:
+        index = next((k for k, s in enumerate(distinct) if s is scenario), None)
+        if index is None:
+            index = len(distinct)
+            distinct.append(scenario)
+        scenario_indices.append(index)
+
+    # the items are sent without their scenario, every worker gets all scenarios once
+    with ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                             initargs=(_folder_modules(), pickle.dumps(distinct))) as pool:
+        yield from pool.map(_call, repeat(function), scenario_indices, items)
+
+
+def run_farm(jobs, n_workers=None):
+    """Runs the jobs on n_workers processes (the number of CPUs by default) and yields (job, SessionSummary) for
+    every job, in the order of the jobs. With one worker, the jobs run one by one in this process."""
+    jobs = list(jobs)
+    bare_jobs = [SessionJob(None, j.center_type, j.edge_types, j.nsteps, j.center_params, j.seed) for j in jobs]
+    yield from zip(jobs, farm_map(_run, [job.scenario for job in jobs], bare_jobs, n_workers))
@@ -0,0 +1,146 @@
+"""
+A checkpointed tournament runner that streams its results to a JSONL file.
+
+run_resumable_tournament runs the sessions of an anl2025_tournament (see session_cache.tournament_sessions) one by one
+and appends the entry of every finished session (see TournamentSession.entry) to the file as one JSON line, flushed
+to disk before the next session starts. If the file already has entries, the sessions they belong to are not run
+again, so an interrupted run continues where it stopped. Every entry has the key of its session (see
+session_cache.SessionKeys), so the entries of sessions whose scenario or agent code changed since they were written
+are dropped from the file and run again. The scores are updated after every session and can also be read from a file
+at any time, while the run is still going, with scores_from_jsonl.
+
+With n_jobs other than 1, the sessions run on a pool of processes (see session_farm.farm_map) and are still appended
+in the order of the sessions.
+"""
+import json
+import os
+from pathlib import Path
+
+from anl2025.common import DEFAULT_METHOD, RunParams
+
+from .session_cache import SessionKeys, TournamentScores, run_session, tournament_sessions
+from .session_farm import farm_map
+
+
+def read_entries(path):
+    """The entries of a JSONL result file, in order. A last line that was cut off by a crash is ignored."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    entries = []
+    lines = path.read_text().splitlines()
+    for n, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            if n == len(lines) - 1:
+                break
+            raise ValueError(f"{path}: line {n + 1} is not a valid entry")
+    return entries
+
+
+def scores_from_jsonl(path, center_multiplier=None, edge_multiplier=1):
+    """The TournamentScores of the entries of a JSONL result file."""
+    scores = TournamentScores(center_multiplier, edge_multiplier)
+    for entry in read_entries(path):
+        scores.add(entry)
+    return scores
+
+
+def _append(file, entry):
+    file.write(json.dumps(entry) + "\n")
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _rewrite(path, entries):
+    """Replaces the content of the JSONL file at path by entries, atomically."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w") as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def _run_session(scenario, item):
+    session, run_params = item
+    return run_session(scenario, session, run_params)
+
+
+def run_resumable_tournament(path, scenarios, competitors, n_repetitions=3, n_steps=100, competitor_params=None,
+                             no_double_scores=True, non_comptitor_types=None, non_comptitor_params=None,
+                             center_multiplier=None, edge_multiplier=1, seed=0, cache=None, verbose=False,
+                             keep_order=True, share_ufuns=False, atomic=False, method=DEFAULT_METHOD, n_jobs=1):
+    """Runs a tournament like anl2025_tournament, appending every finished session to the JSONL file at path and
+    skipping the sessions it already has, unless their key changed. Sessions are read from cache (a SessionCache) if
+    given. The sessions run on n_jobs processes (all CPUs for -1), one by one in this process by default. Returns the
+    TournamentScores of all sessions.
+
+    The file must have been written by the same tournament (same arguments and seed): an entry that does not match
+    its session raises ValueError instead of mixing results of different tournaments."""
+    path = Path(path)
+    run_params = RunParams(nsteps=n_steps, keep_order=keep_order, share_ufuns=share_ufuns, atomic=atomic,
+                           method=method)
+    sessions = tournament_sessions(scenarios, competitors, n_repetitions, competitor_params, no_double_scores,
+                                   non_comptitor_types, non_comptitor_params, seed)
+    by_id = {session.id: session for session in sessions}
+    session_keys = cache.keys if cache is not None else SessionKeys()
+    keys = {session.id: session_keys(scenarios[session.scenario_index], session, run_params) for session in sessions}
+
+    scores = TournamentScores(center_multiplier, edge_multiplier)
+    done, kept, n_stale = set(), [], 0
+    entries = read_entries(path)
+    for entry in entries:
+        session = by_id.get(entry["session"])
+        if session is None or session.seed != entry["seed"] or session.roles() != dict(center=entry["center"],
+                                                                                         edges=entry["edges"]):
+            raise ValueError(f"{path}: session {entry['session']} was written by a different tournament")
+        if entry.get("key") != keys[session.id]:
+            # written before its scenario or an agent changed (or without a key), so it is run again
+            n_stale += 1
+            continue
+        done.add(session.id)
+        kept.append(entry)
+        scores.add(entry)
+    if verbose and entries:
+        print(f"Resuming from {path}: {len(done)} of {len(sessions)} sessions done, {n_stale} outdated")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if n_stale:
+        _rewrite(path, kept)
+    elif path.exists():
+        content = path.read_bytes()
+        if content and not content.endswith(b"\n"):
+            # a last line cut off by a crash, the next entry takes its place
+            path.write_bytes(content[: content.rfind(b"\n") + 1])
+
+    pending = [session for session in sessions if session.id not in done]
+    records = {}
+    if cache is not None:
+        for session in pending:
+            record = cache.get(keys[session.id])
+            if record is not None:
+                records[session.id] = record
+    to_run = [session for session in pending if session.id not in records]
+    results = farm_map(_run_session, [scenarios[session.scenario_index] for session in to_run],
+                       [(session, run_params) for session in to_run], None if n_jobs == -1 else n_jobs)
+    with path.open("a") as file:
+        for session in pending:
+            record = records.get(session.id)
+            if record is None:
+                # the sessions to run are in the same order
+                record = next(results)
+                if cache is not None:
+                    cache.put(keys[session.id], record)
+            entry = session.entry(record, keys[session.id])
+            _append(file, entry)
+            scores.add(entry)
+            done.add(session.id)
+            if verbose:
+                print(f"{len(done)}/{len(sessions)} {session.id}: center {entry['center']} "
+                      f"{record['center_utility']:.3f}, edges {[round(u, 3) for u in record['edge_utilities']]}")
+    return scores
@@ -0,0 +1,96 @@
+"""
+A bounded memo cache around a ufun.
+
+The agents evaluate the same joint outcomes over and over within one subnegotiation (every propose and respond step
+rebuilds the same contexts). CachedUFun remembers the last maxsize utilities and counts its hits, misses and
+evictions. Center ufuns (and the side ufuns that evaluate through them) depend on the expected outcomes of the
+finished negotiations, so those are part of the cache key together with the reserved value.
+"""
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 4096
+
+
+def canonical_outcome(outcome):
+    """Returns outcome as a hashable tuple, so that lists and tuples of the same outcomes share a cache entry."""
+    if isinstance(outcome, list):
+        outcome = tuple(outcome)
+    if isinstance(outcome, tuple):
+        return tuple(tuple(o) if isinstance(o, list) else o for o in outcome)
+    return outcome
+
+
+def _ufun_state(ufun):
+    """Everything besides the outcome that the utility depends on."""
+    center = getattr(ufun, "_center_ufun", ufun)
+    expected = getattr(center, "_expected", None)
+    return ufun.reserved_value, None if expected is None else tuple(expected)
+
+
+class CachedUFun:
+    """Calls ufun, remembering the utilities of the last maxsize outcomes (least recently used ones are evicted).
+    Every other attribute is read from the wrapped ufun."""
+
+    def __init__(self, ufun, maxsize=DEFAULT_MAXSIZE):
+        self.ufun = ufun
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache = OrderedDict()
+
+    def __call__(self, outcome):
+        try:
+            key = (canonical_outcome(outcome), _ufun_state(self.ufun))
+            hash(key)
+        except TypeError:
+            # unhashable outcome, nothing to remember it by.
+            self.misses += 1
+            return self.ufun(outcome)
+
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        utility = self.ufun(outcome)
+        self._cache[key] = utility
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return utility
+
+    def __getattr__(self, name):
+        if name == "ufun":
+            # not initialized yet (e.g. while unpickling)
+            raise AttributeError(name)
+        return getattr(self.ufun, name)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        """Returns the counters of the cache as a dictionary."""
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._cache),
+            "hit_rate": self.hits / calls if calls else 0.0,
+        }
+
+
+def cached_ufun(self, ufun=None, maxsize=DEFAULT_MAXSIZE):
+    """Returns the memo cache of ufun (the agent's own ufun by default). The caches are kept on the agent, so every
+    propose and respond step of the agent shares them."""
+    if ufun is None:
+        ufun = self.ufun
+    if isinstance(ufun, CachedUFun):
+        return ufun
+    caches = self.__dict__.setdefault("ufun_caches", {})
+    cache = caches.get(id(ufun))
+    if cache is None or cache.ufun is not ufun:
+        cache = caches[id(ufun)] = CachedUFun(ufun, maxsize)
+    return cache
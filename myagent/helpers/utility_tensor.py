@@ -0,0 +1,109 @@
+"""
+A dense table with the center utility of every joint outcome.
+
+The table has one axis per subnegotiation. Position j on axis i is the j-th outcome of the outcome space of
+subnegotiation i, and the last position of every axis is the disagreement (None). Once the table is built, the best
+bid given the agreements of the finished negotiations is an index-slice followed by an argmax.
+"""
+import itertools
+import math
+
+import numpy as np
+from anl2025.ufun import CenterUFun, MaxCenterUFun, LinearCombinationCenterUFun
+
+from .batch_eval import combine_side_utilities, evaluate_many
+
+# Center ufuns that combine side utilities are built from one vector per edge, so they can afford much larger tables
+# than center ufuns that have to be called once per cell.
+MAX_COMBINED_CELLS = 2_000_000
+MAX_EVALUATED_CELLS = 100_000
+
+
+class UtilityTensor:
+    """Center utility of every joint outcome, indexed by the position of each edge outcome."""
+
+    def __init__(self, outcomes, values, positions=None):
+        # outcomes[i] is a tuple with the outcomes of subnegotiation i, ending with None.
+        self.outcomes = outcomes
+        self.values = values
+        # positions[i] maps the outcomes of subnegotiation i to their position on axis i (their id in the registry).
+        if positions is None:
+            positions = [{o: j for j, o in enumerate(os)} for os in outcomes]
+        self.positions = positions
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def best_completion(self, fixed):
+        """Returns the best joint outcome that starts with the given agreements, together with its utility.
+
+        Ties are broken in favour of the first joint outcome in itertools.product order, like a linear scan would.
+        Returns (None, -inf) if no joint outcome has a valid utility, and raises KeyError if one of the agreements is
+        not part of the table."""
+        prefix = tuple(self.positions[i][agreement] for i, agreement in enumerate(fixed))
+        sub = np.asarray(self.values[prefix])
+        flat = int(np.argmax(sub))
+        best_utility = float(sub.flat[flat])
+        if best_utility == float("-inf"):
+            return None, best_utility
+        n_fixed = len(prefix)
+        rest = np.unravel_index(flat, sub.shape)
+        best = tuple(fixed) + tuple(self.outcomes[n_fixed + k][int(j)] for k, j in enumerate(rest))
+        return best, best_utility
+
+
+def _combined_values(ufun, outcomes, shape):
+    """Broadcasts the side utilities of MaxCenterUFun and LinearCombinationCenterUFun into the full table."""
+    n = len(shape)
+    vectors = []
+    for i, (u, expected, os) in enumerate(zip(ufun.ufuns, ufun._expected, outcomes)):
+        # No agreement is replaced by the expected outcome of the edge first, like CenterUFun.eval_with_expected does.
+        v = evaluate_many(u, [o if o else expected for o in os])
+        axis_shape = [1] * n
+        axis_shape[i] = len(v)
+        vectors.append(v.reshape(axis_shape))
+    values = np.broadcast_to(combine_side_utilities(ufun, vectors), shape).astype(float)
+
+    # Cells with at least one disagreement are worth the reserved value if partial agreements are not allowed.
+    if not getattr(ufun, "allow_partial_agreements", True):
+        has_none = np.zeros(shape, dtype=bool)
+        for i in range(n):
+            index = [slice(None)] * n
+            index[i] = -1
+            has_none[tuple(index)] = True
+        values[has_none] = ufun.reserved_value
+    return values
+
+
+def build_utility_tensor(ufun, registry=None):
+    """Builds the utility table of a center ufun, or returns None if it would be too large (or the ufun is not a
+    center ufun). If an outcome registry is given, the axes follow its outcome ids."""
+    if not isinstance(ufun, CenterUFun):
+        return None
+    if registry is not None:
+        outcomes = tuple(registry.outcomes(i) for i in range(len(registry)))
+    else:
+        outcomes = tuple(tuple(os.enumerate_or_sample()) + (None,) for os in ufun.outcome_spaces)
+    shape = tuple(len(os) for os in outcomes)
+    n_cells = math.prod(shape)
+
+    # A linear combination without weights draws random weights on its first call, so it has to be called instead.
+    combined = isinstance(ufun, MaxCenterUFun) or (
+        isinstance(ufun, LinearCombinationCenterUFun) and ufun._weights is not None
+    )
+    if combined and n_cells <= MAX_COMBINED_CELLS:
+        values = _combined_values(ufun, outcomes, shape)
+    elif n_cells <= MAX_EVALUATED_CELLS:
+        values = evaluate_many(ufun, list(itertools.product(*outcomes))).reshape(shape)
+    else:
+        return None
+
+    # When all subnegotiations fail (and no expected outcome is known), the center ufun returns its reserved value
+    # without calling the evaluator.
+    if not any(ufun._expected):
+        values[(-1,) * len(shape)] = ufun.reserved_value
+    # A linear scan skips NaN utilities (they compare false), so they are stored as -inf for the argmax.
+    values[np.isnan(values)] = float("-inf")
+    positions = None if registry is None else [registry.id_map(i) for i in range(len(registry))]
+    return UtilityTensor(outcomes, values, positions)
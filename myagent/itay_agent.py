@@ -9,7 +9,12 @@ the authors and the ANAC 2025 ANL competition.
 import itertools
 from negmas.outcomes import Outcome
 import numpy
-from .helpers.helperfunctions import set_id_dict, did_negotiation_end, is_edge_agent, get_agreement_at_index
+from .helpers.helperfunctions import set_id_dict, did_negotiation_end, is_edge_agent, get_agreement_ledger, \
+    get_outcome_registry, get_registry_index
+from .helpers.rejection_tracker import RejectionTracker
+from .helpers.candidate_utilities import center_candidate_utilities, edge_candidate_utilities, rejection_counts, \
+    best_candidate, offer_base_utility, possible_outcomes
+from .helpers.profiling import ProfiledNegotiator
 import random
 
 from anl2025.negotiator import ANL2025Negotiator
@@ -22,7 +27,7 @@ from negmas import (
     SAONMI
 )
 max_samples = 30
-class ItayNegotiator(ANL2025Negotiator):
+class ItayNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     Your agent code. This is the ONLY class you need to implement
     This example agent aims for the absolute best bid available. As a center agent, it adapts its strategy after each negotiation, by aiming for the best bid GIVEN the previous outcomes.
@@ -32,11 +37,14 @@ class ItayNegotiator(ANL2025Negotiator):
        The most general way to implement an agent is to implement propose and respond.
        """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_find_best_outcome", "calc_dict")
+
     def init(self):
         """Executed when the agent is created. In ANL2025, all agents are initialized before the tournament starts."""
         #print("init")
-        self.agreements = []
-        self.samples = None
+        self.agreements = ()  # the prefix of the agreement ledger
+        self.candidate_outcomes = {}  # {negotiator_id: (outcome space, candidate outcomes)}
         #Initalize variables
         self.current_neg_index = -1
         self.target_bid = None
@@ -44,45 +52,16 @@ class ItayNegotiator(ANL2025Negotiator):
         # Make a dictionary that maps the index of the negotiation to the negotiator id. The index of the negotiation is the order in which the negotiation happen in sequence.
         self.id_dict = {}
         set_id_dict(self)
-        self.agreements = []
         self.best_pattern = None
         self.best_utility = float('-inf')
         self.num_negotiations = len(self.id_dict)
         self.trace_by_neg = {}
         self.current_offer = None
-        self.rejection_counts = {}  # {negotiator_id: {outcome: [i_rejected, opponent_rejected]}}
+        self.rejection_counts = {}  # {negotiator_id: RejectionTracker}
 
     def _get_possible_outcomes(self, neg_id):
-        """Get all possible outcomes for a negotiation by id."""
-
-        nmi = self.negotiators[neg_id].negotiator.nmi
-        ufun = self.negotiators[neg_id].negotiator.ufun
-        if self.samples is not None:
-            return self.samples
-        all_outcomes = list(nmi.outcome_space.enumerate_or_sample())
-        valid_outcomes = []
-        if len(all_outcomes) > 1000:
-            self.samples = all_outcomes
-            return all_outcomes
-        # print(type(all_outcomes[0][0]))
-        max_samples = 1000
-        # return scored[:max_samples]
-
-        for o in all_outcomes:
-            try:
-                _ = ufun(o)
-                valid_outcomes.append(o)
-            except Exception:
-                continue  # skip malformed offers
-
-        scored = sorted(valid_outcomes, key=ufun, reverse=True)
-        self.samples = scored[:max_samples]
-        # print(self.samples)
-        return scored[:max_samples]
-
-        # print(len(all_outcomes))
-       
-
+        """Get all possible outcomes for a negotiation by id (cached per negotiation, see possible_outcomes)."""
+        return possible_outcomes(self, neg_id)
 
     def _get_progress(self, negotiator_id):
         """Get the current negotiation progress (0 to 1)."""
@@ -100,156 +79,52 @@ class ItayNegotiator(ANL2025Negotiator):
 
         '''
         self.leverage =  ( int(negotiator_id[-1]) + 1)
-        if is_edge_agent(self):
-            best_outcome = None
-            best_utility = float('-inf')
-            self.pattern_outcomes = {}
-            outcomes = self._get_possible_outcomes(negotiator_id)
-            outcomes.append(self.current_offer)
-            for outcome in outcomes:
-                try:
-                    i_rejected = dict_outcome_space[negotiator_id][outcome][1]
-                    opp_rejected = dict_outcome_space[negotiator_id][outcome][2]
-                except: 
-                  i_rejected = opp_rejected = 0
-                
-
-                #   tuple(str(int(outcome[0]) + (0.1 * i_rejected) - (0.1 * opp_rejected)))
-                utility = (ufun(outcome)) + (0.000001  * i_rejected) - (0.00002 * opp_rejected)
-                if outcome is None:
-                    utility *= 0.75
-                self.pattern_outcomes[outcome] = utility
-                if utility > best_utility:
-                    best_outcome = outcome 
-                    best_utility = utility
-
-            return best_outcome, best_utility
-
-
-        context = self.agreements.copy()
-        # print(context, negotiator_id)
-        len_ctxt = len(context)
-        # if len(context) == 0:
-        context += [(None, None)] #* (len(self.negotiators) - len(context))
-        self.pattern_outcomes = {}
-        best_outcome = None
-        best_utility = float('-inf')
-
-        # Try each possible outcome + furute theoretic outcomes.
         outcomes = self._get_possible_outcomes(negotiator_id)
-        outcomes.append(self.current_offer)
-        for outcome in outcomes:
-            if outcome is None:
-                continue
-            test_context = context.copy()
-            test_context[int(negotiator_id[1])] = outcome
-            # rest_combs = itertools.combinations(self._get_possible_outcomes(negotiator_id), len(self.negotiators.keys()) - (len_ctxt + 1))
-            
-            try:
-                i_rejected = dict_outcome_space[negotiator_id][outcome][1]
-                opp_rejected = dict_outcome_space[negotiator_id][outcome][2]
-            except: 
-                i_rejected = opp_rejected = 0
-            # print(opp_rejected)
-            sum_utility = 0
-            num_utility = 0
-            combs_list = []
-            remaining = len(self.negotiators) - len(self.finished_negotiators) - 1#(len_ctxt + 1)
-
-
-
-            sampled_outcomes = self._get_possible_outcomes(negotiator_id)
-            # SAMPLE_SIZE = min(20, len(sampled_outcomes))
-            level = self._get_progress(negotiator_id)
-
-            # fake_rest = random.choices(sampled_outcomes, k=remaining)
-            fake_rest = [None] * remaining
-            test_context_comb = test_context + fake_rest
-            avg_util_inter = 0
-            sum_util_inter = 0
-            # for tc in test_context:
-            # print(test_context_comb)
-            # print(test_context)
-
-            #test_context = [tc[0] for tc in test_context]
-
-            utility = self.ufun(test_context_comb) - (0.05 * level * opp_rejected * (pow(10, -(1 * self.leverage - 1))))
-            # sum_util_inter += utility
-            avg_util = utility# = avg_util_inter = sum_util_inter / len(test_context)
-            # sum_utility += avg_util_inter
-            # for _ in range(SAMPLE_SIZE):
-            #     fake_rest = random.choices(sampled_outcomes, k=remaining)
-            #     test_context_comb = test_context + fake_rest
-            #     avg_util_inter = 0
-            #     sum_util_inter = 0
-            #     for tc in test_context_comb:
-            #         utility = ufun(tc) - (0.005 * level * opp_rejected * (pow(10, -(3 * self.leverage))))
-            #         sum_util_inter += utility
-            #     avg_util_inter = sum_util_inter / len(test_context_comb)
-            #     sum_utility += avg_util_inter
-            # avg_util = sum_utility / SAMPLE_SIZE
-            if outcome is None:
-                avg_util *= 0.75
-            self.pattern_outcomes[outcome] = avg_util
-
-
-            # Calculate the average theoretic rest of negotiation utility for the outcome
-            # for c in rest_combs:
-            #     test_context_comb = test_context.copy() + list(c)
-            #     utility = ((8 / self.leverage) * self.ufun(tuple(test_context_comb))) + (0.001 * i_rejected) - ((0.01 * opp_rejected) * (1/self.leverage))
-            #     sum_utility += utility
-            #     num_utility += 1
-            # avg_util = sum_utility / num_utility
-            # self.pattern_outcomes[outcome] = avg_util
-
-            if avg_util > best_utility:
-                best_outcome = outcome
-                best_utility = avg_util
-        
-        # Try having no agreement
-        test_context = context.copy()
-        test_context += [None for i in range(len(self.negotiators.keys()) - (len_ctxt + 1))]
-
-        # none_utility = ufun(test_context)
-        
-        # if none_utility > best_utility:
-        #     return None, 0
-        return best_outcome, best_utility
+        if is_edge_agent(self):
+            # The utility of each outcome (and of no agreement, at the end) is computed once per negotiation.
+            candidates, base = edge_candidate_utilities(self, negotiator_id, outcomes, ufun)
+            i_rejected, opp_rejected = rejection_counts(dict_outcome_space, negotiator_id, candidates)
+            utilities = base + (0.000001  * i_rejected) - (0.00002 * opp_rejected)
+            utilities[-1] *= 0.75
+            self.pattern_outcomes = dict(zip(candidates, utilities.tolist()))
+            return best_candidate(candidates, utilities)
+
+        # The utility of each outcome given the previous agreements (and no agreement in the coming negotiations) is
+        # computed once per subnegotiation, only the penalty for outcomes the opponent rejected changes every step.
+        candidates, base = center_candidate_utilities(self, negotiator_id, outcomes)
+        i_rejected, opp_rejected = rejection_counts(dict_outcome_space, negotiator_id, candidates)
+        level = self._get_progress(negotiator_id)
+        utilities = base - (0.05 * level * opp_rejected * (pow(10, -(1 * self.leverage - 1))))
+        self.pattern_outcomes = dict(zip(candidates, utilities.tolist()))
+        return best_candidate(candidates, utilities)
+
+    def _offer_utility(self, negotiator_id, offer, dict_outcome_space, ufun):
+        """The utility _find_best_outcome assigns to offer, also if it is not one of the candidates (the best
+        MAX_CANDIDATES outcomes)."""
+        utility = self.pattern_outcomes.get(offer)
+        if utility is not None:
+            return utility
+        tracker = dict_outcome_space.get(negotiator_id) if isinstance(dict_outcome_space, dict) else None
+        i_rejected, opp_rejected = tracker.counts(offer) if tracker is not None else (0, 0)
+        if is_edge_agent(self):
+            base = offer_base_utility(self, negotiator_id, offer, ufun)
+            return base + (0.000001 * i_rejected) - (0.00002 * opp_rejected)
+        base = offer_base_utility(self, negotiator_id, offer)
+        level = self._get_progress(negotiator_id)
+        return base - (0.05 * level * opp_rejected * (pow(10, -(1 * self.leverage - 1))))
 
 
     def calc_dict(self, negotiator_id, nmi, ufun, level):
-        if is_edge_agent(self):
-            pass
+        """Counts the offers made in this negotiation since the last call, per outcome (see RejectionTracker)."""
         if negotiator_id not in self.rejection_counts:
-            self.rejection_counts[negotiator_id] = {}
-
-        trace = nmi.extended_trace
-        existing_outcomes = self.rejection_counts[negotiator_id]
-
-# Process only the NEW offers in the trace
-        prev_len = len(existing_outcomes)
-        for event in trace[prev_len:]:  # assumes trace is append-only
-            offer = event[2]
-            is_mine = (event[1] == negotiator_id)
-
-            if offer not in existing_outcomes:
-                existing_outcomes[offer] = [0, 0]  # [i_rejected, opponent_rejected]
-
-            if is_mine:
-                existing_outcomes[offer][1] += 1  # opponent rejected mine
-            else:
-                existing_outcomes[offer][0] += 1  # I rejected theirs
-
-# Now build dict_outcome_space from rejection counts
-        dict_outcome_space = {}
-        outcomes = self._get_possible_outcomes(negotiator_id)
-
-        for o in outcomes:
-            i_rej, opp_rej = existing_outcomes.get(o, [0, 0])
-            dict_outcome_space[o] = [level, i_rej, opp_rej]
-
-        self.trace_by_neg[negotiator_id] = dict_outcome_space
-        return dict_outcome_space
+            # The counters are indexed by the outcome ids of the registry, which end with no agreement (None).
+            self.rejection_counts[negotiator_id] = RejectionTracker.from_registry(
+                negotiator_id, get_outcome_registry(self), get_registry_index(self, negotiator_id))
+        tracker = self.rejection_counts[negotiator_id]
+        tracker.update(nmi)
+
+        self.trace_by_neg[negotiator_id] = tracker
+        return tracker
     def propose(self, negotiator_id, state, dest=None):
         if negotiator_id.startswith('s'):
             pass
@@ -321,7 +196,7 @@ class ItayNegotiator(ANL2025Negotiator):
 
         best_outcome, best_utility = self._find_best_outcome(negotiator_id, self.trace_by_neg, ufun)
 
-        offer_utility = self.pattern_outcomes[current_offer]
+        offer_utility = self._offer_utility(negotiator_id, current_offer, self.trace_by_neg, ufun)
         all_utilities = list(self.pattern_outcomes.values())
         mean_utility = numpy.mean(all_utilities)
         progress = self._get_progress(negotiator_id)
@@ -355,21 +230,8 @@ class ItayNegotiator(ANL2025Negotiator):
     def _update_agreements_if_needed(self):
         """Update the agreements list if a negotiation has ended."""
         if did_negotiation_end(self):
-            # print('yo')
-            # Store the agreement from the just-ended negotiation
-            # self.current_neg_index = int(self.current_neg_index[1])
-            prev_index = self.current_neg_index - 1
-            # print(self.current_neg_index)
-            if prev_index >= 0:
-                agreement = get_agreement_at_index(self, prev_index)
-                # print(self.current_neg_index)
-                # print(self.agreements)
-                while len(self.agreements) <= prev_index:
-                    # print('APPEND_NONE')
-                    self.agreements.append(None)
-                # print('APPEND_PREV')
-                self.agreements[prev_index] = agreement
-                # print(self.agreements)
-                return True
+            # did_negotiation_end recorded the agreement of the just-ended negotiation in the agreement ledger
+            self.agreements = get_agreement_ledger(self).prefix
+            return self.current_neg_index > 0
         return False
 
@@ -10,7 +10,14 @@ import itertools
 from negmas.outcomes import Outcome
 import numpy
 from .helpers.helperfunctions import set_id_dict, did_negotiation_end, is_edge_agent, get_agreement_at_index, \
-    get_outcome_space_from_index, get_current_negotiation_index, all_possible_bids_with_agreements_fixed
+    get_outcome_space_from_index, get_current_negotiation_index, all_possible_bids_with_agreements_fixed, \
+    get_max_center_index, get_agreement_ledger, get_outcome_registry, get_registry_index
+from .helpers.ufun_cache import cached_ufun
+from .helpers.batch_eval import evaluate_many
+from .helpers.rejection_tracker import RejectionTracker
+from .helpers.candidate_utilities import center_candidate_utilities, edge_candidate_utilities, rejection_counts, \
+    best_candidate, candidate_statistics, offer_base_utility, possible_outcomes
+from .helpers.profiling import ProfiledNegotiator
 import random
 
 from anl2025.negotiator import ANL2025Negotiator
@@ -50,7 +57,7 @@ class McufAdapter():
     def init(self, agent):
         self.max_cases_to_compute = 10e4
         self.can_compute_all_pos = self.can_all_possib_be_computed(agent)
-        self.ufun = agent.ufun
+        self.ufun = cached_ufun(agent)
         self.cur_util = 0
         self.can_improve = True
         self.is_debugging = True
@@ -64,13 +71,14 @@ class McufAdapter():
         self.n_neg = len(agent.negotiators)
         if is_edge_agent(agent):
             all_possible = self.get_possibilities_edge(agent)
-            utils = [(outcome, self.ufun(outcome), outcome) for outcome in all_possible]
+            utilities = evaluate_many(self.ufun, all_possible).tolist()
+            utils = [(outcome, u, outcome) for outcome, u in zip(all_possible, utilities)]
             self.order_utilities(utils)
             self.can_improve = True
         else:
-            all_possible = self.get_outcome_space(agent)
-            utils = [(outcome, self.ufun(outcome), outcome[self.c_round_]) for outcome in all_possible]
-            self.order_utilities(utils)
+            # The options are ranked from the sorted side utilities instead of calling the center ufun on each.
+            self.index = get_max_center_index(agent).lock(get_agreement_ledger(agent).prefix)
+            self.options_by_utilities = self.index.ranked_options()
             self.calc_cur_util_mcuf()
 
             self.can_improve = self.can_improve_state()
@@ -82,22 +90,18 @@ class McufAdapter():
 
     def does_offer_not_improve_utility(self, agent, offer):
         if not is_edge_agent(agent):
-            current_outcomes = self.get_prev_agreements(agent)
-            no_deals_with_next_negs = [None] * (self.n_neg - (self.neg_idx + 1))
-            offer_util = self.ufun(current_outcomes + [offer] + no_deals_with_next_negs)
-            return self.cur_util < offer_util
+            return self.cur_util < self.index.utility(offer)
         return False
 
     
     def get_prev_agreements(self, agent):
-        neg_index = get_current_negotiation_index(agent)
-        return [get_agreement_at_index(agent,i) for i in range(neg_index)]
+        return list(get_agreement_ledger(agent).prefix)
     
 
     def calc_cur_util_mcuf(self):
         if self.c_round_ > 0:
             # the utility of the option with current deal as None
-            self.cur_util = next(option[1] for option in self.options_by_utilities if option[0][self.c_round_] == None)
+            self.cur_util = self.index.none_utility
         else:
             self.cur_util = 0
 
@@ -141,11 +145,8 @@ class McufAdapter():
         #else:
         #return all_possible_bids_with_agreements_fixed(self)
         #return self.calc_outcome_space_mcuf()
-        current_outcomes = self.get_prev_agreements(agent)
         bids = get_outcome_space_from_index(agent, self.neg_idx)
-        no_deals_with_next_negs = [None] * (self.n_neg - (self.neg_idx + 1))
-
-        return [current_outcomes + [bid] + no_deals_with_next_negs for bid in bids]
+        return get_agreement_ledger(agent).contexts(bids)
     
 
     #def calc_outcome_space_mcuf(self):
@@ -159,7 +160,7 @@ class McufAdapter():
         # TODO: in case of != Max -> calc distribution for all possib of min(1000/len(bids), n_neg-neg_index) following indexes and the rest as None
 
 
-class ItayJhnNegotiator(ANL2025Negotiator):
+class ItayJhnNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     Your agent code. This is the ONLY class you need to implement
     This example agent aims for the absolute best bid available. As a center agent, it adapts its strategy after each negotiation, by aiming for the best bid GIVEN the previous outcomes.
@@ -169,11 +170,14 @@ class ItayJhnNegotiator(ANL2025Negotiator):
        The most general way to implement an agent is to implement propose and respond.
        """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_find_best_outcome", "calc_dict")
+
     def init(self):
         """Executed when the agent is created. In ANL2025, all agents are initialized before the tournament starts."""
         #print("init")
         self.agreements = []
-        self.samples = None
+        self.candidate_outcomes = {}  # {negotiator_id: (outcome space, candidate outcomes)}
         #Initalize variables
         self.current_neg_index = -1
         self.target_bid = None
@@ -187,7 +191,7 @@ class ItayJhnNegotiator(ANL2025Negotiator):
         self.num_negotiations = len(self.id_dict)
         self.trace_by_neg = {}
         self.current_offer = None
-        self.rejection_counts = {}  # {negotiator_id: {outcome: [i_rejected, opponent_rejected]}}
+        self.rejection_counts = {}  # {negotiator_id: RejectionTracker}
         is_mcuf = self.preferences.short_type_name == 'MCUF' #and (not is_edge_agent(self))
         self.adapter = McufAdapter()
         self.adapter.init(self)
@@ -200,35 +204,8 @@ class ItayJhnNegotiator(ANL2025Negotiator):
 
 
     def _get_possible_outcomes(self, neg_id):
-        """Get all possible outcomes for a negotiation by id."""
-
-        nmi = self.negotiators[neg_id].negotiator.nmi
-        ufun = self.negotiators[neg_id].negotiator.ufun
-        if self.samples is not None:
-            return self.samples
-        all_outcomes = list(nmi.outcome_space.enumerate_or_sample())
-        valid_outcomes = []
-        if len(all_outcomes) > 1000:
-            self.samples = all_outcomes
-            return all_outcomes
-        # print(type(all_outcomes[0][0]))
-        max_samples = 1000
-        # return scored[:max_samples]
-
-        for o in all_outcomes:
-            try:
-                _ = ufun(o)
-                valid_outcomes.append(o)
-            except Exception:
-                continue  # skip malformed offers
-
-        scored = sorted(valid_outcomes, key=ufun, reverse=True)
-        self.samples = scored[:max_samples]
-        # print(self.samples)
-        return scored[:max_samples]
-
-        # print(len(all_outcomes))
-       
+        """Get all possible outcomes for a negotiation by id (cached per negotiation, see possible_outcomes)."""
+        return possible_outcomes(self, neg_id)
 
     def _get_progress(self, negotiator_id):
         """Get the current negotiation progress (0 to 1)."""
@@ -245,126 +222,54 @@ class ItayJhnNegotiator(ANL2025Negotiator):
 
         '''
         self.leverage =  ( int(negotiator_id[-1]) + 1)
-        if is_edge_agent(self):
-            best_outcome = None
-            best_utility = float('-inf')
-            self.pattern_outcomes = {}
-            outcomes = self._get_possible_outcomes(negotiator_id)
-            outcomes.append(self.current_offer)
-            for outcome in outcomes:
-                try:
-                    i_rejected = dict_outcome_space[negotiator_id][outcome][1]
-                    opp_rejected = dict_outcome_space[negotiator_id][outcome][2]
-                except: 
-                  i_rejected = opp_rejected = 0
-                
-
-                #   tuple(str(int(outcome[0]) + (0.1 * i_rejected) - (0.1 * opp_rejected)))
-                utility = (ufun(outcome)) + (0.000002  * i_rejected) - (0.000002 * opp_rejected)
-                if outcome is None:
-                    utility *= 0.75
-                self.pattern_outcomes[outcome] = utility
-                if utility > best_utility:
-                    best_outcome = outcome 
-                    best_utility = utility
-
-            return best_outcome, best_utility
-
-
-        context = self.agreements.copy()
-        len_ctxt = len(context)
-        context += [(None, None)] #* (len(self.negotiators) - len(context))
-        self.pattern_outcomes = {}
-        best_outcome = None
-        best_utility = float('-inf')
-
-        # Try each possible outcome + furute theoretic outcomes.
         outcomes = self._get_possible_outcomes(negotiator_id)
-        outcomes.append(self.current_offer)
-        for outcome in outcomes:
-            if outcome is None:
-                continue
-            test_context = context.copy()
-            test_context[int(negotiator_id[1])] = outcome
-            # rest_combs = itertools.combinations(self._get_possible_outcomes(negotiator_id), len(self.negotiators.keys()) - (len_ctxt + 1))
-            
-            try:
-                i_rejected = dict_outcome_space[negotiator_id][outcome][1]
-                opp_rejected = dict_outcome_space[negotiator_id][outcome][2]
-            except: 
-                i_rejected = opp_rejected = 0
-            # print(opp_rejected)
-            sum_utility = 0
-            num_utility = 0
-            combs_list = []
-            remaining = len(self.negotiators) - len(self.finished_negotiators) - 1#(len_ctxt + 1)
-
-
-
-            sampled_outcomes = self._get_possible_outcomes(negotiator_id)
-            #SAMPLE_SIZE = min(20, len(sampled_outcomes))
-            level = self._get_progress(negotiator_id)
-            fake_rest = [None] * remaining
-            test_context_comb = test_context + fake_rest
-            avg_util_inter = 0
-            sum_util_inter = 0
-
-            utility = self.ufun(test_context_comb) - (0.05 * level * opp_rejected * (pow(10, -(1 * self.leverage - 1))))
-            avg_util = utility# = avg_util_inter = sum_util_inter / len(test_context)
-
-            if outcome is None:
-                avg_util *= 0.75
-            self.pattern_outcomes[outcome] = avg_util
-
-
-            if avg_util > best_utility:
-                best_outcome = outcome
-                best_utility = avg_util
-
-        # Try having no agreement
-        test_context = context.copy()
-        test_context += [None for i in range(len(self.negotiators.keys()) - (len_ctxt + 1))]
-
-        # none_utility = ufun(test_context)
-        
-        # if none_utility > best_utility:
-        #     return None, 0
-        return best_outcome, best_utility
-
-
-    def calc_dict(self, negotiator_id, nmi, ufun, level):
         if is_edge_agent(self):
-            pass
-        if negotiator_id not in self.rejection_counts:
-            self.rejection_counts[negotiator_id] = {}
-
-        trace = nmi.extended_trace
-        existing_outcomes = self.rejection_counts[negotiator_id]
-
-# Process only the NEW offers in the trace
-        prev_len = len(existing_outcomes)
-        for event in trace[prev_len:]:  # assumes trace is append-only
-            offer = event[2]
-            is_mine = (event[1] == negotiator_id)
-
-            if offer not in existing_outcomes:
-                existing_outcomes[offer] = [0, 0]  # [i_rejected, opponent_rejected]
-
-            if is_mine:
-                existing_outcomes[offer][1] += 1  # opponent rejected mine
-            else:
-                existing_outcomes[offer][0] += 1  # I rejected theirs
+            # The utility of each outcome (and of no agreement, at the end) is computed once per negotiation.
+            candidates, base = edge_candidate_utilities(self, negotiator_id, outcomes, ufun)
+            i_rejected, opp_rejected = rejection_counts(dict_outcome_space, negotiator_id, candidates)
+            utilities = base + (0.000002  * i_rejected) - (0.000002 * opp_rejected)
+            utilities[-1] *= 0.75
+            self.pattern_outcomes = dict(zip(candidates, utilities.tolist()))
+            return best_candidate(candidates, utilities)
+
+        # The utility of each outcome given the previous agreements (and no agreement in the coming negotiations) is
+        # computed once per subnegotiation, only the penalty for outcomes the opponent rejected changes every step.
+        candidates, base = center_candidate_utilities(self, negotiator_id, outcomes)
+        i_rejected, opp_rejected = rejection_counts(dict_outcome_space, negotiator_id, candidates)
+        level = self._get_progress(negotiator_id)
+        utilities = base - (0.05 * level * opp_rejected * (pow(10, -(1 * self.leverage - 1))))
+        self.pattern_outcomes = dict(zip(candidates, utilities.tolist()))
+        return best_candidate(candidates, utilities)
 
-# Now build dict_outcome_space from rejection counts
-        dict_outcome_space = {}
+    def _candidate_statistics(self, negotiator_id, ufun, level):
+        """The running statistics of the utilities _find_best_outcome assigns to the candidates, and the coefficients
+        (a, b1, b2) of the rejection counts at this step (see CandidateStatistics)."""
+        self.leverage =  ( int(negotiator_id[-1]) + 1)
         outcomes = self._get_possible_outcomes(negotiator_id)
+        tracker = self.rejection_counts[negotiator_id]
+        if is_edge_agent(self):
+            candidates, base = edge_candidate_utilities(self, negotiator_id, outcomes, ufun)
+            scale = numpy.ones(len(candidates))
+            scale[-1] = 0.75
+            coefficients = (0.000002, 0.000002, 1.0)
+        else:
+            candidates, base = center_candidate_utilities(self, negotiator_id, outcomes)
+            scale = numpy.ones(len(candidates))
+            coefficients = (0.0, 0.05 * level, pow(10, -(1 * self.leverage - 1)))
+        return candidate_statistics(self, negotiator_id, candidates, base, scale, tracker), coefficients
 
-        for o in outcomes:
-            i_rej, opp_rej = existing_outcomes.get(o, [0, 0])
-            dict_outcome_space[o] = [level, i_rej, opp_rej]
 
-        self.trace_by_neg[negotiator_id] = dict_outcome_space
-        return dict_outcome_space
+    def calc_dict(self, negotiator_id, nmi, ufun, level):
+        """Counts the offers made in this negotiation since the last call, per outcome (see RejectionTracker)."""
+        if negotiator_id not in self.rejection_counts:
+            # The counters are indexed by the outcome ids of the registry, which end with no agreement (None).
+            self.rejection_counts[negotiator_id] = RejectionTracker.from_registry(
+                negotiator_id, get_outcome_registry(self), get_registry_index(self, negotiator_id))
+        tracker = self.rejection_counts[negotiator_id]
+        tracker.update(nmi)
+
+        self.trace_by_neg[negotiator_id] = tracker
+        return tracker
     
     def propose(self, negotiator_id, state, dest=None):
         if negotiator_id.startswith('s'):
@@ -451,21 +356,25 @@ class ItayJhnNegotiator(ANL2025Negotiator):
         dict_outcome_space = self.calc_dict(negotiator_id, nmi, ufun, level)
 
 
-        best_outcome, best_utility = self._find_best_outcome(negotiator_id, self.trace_by_neg, ufun)
+        # Mean, std and best of the candidate utilities are kept up to date from the new rejections only.
+        stats, (a, b1, b2) = self._candidate_statistics(negotiator_id, ufun, level)
+        best_utility = stats.max(a, b1, b2)
 
-        offer_utility = self.pattern_outcomes[current_offer]
-        all_utilities = list(self.pattern_outcomes.values())
-        mean_utility = numpy.mean(all_utilities)
+        # Offers outside the candidates (the best MAX_CANDIDATES outcomes) are scored on their own.
+        edge_ufun = ufun if is_edge_agent(self) else None
+        offer_utility = stats.utility(current_offer, a, b1, b2,
+                                      base=lambda o: offer_base_utility(self, negotiator_id, o, edge_ufun))
+        mean_utility = stats.mean(a, b1 * b2)
         progress = self._get_progress(negotiator_id)
         agent_type_factor =1 if is_edge_agent(self) else 1.2
         
 
 # Variance adjustment — higher std => lower z
-        std_utility = numpy.std(all_utilities)
+        std_utility = stats.std(a, b1 * b2)
         std_utility = max(std_utility, 1e-5)  # avoid division by zero
 
 # Normalize std_utility against mean to make it scale-invariant
-        std_ratio = std_utility / (numpy.mean(all_utilities) + 1e-5)
+        std_ratio = std_utility / (mean_utility + 1e-5)
         # print(agent_type_factor)
         base_z = 3 * ((1 - progress) * (agent_type_factor) )
 
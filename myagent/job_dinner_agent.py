@@ -17,13 +17,17 @@ from negmas.sao.controllers import SAOState
 
 from .helpers.helperfunctions import (
     set_id_dict, did_negotiation_end, is_edge_agent,
-    get_agreement_at_index, get_current_negotiation_index,
+    get_agreement_ledger, get_current_negotiation_index,
     get_outcome_space_from_index, all_possible_bids_with_agreements_fixed,
-    find_best_bid_in_outcomespace
+    find_best_bid_in_outcomespace, get_outcome_registry, get_registry_index
 )
+from .helpers.ufun_cache import cached_ufun
+from .helpers.batch_eval import evaluate_many
+from .helpers.opponent_model import OfferBuffer
+from .helpers.profiling import ProfiledNegotiator
 
 
-class ImprovedUnifiedNegotiator(ANL2025Negotiator):
+class ImprovedUnifiedNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     An improved negotiation agent that prioritizes getting valuable agreements
     through adaptive concession strategies rather than rigid pattern matching.
@@ -35,11 +39,15 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
     4. Balanced approach between utility maximization and deal completion
     """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_analyze_utility_potential", "_propose_as_edge", "_propose_as_center",
+                        "_update_strategy_for_new_round", "_find_best_contextual_outcome")
+
     def init(self):
         """Initialize with streamlined, effectiveness-focused approach."""
         # Core negotiation state
         self.current_neg_index = -1
-        self.agreements = []
+        self.agreements = ()  # the prefix of the agreement ledger
         self.target_bid = None
 
         # Negotiation tracking
@@ -53,8 +61,8 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
         self.time_pressure_start = 0.6  # When to start time-based concessions
         self.aggressive_threshold = 0.8  # When to become more aggressive
 
-        # Opponent and context modeling
-        self.opponent_utilities = []
+        # Opponent and context modeling: the recent offers of the opponent with both utilities (see OfferBuffer)
+        self.opponent_utilities = OfferBuffer(capacity=50, keep=30)
         self.round_number = 0
         self.current_side_ufun = None
         self.best_known_utility = 0.0
@@ -91,12 +99,19 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
 
             if sample_outcomes:
                 max_utility = 0.0
-                for combo in itertools.product(*sample_outcomes):
-                    try:
-                        utility = self.ufun(combo)
-                        max_utility = max(max_utility, utility)
-                    except:
-                        continue
+                combos = list(itertools.product(*sample_outcomes))
+                try:
+                    utilities = evaluate_many(self.ufun, combos).tolist()
+                except:
+                    # some combination cannot be evaluated, skip it
+                    utilities = []
+                    for combo in combos:
+                        try:
+                            utilities.append(self.ufun(combo))
+                        except:
+                            continue
+                for utility in utilities:
+                    max_utility = max(max_utility, utility)
 
                 self.best_known_utility = max_utility
             else:
@@ -136,12 +151,10 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
             elif relative_time < 0.7:
                 if self.opponent_utilities:
                     # Find outcomes that give decent utility to both parties
-                    acceptable_outcomes = [
-                        outcome for outcome, my_util, opp_util in self.opponent_utilities
-                        if my_util >= 0.8 * best_utility
-                    ]
-                    if acceptable_outcomes:
-                        return max(acceptable_outcomes, key=lambda x: self.ufun(x))
+                    mine = self.opponent_utilities.mine()
+                    acceptable = self.opponent_utilities.best(mine >= 0.8 * best_utility, mine)
+                    if acceptable is not None:
+                        return acceptable
 
                 return best_outcome
 
@@ -150,13 +163,12 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
                 min_acceptable = max(self.ufun.reserved_value, 0.5 * best_utility)
 
                 if self.opponent_utilities:
-                    viable_outcomes = [
-                        outcome for outcome, my_util, opp_util in self.opponent_utilities
-                        if my_util >= min_acceptable
-                    ]
-                    if viable_outcomes:
-                        # Choose outcome that maximizes joint utility among viable options
-                        return max(viable_outcomes, key=lambda x: self.ufun(x) + (self.current_side_ufun(x) if self.current_side_ufun else 0))
+                    # Choose outcome that maximizes joint utility among viable options
+                    mine = self.opponent_utilities.mine()
+                    joint = mine + (self.opponent_utilities.theirs() if self.current_side_ufun else 0)
+                    viable = self.opponent_utilities.best(mine >= min_acceptable, joint)
+                    if viable is not None:
+                        return viable
 
                 return best_outcome
 
@@ -207,14 +219,14 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
             current_utility = self.ufun(self._construct_full_outcome(base_bid))
             min_utility = current_utility * 0.9  # Small concession
 
-            viable_alternatives = [
-                outcome for outcome, my_util, opp_util in self.opponent_utilities
-                if my_util >= min_utility and opp_util > 0.3
-            ]
+            mine, theirs = self.opponent_utilities.mine(), self.opponent_utilities.theirs()
+            viable = (mine >= min_utility) & (theirs > 0.3)
 
-            if viable_alternatives:
-                # Choose one that maximizes opponent utility among viable options
-                return max(viable_alternatives, key=lambda x: self.current_side_ufun(x) if self.current_side_ufun else 0)
+            # Choose one that maximizes opponent utility among viable options
+            alternative = self.opponent_utilities.best(viable, theirs) if self.current_side_ufun \
+                else self.opponent_utilities.best(viable)
+            if alternative is not None:
+                return alternative
 
         except:
             pass
@@ -237,18 +249,13 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
                 current_utility * (1.0 - self.concession_speed * concession_factor)
             )
 
-            # Find outcomes that meet minimum utility but maximize opponent satisfaction
-            acceptable_outcomes = [
-                outcome for outcome, my_util, opp_util in self.opponent_utilities
-                if my_util >= min_acceptable
-            ]
-
-            if acceptable_outcomes:
-                # Prioritize opponent utility to increase acceptance probability
-                return max(acceptable_outcomes, key=lambda x: (
-                    self.current_side_ufun(x) if self.current_side_ufun else 0,
-                    self.ufun(self._construct_full_outcome(x))
-                ))
+            # Find outcomes that meet minimum utility but maximize opponent satisfaction,
+            # prioritizing opponent utility to increase acceptance probability
+            mine = self.opponent_utilities.mine()
+            keys = (self.opponent_utilities.theirs(), mine) if self.current_side_ufun else (mine,)
+            acceptable = self.opponent_utilities.best(mine >= min_acceptable, *keys)
+            if acceptable is not None:
+                return acceptable
 
         except:
             pass
@@ -336,7 +343,7 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
                 return ResponseType.ACCEPT_OFFER
 
             # Special case: if we have few agreements, be more accepting
-            agreement_count = sum(1 for a in self.agreements if a is not None)
+            agreement_count = get_agreement_ledger(self).n_agreements
             if agreement_count < self.num_negotiations // 2 and improvement > 0:
                 return ResponseType.ACCEPT_OFFER
 
@@ -349,20 +356,10 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
         """Handle transition to new negotiation round."""
         self.round_number = len(self.finished_negotiators)
 
-        # Update agreements
-        prev_index = self.current_neg_index - 1
-        if prev_index >= 0:
-            try:
-                agreement = get_agreement_at_index(self, prev_index)
-                while len(self.agreements) <= prev_index:
-                    self.agreements.append(None)
-                self.agreements[prev_index] = agreement
-
-                if agreement is not None:
-                    self.successful_agreements += 1
-
-            except:
-                pass
+        # Update agreements (did_negotiation_end recorded them in the agreement ledger)
+        ledger = get_agreement_ledger(self)
+        self.agreements = ledger.prefix
+        self.successful_agreements = ledger.n_agreements
 
         # Update strategy
         self._update_strategy_for_new_round(negotiator_id)
@@ -373,15 +370,21 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
         if not is_edge_agent(self):
             try:
                 _, context = self.negotiators[negotiator_id]
-                self.current_side_ufun = context.get("ufun")
+                side_ufun = context.get("ufun")
+                self.current_side_ufun = cached_ufun(self, side_ufun) if side_ufun is not None else None
             except:
                 self.current_side_ufun = None
 
         # Update target bid
         self._update_target_bid()
 
-        # Reset opponent model for new negotiation
-        self.opponent_utilities = []
+        # Reset opponent model for new negotiation, with the outcome ids of its outcome space
+        if is_edge_agent(self):
+            self.opponent_utilities.clear()
+        else:
+            registry = get_outcome_registry(self)
+            index = get_registry_index(self, negotiator_id)
+            self.opponent_utilities.reset(registry.outcomes(index), registry.id_map(index))
 
     def _update_target_bid(self):
         """Update target bid for current context."""
@@ -399,14 +402,11 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
             return
 
         try:
-            my_utility = self.ufun(self._construct_full_outcome(offer)) if not is_edge_agent(self) else self.ufun(offer)
+            my_utility = cached_ufun(self)(self._construct_full_outcome(offer)) if not is_edge_agent(self) else cached_ufun(self)(offer)
             opp_utility = self.current_side_ufun(offer)
 
-            self.opponent_utilities.append((offer, my_utility, opp_utility))
-
-            # Keep only recent offers to avoid memory bloat
-            if len(self.opponent_utilities) > 50:
-                self.opponent_utilities = self.opponent_utilities[-30:]
+            # Only the recent offers are kept (see OfferBuffer)
+            self.opponent_utilities.add(offer, my_utility, opp_utility)
 
         except:
             pass
@@ -414,35 +414,22 @@ class ImprovedUnifiedNegotiator(ANL2025Negotiator):
     def _construct_full_outcome(self, single_offer: Outcome) -> Tuple:
         """Construct full outcome tuple for center agent utility calculation."""
         try:
-            current_neg_idx = get_current_negotiation_index(self)
-            full_outcome = list(self.agreements)
-
-            # Pad with None until current index
-            while len(full_outcome) <= current_neg_idx:
-                full_outcome.append(None)
-
-            # Set current offer
-            full_outcome[current_neg_idx] = single_offer
-
-            # Pad to full length
-            while len(full_outcome) < self.num_negotiations:
-                full_outcome.append(None)
-
-            return tuple(full_outcome)
+            # The agreements so far, the offer in the current negotiation and None in the ones after it
+            return get_agreement_ledger(self).context(single_offer)
         except:
             return tuple([single_offer] + [None] * (self.num_negotiations - 1))
 
     def _calculate_utility_with_offer(self, offer: Outcome) -> float:
         """Calculate utility if offer is accepted."""
         try:
-            return self.ufun(self._construct_full_outcome(offer))
+            return cached_ufun(self)(self._construct_full_outcome(offer))
         except:
             return 0.0
 
     def _calculate_utility_without_offer(self) -> float:
         """Calculate utility if no agreement is reached."""
         try:
-            return self.ufun(self._construct_full_outcome(None))
+            return cached_ufun(self)(self._construct_full_outcome(None))
         except:
             return 0.0
 
@@ -11,7 +11,9 @@ from negmas.outcomes import Outcome
 
 from .helpers.helperfunctions import set_id_dict, did_negotiation_end, get_target_bid_at_current_index, is_edge_agent, \
     find_best_bid_in_outcomespace, all_possible_bids_with_agreements_fixed, get_outcome_space_from_index, \
-    get_current_negotiation_index, get_agreement_at_index
+    get_current_negotiation_index, get_max_center_index, get_agreement_ledger
+from .helpers.batch_eval import evaluate_many
+from .helpers.profiling import ProfiledNegotiator
 #be careful: When running directly from this file, change the relative import to an absolute import. When submitting, use relative imports.
 #from helpers.helperfunctions import set_id_dict, ...
 from anl2025.ufun import SideUFun, MaxCenterUFun
@@ -23,7 +25,7 @@ from negmas import (
     ResponseType, CategoricalIssue,
 )
 
-class JobHunterNegotiator(ANL2025Negotiator):
+class JobHunterNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     Your agent code. This is the ONLY class you need to implement
     This example agent aims for the absolute best bid available. As a center agent, it adapts its strategy after each negotiation, by aiming for the best bid GIVEN the previous outcomes.
@@ -33,6 +35,9 @@ class JobHunterNegotiator(ANL2025Negotiator):
        The most general way to implement an agent is to implement propose and respond.
        """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_update_strategy", "find_best_bid")
+
     def init(self):
         """Executed when the agent is created. In ANL2025, all agents are initialized before the tournament starts."""
         #Initalize variables
@@ -122,10 +127,7 @@ class JobHunterNegotiator(ANL2025Negotiator):
 
 
     def does_offer_not_improve_utility_mcuf(self, offer):
-        current_outcomes = self.get_prev_agreements()
-        no_deals_with_next_negs = [None] * (self.n_neg - (self.neg_idx + 1))
-        offer_util = self.ufun(current_outcomes + [offer] + no_deals_with_next_negs)
-        return self.cur_util < offer_util
+        return self.cur_util < self.mcuf_index.utility(offer)
 
 
     def does_offer_not_improve_utility(self, offer):
@@ -135,8 +137,8 @@ class JobHunterNegotiator(ANL2025Negotiator):
 
 
     def get_prev_agreements(self):
-        neg_index = get_current_negotiation_index(self)
-        return [get_agreement_at_index(self,i) for i in range(neg_index)]
+        # a new list, the callers add to it
+        return list(get_agreement_ledger(self).prefix)
     
 
     def start_new_round(self, negotiator_id):
@@ -158,14 +160,15 @@ class JobHunterNegotiator(ANL2025Negotiator):
             # note that the edge utility function has a slightly different structure than a center utility function.
             _, best_bid = self.ufun.extreme_outcomes()
             all_possible = self.get_possibilities_edge()
-            utils = [(outcome, self.ufun(outcome), outcome) for outcome in all_possible]
+            utilities = evaluate_many(self.ufun, all_possible).tolist()
+            utils = [(outcome, u, outcome) for outcome, u in zip(all_possible, utilities)]
             self.order_utilities(utils)
             self.can_improve = True
         else:
             if self.is_mcuf:
-                all_possible = self.get_outcome_space()
-                utils = [(outcome, self.ufun(outcome), outcome[self.c_round_]) for outcome in all_possible]
-                self.order_utilities(utils)
+                # The options are ranked from the sorted side utilities instead of calling the center ufun on each.
+                self.mcuf_index = get_max_center_index(self).lock(get_agreement_ledger(self).prefix)
+                self.options_by_utilities = self.mcuf_index.ranked_options()
                 self.calc_cur_util_mcuf()
 
             self.can_improve = self.can_improve_state()
@@ -177,7 +180,7 @@ class JobHunterNegotiator(ANL2025Negotiator):
     def calc_cur_util_mcuf(self):
         if self.c_round_ > 0:
             # the utility of the option with current deal as None
-            self.cur_util = next(option[1] for option in self.options_by_utilities if option[0][self.c_round_] == None)
+            self.cur_util = self.mcuf_index.none_utility
         else:
             self.cur_util = 0
 
@@ -216,11 +219,8 @@ class JobHunterNegotiator(ANL2025Negotiator):
 
 
     def calc_outcome_space_mcuf(self):
-        current_outcomes = self.get_prev_agreements()
         bids = get_outcome_space_from_index(self, self.neg_idx)
-        no_deals_with_next_negs = [None] * (self.n_neg - (self.neg_idx + 1))
-
-        return [current_outcomes + [bid] + no_deals_with_next_negs for bid in bids]
+        return get_agreement_ledger(self).contexts(bids)
 
 
     def get_outcome_space(self):
@@ -289,7 +289,7 @@ class JobHunterNegotiator(ANL2025Negotiator):
     def min_max_offer(self):
         pos_by_ut = self.options_by_utilities
         best_bid_util = pos_by_ut[len(pos_by_ut) - 1][1]
-        maxs = filter(lambda x: x[1] == best_bid_util, pos_by_ut)
+        maxs = pos_by_ut.best()
         maxs_with_side_utility = [(t[0], t[1], self.op_ufun(t[0][self.c_round_])) for t in maxs]
         maxs_by_min = sorted(maxs_with_side_utility, key = lambda t: t[2], reverse=True)
         min_max_offer = maxs_by_min[0][0]
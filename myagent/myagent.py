@@ -10,7 +10,8 @@ import itertools
 from negmas.outcomes import Outcome
 
 from .helpers.helperfunctions import set_id_dict, did_negotiation_end, get_target_bid_at_current_index, is_edge_agent, \
-    find_best_bid_in_outcomespace
+    find_best_bid_in_outcomespace, find_best_lookahead_outcome, get_current_negotiation_index
+from .helpers.profiling import ProfiledNegotiator
 #be careful: When running directly from this file, change the relative import to an absolute import. When submitting, use relative imports.
 #from helpers.helperfunctions import set_id_dict, ...
 
@@ -22,7 +23,7 @@ from negmas import (
     ResponseType, CategoricalIssue,
 )
 
-class NewNegotiator(ANL2025Negotiator):
+class NewNegotiator(ProfiledNegotiator, ANL2025Negotiator):
     """
     Your agent code. This is the ONLY class you need to implement
     This example agent aims for the absolute best bid available. As a center agent, it adapts its strategy after each negotiation, by aiming for the best bid GIVEN the previous outcomes.
@@ -32,6 +33,9 @@ class NewNegotiator(ANL2025Negotiator):
        The most general way to implement an agent is to implement propose and respond.
        """
 
+    # timed together with init, propose and respond when profiling is enabled (see helpers/profiling.py)
+    profiled_methods = ("_update_strategy",)
+
     def init(self):
         """Executed when the agent is created. In ANL2025, all agents are initialized before the tournament starts."""
         #print("init")
@@ -96,6 +100,13 @@ class NewNegotiator(ANL2025Negotiator):
             #get the best bid from the outcomes that are still possible to achieve.
             best_bid = find_best_bid_in_outcomespace(self)
 
+            # The best bid assumes that every negotiation after this one ends with its target. Aim instead for the
+            # outcome with the best expected utility if they may fail (see helpers/lookahead.py), when it is known.
+            lookahead = find_best_lookahead_outcome(self)
+            if best_bid is not None and lookahead is not None and lookahead[0] is not None:
+                best_bid = list(best_bid)
+                best_bid[get_current_negotiation_index(self)] = lookahead[0]
+
         self.target_bid = best_bid
         #print(self.target_bid)
 
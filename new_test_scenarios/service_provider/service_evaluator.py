@@ -1,4 +1,10 @@
 # scenarios/service_provider/service_evaluator.py
+import itertools
+from pathlib import Path
+
+import numpy as np
+import yaml
+
 
 class ServiceQualityEvaluator:
     """Evaluates service quality based on response time and satisfaction."""
@@ -68,6 +74,56 @@ class GlobalServiceEvaluator:
     def __init__(self, reserved_value=0.0):
         self.reserved_value = reserved_value
 
+    def service_quality(self, i, agreement):
+        """Quality score of the agreement of service i."""
+        if i == 0:  # Customer Service
+            response_time, satisfaction = agreement
+            # Convert string values to integers
+            response_time = int(response_time)
+            satisfaction = int(satisfaction)
+            time_score = max(0, (60 - response_time) / 60)
+            satisfaction_score = satisfaction / 10
+            return 0.6 * time_score + 0.4 * satisfaction_score
+        elif i == 1:  # Maintenance (now at index 1)
+            uptime_percentage, cost_efficiency = agreement
+            # Convert string values to integers
+            uptime_percentage = int(uptime_percentage)
+            cost_efficiency = int(cost_efficiency)
+            return 0.8 * (uptime_percentage / 100) + 0.2 * (cost_efficiency / 5)
+        elif i == 2:  # Technical Support (now at index 2)
+            resolution_rate, expertise_level = agreement
+            # Convert string values to integers
+            resolution_rate = int(resolution_rate)
+            expertise_level = int(expertise_level)
+            return 0.7 * (resolution_rate / 100) + 0.3 * (expertise_level / 5)
+        return 0.5  # Default for unknown services
+
+    def init_state(self):
+        """The state of an incremental evaluation: (number of services, successful agreements, sum of their quality
+        scores, number of high quality services)."""
+        return 0, 0, 0, 0
+
+    def extend(self, state, agreement):
+        """The state after the agreement of the next service (None for no agreement)."""
+        i, successful, total_quality, high_quality_services = state
+        if agreement is None:
+            return i + 1, successful, total_quality, high_quality_services
+        quality = self.service_quality(i, agreement)
+        return i + 1, successful + 1, total_quality + quality, high_quality_services + (quality > 0.7)
+
+    def finalize(self, state):
+        """The score of the agreements folded into state, computed like __call__."""
+        n, successful, total_quality, high_quality_services = state
+        if not n or successful == 0:
+            return self.reserved_value
+        coverage_ratio = successful / n
+        avg_quality = total_quality / successful
+        base_utility = coverage_ratio * avg_quality
+        synergy_bonus = 0.2 if successful == n else 0.0
+        diversity_bonus = 0.1 * (high_quality_services - 1) if high_quality_services >= 2 else 0.0
+        final_utility = base_utility + synergy_bonus + diversity_bonus
+        return min(1.0, max(0.0, final_utility))
+
     def __call__(self, agreements):
         """Evaluate the complete service portfolio."""
         if not agreements:
@@ -89,30 +145,7 @@ class GlobalServiceEvaluator:
             if agreement is None:
                 continue
 
-            if i == 0:  # Customer Service
-                response_time, satisfaction = agreement
-                # Convert string values to integers
-                response_time = int(response_time)
-                satisfaction = int(satisfaction)
-                time_score = max(0, (60 - response_time) / 60)
-                satisfaction_score = satisfaction / 10
-                service_quality = 0.6 * time_score + 0.4 * satisfaction_score
-            elif i == 1:  # Maintenance (now at index 1)
-                uptime_percentage, cost_efficiency = agreement
-                # Convert string values to integers
-                uptime_percentage = int(uptime_percentage)
-                cost_efficiency = int(cost_efficiency)
-                service_quality = 0.8 * (uptime_percentage / 100) + 0.2 * (cost_efficiency / 5)
-            elif i == 2:  # Technical Support (now at index 2)
-                resolution_rate, expertise_level = agreement
-                # Convert string values to integers
-                resolution_rate = int(resolution_rate)
-                expertise_level = int(expertise_level)
-                service_quality = 0.7 * (resolution_rate / 100) + 0.3 * (expertise_level / 5)
-            else:
-                service_quality = 0.5  # Default for unknown services
-
-            quality_scores.append(service_quality)
+            quality_scores.append(self.service_quality(i, agreement))
 
         # Base utility is average quality weighted by coverage
         if quality_scores:
@@ -137,4 +170,87 @@ class GlobalServiceEvaluator:
 
         final_utility = base_utility + synergy_bonus + diversity_bonus
 
-        return min(1.0, max(0.0, final_utility))
\ No newline at end of file
+        return min(1.0, max(0.0, final_utility))
+
+
+class CompiledGlobalServiceEvaluator(GlobalServiceEvaluator):
+    """GlobalServiceEvaluator with the quality score of every service outcome computed once and kept in a table per
+    service. Batches of joint outcomes are scored with NumPy (see encode and evaluate_batch), giving the same scores
+    as GlobalServiceEvaluator."""
+
+    def __init__(self, reserved_value=0.0, values=None):
+        super().__init__(reserved_value)
+        if values is None:
+            # read the issue values of every service from the outcome spaces in center.yml
+            with open(Path(__file__).parent / "center.yml") as f:
+                outcome_spaces = yaml.safe_load(f)["outcome_spaces"]
+            values = [[issue["values"] for issue in space["issues"]] for space in outcome_spaces]
+        self.values = values
+        # _ids[i] maps the outcomes of service i to their row in _qualities[i].
+        self._ids = []
+        self._qualities = []
+        for i, issues in enumerate(values):
+            outcomes = list(itertools.product(*issues))
+            self._ids.append({outcome: j for j, outcome in enumerate(outcomes)})
+            quality = super().service_quality
+            self._qualities.append([quality(i, outcome) for outcome in outcomes])
+
+    def _id(self, i, agreement):
+        """The table row of the agreement of service i. Agreements outside the outcome spaces get a new row, so they
+        are scored like GlobalServiceEvaluator does."""
+        while len(self._ids) <= i:
+            self._ids.append({})
+            self._qualities.append([])
+        ids = self._ids[i]
+        j = ids.get(agreement)
+        if j is None:
+            j = ids[agreement] = len(self._qualities[i])
+            self._qualities[i].append(super().service_quality(i, agreement))
+        return j
+
+    def service_quality(self, i, agreement):
+        j = self._id(i, agreement)
+        return self._qualities[i][j]
+
+    def encode(self, outcomes):
+        """The table row of every agreement of every joint outcome in outcomes, as an integer array with one row per
+        joint outcome (-1 for no agreement)."""
+        outcomes = list(outcomes)
+        n = max((len(o) for o in outcomes), default=0)
+        ids = np.full((len(outcomes), n), -1, dtype=int)
+        for row, agreements in enumerate(outcomes):
+            for i, agreement in enumerate(agreements):
+                if agreement is not None:
+                    ids[row, i] = self._id(i, agreement)
+        return ids
+
+    def evaluate_batch(self, ids):
+        """The score of every row of table rows (see encode). The operations follow __call__ one by one, so the
+        scores are identical."""
+        ids = np.asarray(ids, dtype=int)
+        if ids.ndim == 1:
+            ids = ids.reshape(1, -1)
+        n_rows, n = ids.shape
+        if n == 0:
+            return np.full(n_rows, self.reserved_value, dtype=float)
+        agreed = ids >= 0
+        successful = agreed.sum(axis=1)
+
+        total = np.zeros(n_rows, dtype=float)
+        high_quality_services = np.zeros(n_rows, dtype=int)
+        for i in range(n):
+            quality = np.zeros(n_rows, dtype=float)
+            if agreed[:, i].any():
+                quality[agreed[:, i]] = np.array(self._qualities[i], dtype=float)[ids[agreed[:, i], i]]
+            total = total + quality
+            high_quality_services += agreed[:, i] & (quality > 0.7)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_quality = total / successful
+        base_utility = (successful / n) * avg_quality
+        synergy_bonus = np.where(successful == n, 0.2, 0.0)
+        diversity_bonus = np.where(high_quality_services >= 2, 0.1 * (high_quality_services - 1), 0.0)
+        final_utility = base_utility + synergy_bonus + diversity_bonus
+        scores = np.minimum(1.0, np.maximum(0.0, final_utility))
+        scores[successful == 0] = self.reserved_value
+        return scores
@@ -1,11 +1,12 @@
 """
 Test script for evaluating the NewNegotiator agent on the dinners scenario.
 """
-from anl2025 import run_session, MultidealScenario
+from anl2025 import MultidealScenario
 from anl2025.negotiator import Boulware2025, Linear2025, Random2025
 import pathlib
 
 from myagent.itay_agent import NewNegotiator
+from myagent.helpers.session_farm import SessionJob, run_farm
 
 def test_on_target_quant_scenario():
     """Test the NewNegotiator on the target_quantity scenario."""
@@ -13,7 +14,11 @@ def test_on_target_quant_scenario():
     path = pathlib.Path("")
     scenario = MultidealScenario.from_folder(path)
 
-    print("\n===== Testing NewNegotiator as center agent =====")
+    # Every test is (what to print before its results, its session, whether to report the edges that are
+    # NewNegotiator). The sessions run in parallel, the results are printed in this order.
+    tests = []
+
+    header = "\n===== Testing NewNegotiator as center agent =====\n"
 
     # Test against different edge agent combinations
     edge_combinations = [
@@ -25,35 +30,26 @@ def test_on_target_quant_scenario():
     ]
 
     for i, edge_agents in enumerate(edge_combinations):
-        print(f"\nTest {i+1}: Against {[agent.__name__ for agent in edge_agents]}")
-        results = run_session(
-            scenario=scenario,
-            center_type=NewNegotiator,
-            edge_types=edge_agents,
-            nsteps=100,
-        )
-        print(f"Center utility: {results.center_utility}")
-        print(f"Edge Utilities: {results.edge_utilities}")
-        print(f"Agreements: {results.agreements}")
+        tests.append((
+            (header if i == 0 else "") + f"\nTest {i+1}: Against {[agent.__name__ for agent in edge_agents]}",
+            SessionJob(scenario, NewNegotiator, edge_agents, nsteps=100),
+            False,
+        ))
 
-    print("\n===== Testing NewNegotiator as edge agent (all edges are NewNegotiator) =====")
+    header = "\n===== Testing NewNegotiator as edge agent (all edges are NewNegotiator) =====\n"
 
     # Test against different center agents
     center_agents = [Boulware2025, Linear2025, Random2025]
 
     for i, center_agent in enumerate(center_agents):
-        print(f"\nTest {i+1}: Against center agent {center_agent.__name__}")
-        results = run_session(
-            scenario=scenario,
-            center_type=center_agent,
-            edge_types=[NewNegotiator, NewNegotiator, NewNegotiator, NewNegotiator],
-            nsteps=100,
-        )
-        print(f"Center utility: {results.center_utility}")
-        print(f"Edge Utilities: {results.edge_utilities}")
-        print(f"Agreements: {results.agreements}")
+        tests.append((
+            (header if i == 0 else "") + f"\nTest {i+1}: Against center agent {center_agent.__name__}",
+            SessionJob(scenario, center_agent, [NewNegotiator, NewNegotiator, NewNegotiator, NewNegotiator],
+                       nsteps=100),
+            False,
+        ))
 
-    print("\n===== Testing NewNegotiator as one of multiple different edge agents =====")
+    header = "\n===== Testing NewNegotiator as one of multiple different edge agents =====\n"
 
     # Test cases where NewNegotiator is mixed with other agent types as edges
     mixed_edge_combinations = [
@@ -65,40 +61,38 @@ def test_on_target_quant_scenario():
 
     for i, edge_agents in enumerate(mixed_edge_combinations):
         center_agent = Linear2025 if i % 2 == 0 else Boulware2025
-        print(f"\nTest {i+1}: Center: {center_agent.__name__}, Edges: {[agent.__name__ for agent in edge_agents]}")
-        results = run_session(
-            scenario=scenario,
-            center_type=center_agent,
-            edge_types=edge_agents,
-            nsteps=100,
-        )
-        print(f"Center utility: {results.center_utility}")
-        print(f"Edge Utilities: {results.edge_utilities}")
-        print(f"Agreements: {results.agreements}")
-
-        # Identify which edge agent is the NewNegotiator and its performance
-        for j, agent_type in enumerate(edge_agents):
-            if agent_type == NewNegotiator:
-                print(f"NewNegotiator is edge {j} with utility: {results.edge_utilities[j]}")
+        tests.append((
+            (header if i == 0 else "")
+            + f"\nTest {i+1}: Center: {center_agent.__name__}, Edges: {[agent.__name__ for agent in edge_agents]}",
+            SessionJob(scenario, center_agent, edge_agents, nsteps=100),
+            True,
+        ))
 
-    print("\n===== Comparing all agents as center against edges Boulware2025, Linear2025, Random2025 =====")
+    header = "\n===== Comparing all agents as center against edges Boulware2025, Linear2025, Random2025 =====\n"
 
     # Compare all agents in center role
-    all_agents = [NewNegotiator, Boulware2025, Linear2025, Random2025, Linear2025] 
+    all_agents = [NewNegotiator, Boulware2025, Linear2025, Random2025, Linear2025]
 
-    for center_agent in all_agents:
+    for i, center_agent in enumerate(all_agents):
         # Use a balanced set of opponents
         edge_agents = [Boulware2025, Linear2025, Random2025, Linear2025]
-        print(f"\nTest with {center_agent.__name__} as center:")
-        results = run_session(
-            scenario=scenario,
-            center_type=center_agent,
-            edge_types=edge_agents,
-            nsteps=100,
-        )
+        tests.append((
+            (header if i == 0 else "") + f"\nTest with {center_agent.__name__} as center:",
+            SessionJob(scenario, center_agent, edge_agents, nsteps=100),
+            False,
+        ))
+
+    for (intro, _, report_edges), (job, results) in zip(tests, run_farm(job for _, job, _ in tests)):
+        print(intro)
         print(f"Center utility: {results.center_utility}")
         print(f"Edge Utilities: {results.edge_utilities}")
         print(f"Agreements: {results.agreements}")
 
+        if report_edges:
+            # Identify which edge agent is the NewNegotiator and its performance
+            for j, agent_type in enumerate(job.edge_types):
+                if agent_type == NewNegotiator:
+                    print(f"NewNegotiator is edge {j} with utility: {results.edge_utilities[j]}")
+
 if __name__ == "__main__":
-    test_on_target_quant_scenario()
\ No newline at end of file
+    test_on_target_quant_scenario()
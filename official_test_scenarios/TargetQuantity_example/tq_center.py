@@ -17,14 +17,42 @@ class TargetEvaluator:
             self.values = values
         # read the utility values from the csv vile
 
+    def quantity(self, agreement):
+        """The quantity of a single agreement (0 for no agreement)."""
+        if agreement is None:
+            return 0
+        return int(agreement[0])
+
+    def value_of_sum(self, quantity_sum):
+        """The value of a set of agreements with the given total quantity."""
+        return self.values.get(quantity_sum, self.reserved_value)
+
+    def init_state(self):
+        """The state of an incremental evaluation: (number of agreements or disagreements, quantity sum)."""
+        return 0, 0
+
+    def extend(self, state, agreement):
+        """The state after one more agreement (None for no agreement)."""
+        n, quantity_sum = state
+        return n + 1, quantity_sum + self.quantity(agreement)
+
+    def extend_at(self, state, index, agreement):
+        """Like extend, the sum does not depend on the order of the agreements."""
+        return self.extend(state, agreement)
+
+    def finalize(self, state):
+        """The value of the agreements folded into state."""
+        n, quantity_sum = state
+        if not n:
+            return self.reserved_value
+        return self.value_of_sum(quantity_sum)
+
     def __call__(self, agreements):
         if not agreements:
             return self.reserved_value
 
         # outings = dict(zip(self.days, itertools.repeat(0)))
-        quantity_sum = 0
+        state = self.init_state()
         for agreement in agreements:
-            if agreement is None:
-                continue
-            quantity_sum += int(agreement[0])
-        return self.values.get(quantity_sum, self.reserved_value)
+            state = self.extend(state, agreement)
+        return self.finalize(state)
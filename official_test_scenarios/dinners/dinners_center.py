@@ -1,7 +1,12 @@
-import itertools
+import ast
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+# The most entries of the dense table of values, with more combinations of day counts the values are looked up by
+# the day counts instead.
+MAX_TABLE_SIZE = 1 << 20
+
 
 class DinnersEvaluator:
     """Evaluates the center utility value of a set of agreements/disagreements"""
@@ -20,16 +25,83 @@ class DinnersEvaluator:
         else:
             self.days = days
             self.values = values
+        self._build_table()
+
+    def _build_table(self):
+        """Stores the values in a dense array indexed by the day counts, read as a number in base radix (the first
+        day is the most significant digit). Counts above the highest count in the values all map to the last digit,
+        whose entries keep the reserved value. If the table would have more than MAX_TABLE_SIZE entries, the values
+        are kept in a dict keyed by the tuple of day counts instead (by_counts, table is None then)."""
+        self.day_index = {day: i for i, day in enumerate(self.days)}
+        counts = {key: ast.literal_eval(key) for key in self.values}
+        self.radix = max((max(c, default=0) for c in counts.values()), default=0) + 2
+        if self.radix ** len(self.days) > MAX_TABLE_SIZE:
+            self.weights = self.table = None
+            self.by_counts = {tuple(c): self.values[key] for key, c in counts.items()}
+            return
+        self.by_counts = None
+        self.weights = self.radix ** np.arange(len(self.days) - 1, -1, -1)
+        self.table = np.full(self.radix ** len(self.days), self.reserved_value, dtype=float)
+        for key, c in counts.items():
+            self.table[int(np.dot(c, self.weights))] = self.values[key]
+
+    def encode(self, outcomes):
+        """The day index of every agreement of every joint outcome in outcomes, as an integer array with one row per
+        joint outcome (-1 for no agreement)."""
+        outcomes = list(outcomes)
+        n = max((len(o) for o in outcomes), default=0)
+        days = np.full((len(outcomes), n), -1, dtype=int)
+        for row, agreements in enumerate(outcomes):
+            for col, agreement in enumerate(agreements):
+                if agreement is not None:
+                    days[row, col] = self.day_index[agreement[0]]
+        return days
+
+    def evaluate_batch(self, day_indices):
+        """The value of every row of day indices (see encode), gathered from the table at once."""
+        day_indices = np.asarray(day_indices, dtype=int)
+        if day_indices.ndim == 1:
+            day_indices = day_indices.reshape(1, -1)
+        if self.table is None:
+            counts = np.stack([np.count_nonzero(day_indices == i, axis=1) for i in range(len(self.days))], axis=1)
+            return np.array([self.by_counts.get(tuple(c), self.reserved_value) for c in counts.tolist()], dtype=float)
+        codes = np.zeros(len(day_indices), dtype=int)
+        for i, weight in enumerate(self.weights):
+            counts = np.count_nonzero(day_indices == i, axis=1)
+            codes += np.minimum(counts, self.radix - 1) * weight
+        return self.table[codes]
+
+    def init_state(self):
+        """The state of an incremental evaluation: (number of agreements or disagreements, outings per day)."""
+        return 0, (0,) * len(self.days)
+
+    def extend(self, state, agreement):
+        """The state after one more agreement (None for no agreement)."""
+        n, outings = state
+        if agreement is None:
+            return n + 1, outings
+        # day is a tuple of one value which is the day selected
+        day = self.day_index[agreement[0]]
+        return n + 1, outings[:day] + (outings[day] + 1,) + outings[day + 1:]
+
+    def extend_at(self, state, index, agreement):
+        """Like extend, the outings per day do not depend on the order of the agreements."""
+        return self.extend(state, agreement)
+
+    def finalize(self, state):
+        """The value of the agreements folded into state."""
+        n, outings = state
+        if not n:
+            return self.reserved_value
+        if self.table is None:
+            return self.by_counts.get(outings, self.reserved_value)
+        code = sum(min(count, self.radix - 1) * int(w) for count, w in zip(outings, self.weights))
+        return self.table[code]
 
     def __call__(self, agreements):
         if not agreements:
             return self.reserved_value
-        outings = dict(zip(self.days, itertools.repeat(0)))
+        state = self.init_state()
         for agreement in agreements:
-            if agreement is None:
-                continue
-            # day is a tuple of one value which is the day selected
-            outings[agreement[0]] += 1
-        return self.values.get(
-            str(tuple(outings[day] for day in self.days)), self.reserved_value
-        )
+            state = self.extend(state, agreement)
+        return self.finalize(state)
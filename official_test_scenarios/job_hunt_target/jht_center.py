@@ -1,7 +1,7 @@
 """
 Test script for evaluating the JobHunterNegotiator agent on the job_hunt_target scenario.
 """
-from anl2025 import run_session, MultidealScenario
+from anl2025 import MultidealScenario
 from anl2025.negotiator import Boulware2025, Linear2025, Random2025
 import pathlib
 
@@ -10,15 +10,15 @@ from myagent.myagent import NewNegotiator
 from myagent.dinners_agent import DinnersNegotiator
 from myagent.job_dinner_agent import ImprovedUnifiedNegotiator
 from myagent.itay_agent import ItayNegotiator
+from myagent.helpers.session_farm import SessionJob, run_farm
 
 
 def run_tour(edge_agents, center_type, scenario, i):
-    results = run_session(
-        scenario=scenario,
-        center_type=center_type,
-        edge_types=edge_agents,
-        nsteps=10,
-    )
+    """The session of a test, run later with all others by run_tests."""
+    return SessionJob(scenario, center_type, edge_agents, nsteps=10)
+
+
+def print_results(edge_agents, results):
     print(f"Center utility: {results.center_utility}")
     print(f"agents: \t\t" + " | ".join(f"{edge.__name__:<20}" for edge in edge_agents))
     print(f"Edge Utilities: \t" + " | ".join(f"{r:<20}" for r in results.edge_utilities))
@@ -26,17 +26,26 @@ def run_tour(edge_agents, center_type, scenario, i):
 
 
 
+def run_tests(tests):
+    """Runs the sessions of the tests, given as (what to print before the results, session), in parallel and prints
+    the results in order."""
+    for (intro, _), (job, results) in zip(tests, run_farm(job for _, job in tests)):
+        print(intro)
+        print_results(job.edge_types, results)
+
+
 def test_center(edge_combinations, center_type, scenario):
-    print(f"\n===== Testing {center_type.__name__} as center agent (employer) =====")
-    
-    for i, edge_agents in enumerate(edge_combinations):
-        print(f"\nTest {i+1}: Against {[agent.__name__ for agent in edge_agents]}")
-        run_tour(edge_agents, center_type, scenario, i)
+    header = f"\n===== Testing {center_type.__name__} as center agent (employer) =====\n"
 
-def test_edge(center_agents, edge_combination, scenario):
-    for i, center_agent in enumerate(center_agents):
-        print(f"\nTest {i+1}: Against center agent {center_agent.__name__}")
-        run_tour(edge_combination, center_agent, scenario, i)
+    return [((header if i == 0 else "") + f"\nTest {i+1}: Against {[agent.__name__ for agent in edge_agents]}",
+             run_tour(edge_agents, center_type, scenario, i))
+            for i, edge_agents in enumerate(edge_combinations)]
+
+def test_edge(center_agents, edge_combination, scenario, header=None):
+    return [((f"{header}\n" if header is not None and i == 0 else "")
+             + f"\nTest {i+1}: Against center agent {center_agent.__name__}",
+             run_tour(edge_combination, center_agent, scenario, i))
+            for i, center_agent in enumerate(center_agents)]
 
 
 def test_on_job_hunt_scenario():
@@ -61,27 +70,25 @@ def test_on_job_hunt_scenario():
         #[Boulware2025, Linear2025, Random2025, Linear2025]
     ]
 
-    test_center(edge_combinations, JobHunterNegotiator, scenario)
+    tests = test_center(edge_combinations, JobHunterNegotiator, scenario)
 
-    test_center(edge_combinations, ImprovedUnifiedNegotiator, scenario)
+    tests += test_center(edge_combinations, ImprovedUnifiedNegotiator, scenario)
     
-    test_center(edge_combinations, ItayNegotiator, scenario)
-
-    print("\n===== Testing NewNegotiator as edge agent (employee) =====")
+    tests += test_center(edge_combinations, ItayNegotiator, scenario)
 
     # Test against different center agents
     center_agents = [ItayNegotiator, JobHunterNegotiator, DinnersNegotiator, ImprovedUnifiedNegotiator]
     edge_types = [JobHunterNegotiator, ItayNegotiator, ImprovedUnifiedNegotiator, DinnersNegotiator]
     
-    test_edge(center_agents, edge_types, scenario)
-
-    print("\n===== Comparing all agents as center (employer) =====")
+    tests += test_edge(center_agents, edge_types, scenario, "\n===== Testing NewNegotiator as edge agent (employee) =====")
 
     # Compare all agents in center role
     all_agents = [NewNegotiator, Boulware2025, JobHunterNegotiator, DinnersNegotiator, ImprovedUnifiedNegotiator]
     edge_agents = [DinnersNegotiator, ImprovedUnifiedNegotiator, JobHunterNegotiator, ItayNegotiator]
 
-    test_edge(all_agents, edge_agents, scenario)
+    tests += test_edge(all_agents, edge_agents, scenario, "\n===== Comparing all agents as center (employer) =====")
+
+    run_tests(tests)
 
 if __name__ == "__main__":
     test_on_job_hunt_scenario()
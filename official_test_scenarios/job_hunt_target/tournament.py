@@ -8,18 +8,25 @@ from myagent.dinners_agent import DinnersNegotiator
 from myagent.job_dinner_agent import ImprovedUnifiedNegotiator
 from myagent.itay_agent import ItayNegotiator
 from myagent.itay_jhn_agent import ItayJhnNegotiator
+from myagent.helpers.tournament_runner import run_resumable_tournament
+
+
+def results_path(path, agent, opponent):
+    """The JSONL file that the sessions of agent against opponent on the scenario at path are appended to."""
+    return pathlib.Path("tournament_results") / f"{pathlib.Path(path).name}_{agent.__name__}_vs_{opponent.__name__}.jsonl"
 
 
 def run_tour(path, agent):
     print(f"\n\n\nscenario {path}\n\n\n")
     scenario = MultidealScenario.from_folder(path)
     generated_scenario = make_multideal_scenario(nedges=3)
-    results = anl2025_tournament(
+    results = run_resumable_tournament(
+        results_path(path, agent, Linear2025),
         scenarios=[scenario],
-        n_jobs=-1,
         competitors=(agent, Linear2025),
         verbose=False,
         no_double_scores=False,
+        n_jobs=-1,
     )
     
     print(results.final_scores)
@@ -27,13 +34,14 @@ def run_tour(path, agent):
 
     scenario = MultidealScenario.from_folder(path)
     generated_scenario = make_multideal_scenario(nedges=3)
-    results = anl2025_tournament(
+    results = run_resumable_tournament(
+        results_path(path, agent, Boulware2025),
         scenarios=[scenario],
         n_repetitions=10,
-        n_jobs=-1,
         competitors=(agent, Boulware2025),
         verbose=False,
         no_double_scores=False,
+        n_jobs=-1,
     )
 
     print(results.final_scores)
@@ -6,7 +6,9 @@ from myagent.job_dinner_agent import ImprovedUnifiedNegotiator
 from myagent.itay_agent import ItayNegotiator
 from myagent.dinners_agent import DinnersNegotiator
 from myagent.job_henter_agent import JobHunterNegotiator
-# import cProfile
+from myagent.helpers.session_cache import SessionCache
+from myagent.helpers.tournament_runner import run_resumable_tournament
+# To profile the agents, run with ANL2025_PROFILE=<folder> and then python -m myagent.helpers.profiling <folder>
 
 generated_scenario = make_multideal_scenario(nedges=3)
 # TargetQuantity_example
@@ -19,13 +21,18 @@ path3 = pathlib.Path("official_test_scenarios/job_hunt_target")
 scenario1 = MultidealScenario.from_folder(path1)
 scenario2 = MultidealScenario.from_folder(path2)
 scenario3 = MultidealScenario.from_folder(path3)
-results = anl2025_tournament(
+# Sessions whose scenario, agents and seed did not change since the last run are read from the session cache.
+# Every finished session is appended to tournament_results.jsonl, and an interrupted run resumes from it (sessions
+# whose agents changed since are run again). The sessions run on all CPUs.
+results = run_resumable_tournament(
+    "tournament_results.jsonl",
+    cache=SessionCache(),
     scenarios=[scenario1, scenario3],
     n_repetitions=200,
-    n_jobs=-1,
     competitors=(ItayNegotiator, Boulware2025, Linear2025),
     verbose=True,
      no_double_scores=False,
+    n_jobs=-1,
 )
 
 print(results.final_scores)